@@ -0,0 +1,722 @@
+import os
+import json
+import zlib
+import time
+import threading
+from datetime import datetime
+from queue import Queue, Empty, Full
+import numpy as np
+from backend.cameraLogging import get_camera_logger
+from backend.cameraDataHandle import save_fits_data, open_frame_writer, FRAME_WRITERS
+from backend.luckyImaging import LuckyAccumulator
+from backend.photonCounting import PhotonCounter
+from backend.frameMetadata import FrameMetadataRecorder
+from backend.runJournal import RunJournal
+from backend.instrumentation import instrumentation
+from backend.frameServer import get_frame_server
+
+'''
+Composable acquisition pipeline.
+
+    source (Camera read loop) -> queue -> stage -> queue -> stage ... -> sinks
+
+The acquisition loop only builds FramePackets and submits them. Every stage (calibrate, stats, compress,
+extract) runs on its own thread between two bounded queues, so a slow stage blocks the one before it
+(back-pressure) instead of frames being dropped. The output of the last stage is fanned out to the sinks
+(FITS, binary writer, photon counting, lucky imaging, preview, network), each on its own thread with its own
+queue. A sink marked lossy (the preview, the network stream) drops its oldest packet rather than stall the pipeline.
+
+Pipelines are described with plain dicts, normally a named entry of backend/pipeline_profiles.json:
+
+    {"queueSize": 64,
+     "stages": [{"type": "calibrate", "bias": "bias.fits"}, {"type": "stats"}],
+     "sinks": [{"type": "fits"}, {"type": "lucky", "keepFraction": 0.1}]}
+'''
+
+PIPELINE_PROFILES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "pipeline_profiles.json")
+
+_STOP = object()
+
+
+class PipelineError(RuntimeError):
+    """Raised when a stage or sink failed and the pipeline can no longer accept frames."""
+    pass
+
+
+class FramePacket:
+    """
+    One frame travelling through the pipeline.
+    :param frame: 2D image, stages may replace it
+    :param index: SDK frame index
+    :param meta: free form per frame results added by stages (e.g. "stats")
+    :param payload: encoded bytes set by the compress stage, used by sinks that ship bytes
+    :param missed, late: frame accounting results for this frame (see FrameCounters.update)
+    """
+    __slots__ = ("frame", "index", "host_time", "temperature", "missed", "late", "meta", "payload")
+
+    def __init__(self, frame, index=0, host_time=None, temperature=None, missed=0, late=False):
+        self.frame = frame
+        self.index = index
+        self.host_time = time.monotonic() if host_time is None else host_time
+        self.temperature = np.nan if temperature is None else temperature
+        self.missed = missed
+        self.late = late
+        self.meta = {}
+        self.payload = None
+
+
+class PipelineContext:
+    """
+    Run level state shared by the stages and sinks of one pipeline.
+    metadata and counters are read by the sinks when they close, so they must be complete by then.
+    """
+    def __init__(self, serial=None, save_path=None, header_text=None, config=None, metadata=None, counters=None, log=None,
+                 extra_cards=None):
+        self.serial = serial
+        self.save_path = save_path
+        self.header_text = header_text
+        self.config = config or {}
+        self.metadata = metadata
+        self.counters = counters
+        self.log = log or (lambda message: None)
+        self.extra_cards = extra_cards or {}
+
+    def header_cards(self):
+        cards = self.counters.header_cards() if self.counters is not None else {}
+        cards.update(self.extra_cards)
+        return cards
+
+
+class Stage:
+    """
+    Base class for a processing stage. process() returns the (possibly modified) packet, or None to drop it.
+    finish() is called once after the last packet and may return a short summary string for the run log.
+    """
+    name = "stage"
+
+    def setup(self, context):
+        self.context = context
+
+    def process(self, packet):
+        return packet
+
+    def finish(self):
+        return None
+
+
+class Sink:
+    """
+    Base class for a pipeline output. close() is called once after the last packet and returns a
+    short description of what was written (or None).
+    """
+    name = "sink"
+    lossy = False       # drop the oldest queued packet instead of blocking when the sink falls behind
+
+    def setup(self, context):
+        self.context = context
+
+    def write(self, packet):
+        raise NotImplementedError
+
+    def close(self):
+        return None
+
+
+def _load_array(path, stack=False):
+    """Load a calibration frame from a .npy or FITS file. :param stack: keep all frames of a cube"""
+    if path is None:
+        return None
+    if path.endswith(".npy"):
+        data = np.load(path).astype(np.float32)
+    else:
+        from astropy.io import fits
+        with fits.open(path) as hdul:
+            data = np.asarray(hdul[0].data, dtype=np.float32)
+    return data[0] if data.ndim == 3 and not stack else data
+
+
+class CalibrateStage(Stage):
+    """Subtract a bias and/or dark frame and divide by a normalised flat. Output frames are float32."""
+    name = "calibrate"
+
+    def __init__(self, bias=None, dark=None, flat=None):
+        self.bias = _load_array(bias)
+        self.dark = _load_array(dark)
+        flat = _load_array(flat)
+        if flat is not None:
+            flat = flat / np.median(flat)
+            flat[flat <= 0] = 1.0
+        self.flat = flat
+        self.offset = None
+
+    def setup(self, context):
+        super().setup(context)
+        offsets = [a for a in (self.bias, self.dark) if a is not None]
+        self.offset = sum(offsets) if offsets else None
+
+    def process(self, packet):
+        frame = packet.frame.astype(np.float32)
+        if self.offset is not None:
+            frame -= self.offset
+        if self.flat is not None:
+            frame /= self.flat
+        packet.frame = frame
+        return packet
+
+
+class StatsStage(Stage):
+    """Per frame min/max/mean/std, stored in packet.meta["stats"], plus run totals for the log."""
+    name = "stats"
+
+    def __init__(self, every=1):
+        self.every = max(int(every), 1)
+        self.n = 0
+        self.peak = -np.inf
+        self.mean_sum = 0.0
+
+    def process(self, packet):
+        if self.n % self.every == 0:
+            frame = packet.frame
+            stats = {"min": float(frame.min()), "max": float(frame.max()),
+                     "mean": float(frame.mean()), "std": float(frame.std())}
+            packet.meta["stats"] = stats
+            self.peak = max(self.peak, stats["max"])
+            self.mean_sum += stats["mean"]
+        self.n += 1
+        return packet
+
+    def finish(self):
+        sampled = (self.n + self.every - 1) // self.every
+        if not sampled:
+            return None
+        return f"stats: mean {self.mean_sum / sampled:.1f} ADU, peak {self.peak:.0f} ADU over {self.n} frames"
+
+
+class CompressStage(Stage):
+    """Lossless zlib encoding of each frame into packet.payload, for sinks that ship bytes (the frame is kept)."""
+    name = "compress"
+
+    def __init__(self, level=1):
+        self.level = int(level)
+        self.raw_bytes = 0
+        self.packed_bytes = 0
+
+    def process(self, packet):
+        raw = np.ascontiguousarray(packet.frame)
+        packet.payload = zlib.compress(raw.data, self.level)
+        self.raw_bytes += raw.nbytes
+        self.packed_bytes += len(packet.payload)
+        return packet
+
+    def finish(self):
+        if not self.packed_bytes:
+            return None
+        return f"compress: ratio {self.raw_bytes / self.packed_bytes:.2f}"
+
+
+class ExtractStage(Stage):
+    """
+    Crop a region of interest and optionally bin it.
+    :param region: [row_start, row_stop, col_start, col_stop], None keeps the full frame
+    :param binning: square binning factor applied after the crop (pixels are summed)
+    """
+    name = "extract"
+
+    def __init__(self, region=None, binning=1):
+        self.region = region
+        self.binning = max(int(binning), 1)
+
+    def process(self, packet):
+        frame = packet.frame
+        if self.region:
+            r0, r1, c0, c1 = self.region
+            frame = frame[r0:r1, c0:c1]
+        if self.binning > 1:
+            b = self.binning
+            rows, cols = (frame.shape[0] // b) * b, (frame.shape[1] // b) * b
+            frame = frame[:rows, :cols].reshape(rows // b, b, cols // b, b).sum(axis=(1, 3))
+        packet.frame = frame
+        return packet
+
+
+class FitsSink(Sink):
+    """
+    Writes a single FITS cube (with the FRAMES table) on close. With journal on, frames are written to the
+    run journal in chunks as they arrive (see RunJournal), so only one chunk is held in memory and a crash
+    loses at most that chunk; otherwise they are collected in memory.
+    """
+    name = "fits"
+
+    def __init__(self, journal=True, chunkFrames=100):
+        self.use_journal = journal
+        self.chunk_frames = int(chunkFrames)
+        self.journal = None
+        self.frames = []
+
+    def setup(self, context):
+        super().setup(context)
+        if self.use_journal:
+            self.journal = RunJournal(context.save_path, context.serial, header_text=context.header_text,
+                                      chunk_frames=self.chunk_frames)
+
+    def write(self, packet):
+        if self.journal is not None:
+            self.journal.append(packet.frame, packet.index, packet.host_time, packet.temperature, packet.missed, packet.late)
+        else:
+            self.frames.append(packet.frame)
+
+    def close(self):
+        ctx = self.context
+        if self.journal is not None:
+            journal, self.journal = self.journal, None
+            path = journal.finalize(header_cards=ctx.header_cards(), serial=ctx.serial)
+            return f"wrote {path}" if path else None
+        if not self.frames:
+            return None
+        data = self.frames[0] if len(self.frames) == 1 else np.stack(self.frames)
+        self.frames = []
+        path = save_fits_data(data, savepath=ctx.save_path, header_text=ctx.header_text, serial=ctx.serial,
+                              frame_table=ctx.metadata, header_cards=ctx.header_cards())
+        return f"wrote {path}"
+
+
+class WriterSink(Sink):
+    """Appends frames to one of the binary FRAME_WRITERS formats as they arrive."""
+    name = "writer"
+
+    def __init__(self, format="NPY"):
+        if format.upper() not in FRAME_WRITERS:
+            raise ValueError(f"Unknown frame writer format {format}, expected one of {list(FRAME_WRITERS)}")
+        self.format = format.upper()
+        self.writer = None
+
+    def write(self, packet):
+        if self.writer is None:
+            ctx = self.context
+            self.writer = open_frame_writer(self.format, ctx.save_path, packet.frame.shape, dtype=packet.frame.dtype,
+                                            serial=ctx.serial, header_text=ctx.header_text)
+        self.writer.append(packet.frame)
+
+    def close(self):
+        if self.writer is None:
+            return None
+        writer, self.writer = self.writer, None
+        writer.header_cards = self.context.header_cards()
+        if self.context.metadata is not None:
+            writer.write_frame_table(self.context.metadata)
+        path = writer.close()
+        return f"wrote {writer.n_frames} frames to {path}"
+
+
+class PhotonSink(Sink):
+    """
+    Photon counting, saves the photon map (and bit-packed events if configured) on close.
+    :param bias: .npy or FITS stack of bias frames the threshold is set from, None to use the first batch
+    """
+    name = "photon"
+
+    def __init__(self, batchSize=32, bias=None):
+        self.batch_size = int(batchSize)
+        self.bias = bias
+        self.counter = None
+
+    def setup(self, context):
+        super().setup(context)
+        self.counter = PhotonCounter.from_config(context.config, serial=context.serial, batch_size=self.batch_size)
+        if self.counter is None:     # turned off in the camera config, count with the defaults anyway
+            self.counter = PhotonCounter(serial=context.serial, batch_size=self.batch_size)
+        if self.bias:
+            self.counter.calibrate(_load_array(self.bias, stack=True))
+
+    def write(self, packet):
+        self.counter.add_frame(packet.frame)
+
+    def close(self):
+        ctx = self.context
+        photon_map = self.counter.photon_map()
+        if photon_map is None:
+            return None
+        save_fits_data(photon_map, savepath=ctx.save_path, header_text=ctx.header_text, serial=f"{ctx.serial}_photons",
+                       frame_table=ctx.metadata, header_cards=ctx.header_cards())
+        save_fits_data(self.counter.packed_events(), savepath=ctx.save_path, header_text=ctx.header_text,
+                       serial=f"{ctx.serial}_events")
+        return f"saved photon map from {self.counter.n_frames} frames"
+
+
+class LuckySink(Sink):
+    """Shift-and-add and lucky frame selection, saves the _saa and _lucky images on close."""
+    name = "lucky"
+
+    def __init__(self, keepFraction=0.1, locate="peak", metric="peak", expectedFrames=None, maxKeep=500):
+        self.kwargs = dict(keep_fraction=keepFraction, locate=locate, metric=metric,
+                           expected_frames=expectedFrames, max_keep=maxKeep)
+        self.lucky = None
+
+    def setup(self, context):
+        super().setup(context)
+        self.lucky = LuckyAccumulator(serial=context.serial, **self.kwargs)
+
+    def write(self, packet):
+        self.lucky.add_frame(packet.frame)
+
+    def close(self):
+        products = self.lucky.products()
+        if products is None:
+            return None
+        ctx = self.context
+        save_fits_data(products["shift_and_add"], savepath=ctx.save_path, header_text=ctx.header_text, serial=f"{ctx.serial}_saa")
+        save_fits_data(products["lucky_image"], savepath=ctx.save_path, header_text=ctx.header_text, serial=f"{ctx.serial}_lucky")
+        return f"saved lucky imaging products ({len(products['lucky_frames'])} of {products['n_frames']} frames kept)"
+
+
+class SegmentedSink(Sink):
+    """
+    Rolling output for run-till-abort acquisitions. Frames go to numbered segment files in a run directory,
+    a new segment is started every framesPerSegment frames and/or secondsPerSegment seconds, so memory stays
+    bounded by one segment (FITS) or one frame (binary formats). Each segment carries its own frame table.
+    index.json in the run directory lists the segments with their SDK frame ranges and wall clock times and is
+    rewritten after every segment, so it is usable while the run is still going or if it is cut short.
+    """
+    name = "segments"
+
+    def __init__(self, format="FITS", framesPerSegment=1000, secondsPerSegment=None):
+        self.format = format.upper()
+        if self.format != "FITS" and self.format not in FRAME_WRITERS:
+            raise ValueError(f"Unknown segment format {format}, expected FITS or one of {list(FRAME_WRITERS)}")
+        self.frames_per_segment = int(framesPerSegment) if framesPerSegment else None
+        self.seconds_per_segment = float(secondsPerSegment) if secondsPerSegment else None
+        if not self.frames_per_segment and not self.seconds_per_segment:
+            raise ValueError("A segmented run needs framesPerSegment and/or secondsPerSegment")
+        self.segments = []
+        self._reset_segment()
+
+    def setup(self, context):
+        super().setup(context)
+        curr_date = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+        self.run_dir = os.path.join(context.save_path, f"{curr_date}_{context.serial}_run")
+        os.makedirs(self.run_dir, exist_ok=True)
+        self.index_path = os.path.join(self.run_dir, "index.json")
+        # reference pair to turn monotonic host times into unix times in the index
+        self.mono_ref = time.monotonic()
+        self.unix_ref = time.time()
+        self._write_index(complete=False)
+
+    def _reset_segment(self):
+        self.frames = []
+        self.writer = None
+        self.recorder = None
+        self.segment_start = None
+
+    def write(self, packet):
+        if self.recorder is not None and self._segment_full(packet.host_time):
+            self._close_segment()
+        if self.recorder is None:
+            self.recorder = FrameMetadataRecorder(capacity=self.frames_per_segment or 1024)
+            self.recorder.mono_ref, self.recorder.unix_ref = self.mono_ref, self.unix_ref
+            self.segment_start = packet.host_time
+        if self.format == "FITS":
+            self.frames.append(packet.frame)
+        else:
+            if self.writer is None:
+                self.writer = open_frame_writer(self.format, self.run_dir, packet.frame.shape, dtype=packet.frame.dtype,
+                                                serial=self._segment_name(), header_text=self.context.header_text)
+            self.writer.append(packet.frame)
+        self.recorder.record(sdk_index=packet.index, temperature=packet.temperature, host_time=packet.host_time,
+                             missed=packet.missed, late=packet.late)
+
+    def _segment_full(self, host_time):
+        if self.frames_per_segment and len(self.recorder) >= self.frames_per_segment:
+            return True
+        return bool(self.seconds_per_segment and host_time - self.segment_start >= self.seconds_per_segment)
+
+    def _segment_name(self):
+        return f"{self.context.serial}_seg{len(self.segments):05d}"
+
+    def _unix(self, host_time):
+        return self.unix_ref + (host_time - self.mono_ref)
+
+    def _close_segment(self):
+        table = self.recorder.table()
+        cards = dict(self.context.header_cards())
+        cards["SEGMENT"] = (len(self.segments), "segment number in the run")
+        cards["FIRSTFRM"] = (int(table["SDK_INDEX"][0]), "SDK index of the first frame")
+        cards["LASTFRM"] = (int(table["SDK_INDEX"][-1]), "SDK index of the last frame")
+        if self.format == "FITS":
+            data = self.frames[0] if len(self.frames) == 1 else np.stack(self.frames)
+            path = save_fits_data(data, savepath=self.run_dir, header_text=self.context.header_text,
+                                  serial=self._segment_name(), frame_table=self.recorder, header_cards=cards)
+        else:
+            self.writer.header_cards = cards
+            self.writer.write_frame_table(self.recorder)
+            path = self.writer.close()
+        self.segments.append({
+            "segment": len(self.segments),
+            "file": os.path.basename(path),
+            "n_frames": len(table),
+            "first_frame": int(table["SDK_INDEX"][0]),
+            "last_frame": int(table["SDK_INDEX"][-1]),
+            "start_time": self._unix(float(table["HOST_TIME"][0])),
+            "end_time": self._unix(float(table["HOST_TIME"][-1])),
+            "missed": int(table["MISSED"].sum()),
+        })
+        self._reset_segment()
+        self._write_index(complete=False)
+        self.context.log(f"closed segment {self.segments[-1]['segment']} ({self.segments[-1]['n_frames']} frames)")
+
+    def _write_index(self, complete):
+        index = {
+            "serial": self.context.serial,
+            "format": self.format,
+            "frames_per_segment": self.frames_per_segment,
+            "seconds_per_segment": self.seconds_per_segment,
+            "complete": complete,
+            "n_frames": sum(s["n_frames"] for s in self.segments),
+            "segments": self.segments,
+        }
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(index, f, indent=2)
+        os.replace(tmp, self.index_path)      # readers never see a half written index
+
+    def close(self):
+        if self.recorder is not None and len(self.recorder):
+            self._close_segment()
+        self._write_index(complete=True)
+        return f"wrote {len(self.segments)} segment(s) to {self.run_dir}"
+
+
+class CallbackSink(Sink):
+    """Calls a function with each frame, e.g. the GUI preview. Lossy so it never holds up the acquisition."""
+    name = "preview"
+    lossy = True
+
+    def __init__(self, callback=None, min_interval=0.0):
+        self.callback = callback
+        self.min_interval = float(min_interval)
+        self._last = 0.0
+
+    def write(self, packet):
+        now = time.monotonic()
+        if self.callback is None or now - self._last < self.min_interval:
+            return
+        self._last = now
+        self.callback(packet.frame)
+
+
+class NetworkSink(Sink):
+    """
+    Publishes each frame to the running FrameServer (see backend/frameServer.py), does nothing if it is off.
+    :param serial: camera serial subscribers filter on, defaults to the context serial
+    """
+    name = "network"
+    lossy = True
+
+    def __init__(self, serial=None):
+        self.serial = serial
+
+    def setup(self, context):
+        super().setup(context)
+        self.server = get_frame_server()
+        self.serial = str(self.serial or context.serial)
+
+    def write(self, packet):
+        if self.server is not None:
+            self.server.publish(self.serial, packet.frame, packet.index, packet.host_time, packet.payload)
+
+
+STAGE_TYPES = {
+    "calibrate": CalibrateStage,
+    "stats": StatsStage,
+    "compress": CompressStage,
+    "extract": ExtractStage,
+}
+
+SINK_TYPES = {
+    "fits": FitsSink,
+    "writer": WriterSink,
+    "photon": PhotonSink,
+    "lucky": LuckySink,
+    "segments": SegmentedSink,
+    "preview": CallbackSink,
+    "network": NetworkSink,
+}
+
+
+class Pipeline:
+    """
+    Threads and bounded queues connecting the stages and sinks for one camera.
+
+    :param stages: list of Stage, run in order
+    :param sinks: list of Sink, each receives every packet leaving the last stage
+    :param queue_size: capacity of every queue between stages and in front of each sink
+    """
+    def __init__(self, stages=None, sinks=None, queue_size=64, serial=None):
+        self.stages = list(stages or [])
+        self.sinks = list(sinks or [])
+        self.queue_size = queue_size
+        self.serial = serial
+        self.logger = get_camera_logger(serial)
+        self.error = None
+        self.submitted = 0
+        self.dropped = {}           # sink name -> packets dropped by lossy sinks
+        self._threads = []
+        self._queues = []
+        self._sink_queues = []
+
+    def start(self, context):
+        """Set up the stages and sinks and start their threads."""
+        self.context = context
+        for element in self.stages + self.sinks:
+            element.setup(context)
+        self._queues = [Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+        self._sink_queues = [Queue(maxsize=self.queue_size) for _ in self.sinks]
+        for i, stage in enumerate(self.stages):
+            self._spawn(self._stage_loop, i, f"{stage.name}-{self.serial}")
+        self._spawn(self._fanout_loop, None, f"fanout-{self.serial}")
+        for i, sink in enumerate(self.sinks):
+            self._spawn(self._sink_loop, i, f"{sink.name}-{self.serial}")
+        return self
+
+    def _spawn(self, target, arg, name):
+        thread = threading.Thread(target=target, args=(arg,) if arg is not None else (), name=name, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def submit(self, packet, timeout=None):
+        """Queue a packet at the head of the pipeline. Blocks while the first queue is full (back-pressure)."""
+        if self.error is not None:
+            raise PipelineError(f"Pipeline for camera {self.serial} failed: {self.error}")
+        with instrumentation.span("pipeline_submit", self.serial):
+            self._queues[0].put(packet, timeout=timeout)
+        self.submitted += 1
+
+    def _fail(self, where, exc):
+        if self.error is None:
+            self.error = f"{where}: {exc}"
+        self.logger.error(f"Pipeline {where} failed for camera {self.serial}: {exc}")
+
+    def _stage_loop(self, i):
+        stage, inbox, outbox = self.stages[i], self._queues[i], self._queues[i + 1]
+        while True:
+            packet = inbox.get()
+            if packet is _STOP:
+                outbox.put(_STOP)
+                return
+            if self.error is not None:
+                continue        # drain so the producer never blocks on a dead pipeline
+            try:
+                with instrumentation.span(f"stage_{stage.name}", self.serial):
+                    packet = stage.process(packet)
+            except Exception as e:
+                self._fail(f"stage {stage.name}", e)
+                continue
+            if packet is not None:
+                outbox.put(packet)
+
+    def _fanout_loop(self):
+        inbox = self._queues[-1]
+        while True:
+            packet = inbox.get()
+            for sink, queue in zip(self.sinks, self._sink_queues):
+                if packet is _STOP or not sink.lossy:
+                    queue.put(packet)
+                    continue
+                try:
+                    queue.put_nowait(packet)
+                except Full:
+                    try:
+                        queue.get_nowait()
+                        self.dropped[sink.name] = self.dropped.get(sink.name, 0) + 1
+                    except Empty:
+                        pass
+                    queue.put(packet)
+            if packet is _STOP:
+                return
+
+    def _sink_loop(self, i):
+        sink, inbox = self.sinks[i], self._sink_queues[i]
+        while True:
+            packet = inbox.get()
+            if packet is _STOP:
+                return
+            if self.error is not None:
+                continue
+            try:
+                with instrumentation.span(f"sink_{sink.name}", self.serial):
+                    sink.write(packet)
+            except Exception as e:
+                self._fail(f"sink {sink.name}", e)
+
+    def close(self, timeout=None):
+        """
+        Flush every queue, stop the threads and close the stages and sinks.
+        :return: list of summary strings from the stages and sinks, for the run log
+        :raises PipelineError: if a stage or sink failed during the run
+        """
+        if self._queues:
+            self._queues[0].put(_STOP)
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+        summaries = []
+        for element in self.stages + self.sinks:
+            try:
+                summary = element.finish() if isinstance(element, Stage) else element.close()
+            except Exception as e:
+                self._fail(f"closing {element.name}", e)
+                continue
+            if summary:
+                summaries.append(f"{element.name} {summary}" if isinstance(element, Sink) else summary)
+        for name, n in self.dropped.items():
+            summaries.append(f"{name} dropped {n} frame(s) to keep up")
+        if self.error is not None:
+            raise PipelineError(f"Pipeline for camera {self.serial} failed: {self.error}")
+        return summaries
+
+
+def _build(types, spec, kind):
+    spec = dict(spec)
+    type_name = spec.pop("type", None)
+    if type_name not in types:
+        raise ValueError(f"Unknown pipeline {kind} '{type_name}', expected one of {list(types)}")
+    return types[type_name](**spec)
+
+
+def build_pipeline(spec, serial=None, extra_sinks=None):
+    """
+    Build a Pipeline from a dict (see the module docstring).
+    :param extra_sinks: already constructed sinks appended to the ones in the spec (e.g. a GUI callback)
+    """
+    spec = spec or {}
+    stages = [_build(STAGE_TYPES, s, "stage") for s in spec.get("stages", [])]
+    sinks = [_build(SINK_TYPES, s, "sink") for s in spec.get("sinks", [])]
+    sinks.extend(extra_sinks or [])
+    return Pipeline(stages, sinks, queue_size=int(spec.get("queueSize", 64)), serial=serial)
+
+
+def default_pipeline_spec(save_format="FITS", photon_counting=False, lucky_settings=None, expected_frames=None, segments=None):
+    """
+    The pipeline matching the Experiment tab settings when no named profile is selected.
+    :param segments: {"framesPerSegment": ..., "secondsPerSegment": ...} for a run-till-abort acquisition
+    """
+    sinks = []
+    if photon_counting:
+        sinks.append({"type": "photon"})
+    elif segments:
+        sinks.append(dict(segments, type="segments", format=save_format))
+    elif save_format == "FITS":
+        sinks.append({"type": "fits"})
+    else:
+        sinks.append({"type": "writer", "format": save_format})
+    if lucky_settings and lucky_settings.get("enabled"):
+        sinks.append({"type": "lucky", "keepFraction": lucky_settings["keep_fraction"],
+                      "locate": lucky_settings["locate"], "expectedFrames": expected_frames})
+    return {"queueSize": 64, "stages": [], "sinks": sinks}
+
+
+def load_pipeline_profiles(path=PIPELINE_PROFILES_PATH):
+    """:return: {profile name: pipeline spec}, empty if the profiles file does not exist"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f).get("pipelines", {})
@@ -0,0 +1,205 @@
+import copy
+import math
+import numpy as np
+from backend.cameraLogging import get_camera_logger
+
+'''
+Exposure / EM gain auto-tuning.
+
+Short bursts are grabbed through the Camera API and reduced to one histogram (np.bincount over the
+uint16 pixels), from which the bias level, read noise, peak level, saturated fraction and the fraction
+of pixels above the photon threshold all follow without sorting. The signal scales linearly with
+exposure time times EM gain, so every burst gives a multiplicative correction and the search converges
+in a few bursts. Two targets:
+
+    "peak"             the brightest pixels (all but PEAK_PIXELS per frame, so hot pixels and cosmic rays
+                       do not count) sit at peak_fraction of the saturation level, exposure is raised
+                       before EM gain and gain is lowered before exposure
+    "photon_counting"  EM gain fixed high, exposure set so that the fraction of pixels with an event
+                       per frame is the requested occupancy (low enough for little coincidence loss)
+
+EM gain is clamped to the range the camera reports for its current EM gain mode (get_EMCCD_gain_range).
+The linear model only holds in the real gain mode. In the SDK's default DAC mode the gain setting is a DAC
+step (0-255) and the real gain grows faster than linearly with it. Every iteration measures the effect of
+the last step again, so a DAC camera still converges but takes more bursts. Whole gain steps are coarse at
+low gain, so a gain step is rounded in the direction of the correction and the exposure takes up the rest.
+'''
+
+TARGETS = ("peak", "photon_counting")
+SATURATION_ADU = 65535
+PEAK_PIXELS = 5             # pixels per frame allowed above the peak level, and allowed to saturate
+MAX_STEP = 8.0              # largest change of exposure x gain in one iteration
+DEFAULT_GAIN_LIMITS = (1, 300)      # used when the camera cannot report its EM gain range
+
+
+def frame_statistics(frames, saturation=SATURATION_ADU, threshold_sigma=5.0, peak_pixels=PEAK_PIXELS):
+    """
+    Histogram statistics of a burst of frames (frame axis first, integer ADU).
+    :return: dict with bias, sigma, median, peak (the level only peak_pixels per frame exceed), max,
+             saturated (saturated pixels per frame) and event_fraction
+    """
+    data = np.asarray(frames)
+    n_frames = data.shape[0] if data.ndim == 3 else 1
+    if data.dtype != np.uint16:
+        data = np.clip(data, 0, 65535).astype(np.uint16)
+    hist = np.bincount(data.ravel(), minlength=65536)
+    cdf = np.cumsum(hist)
+    n = int(cdf[-1])
+    median = int(np.searchsorted(cdf, 0.5 * n))
+    peak = int(np.searchsorted(cdf, max(n - peak_pixels * n_frames, 1)))
+    # the bias is the mode of the lower half, its noise comes from the side below it where there is no signal:
+    # for a Gaussian 31.7 % of the pixels below the mean lie more than one sigma below it
+    bias = int(np.argmax(hist[:median + 1]))
+    below = int(cdf[bias - 1]) if bias > 0 else 0
+    sigma = max(float(bias - np.searchsorted(cdf, 0.3173 * below)), 0.5) if below else 1.0
+    threshold = bias + threshold_sigma * sigma
+    first_event = min(int(math.floor(threshold)) + 1, 65536)
+    return {
+        "bias": bias,
+        "sigma": sigma,
+        "median": median,
+        "peak": peak,
+        "max": int(np.flatnonzero(hist)[-1]),
+        "saturated": float(cdf[-1] - cdf[saturation - 1]) / n_frames if saturation > 0 else 0.0,
+        "event_fraction": float(n - cdf[first_event - 1]) / n if first_event <= 65535 else 0.0,
+    }
+
+
+def camera_gain_limits(camera, limits=None):
+    """
+    :param limits: (low, high) wanted, None for the camera's whole range
+    :return: the EM gain limits within the camera's range, gain 0 (EM off) excluded
+    """
+    try:
+        low, high = camera.get_EMCCD_gain_range()
+    except Exception:
+        low, high = DEFAULT_GAIN_LIMITS
+    if limits is not None:
+        low, high = max(low, limits[0]), min(high, limits[1])
+    low = max(int(low), 1)
+    return low, max(int(high), low)
+
+
+def apply_result(config, result):
+    """:return: a copy of a camera config dict with the tuned exposure and EM gain written in"""
+    config = copy.deepcopy(config)
+    config["exposureTime"] = result["exposureTime"]
+    em = config.setdefault("emGain", {})
+    em["gainLevel"] = result["gainLevel"]
+    if result["target"] == "photon_counting":
+        em["state"] = "ON"
+        em["photonCounting"] = "ON"
+    if float(config.get("KineticCycleTime", 0)) < result["exposureTime"]:
+        config["KineticCycleTime"] = result["exposureTime"]
+    return config
+
+
+class AutoExposure:
+    """
+    Tune a camera's exposure time and EM gain from live bursts. The camera must be free (not acquiring).
+
+    :param target: "peak" or "photon_counting"
+    :param peak_fraction: for "peak", where the peak level should sit as a fraction of saturation
+    :param occupancy: for "photon_counting", the wanted fraction of pixels with an event per frame
+    :param burst: frames grabbed per iteration
+    :param tolerance: stop once the correction is within this fraction of 1
+    :param gain_limits: (low, high) EM gain, narrowed to the camera's range, None for the camera's range
+    """
+    def __init__(self, camera, target="peak", peak_fraction=0.7, occupancy=0.1, saturation=SATURATION_ADU,
+                 burst=5, max_iterations=8, tolerance=0.1, exposure_limits=(1e-5, 10.0), gain_limits=None,
+                 photon_counting_gain=300, threshold_sigma=5.0):
+        if target not in TARGETS:
+            raise ValueError(f"Unknown auto exposure target '{target}', expected one of {TARGETS}")
+        self.camera = camera
+        self.target = target
+        self.peak_fraction = peak_fraction
+        self.occupancy = occupancy
+        self.saturation = saturation
+        self.burst = burst
+        self.max_iterations = max_iterations
+        self.tolerance = tolerance
+        self.exposure_limits = exposure_limits
+        self.gain_limits = camera_gain_limits(camera, gain_limits)
+        self.photon_counting_gain = photon_counting_gain
+        self.threshold_sigma = threshold_sigma
+        self.logger = get_camera_logger(camera.serialNumber)
+        self.history = []
+        self._too_bright = math.inf     # lowest exposure x gain seen saturating
+
+    def measure(self, exposure, gain):
+        """Set exposure and gain, grab a burst and return its statistics."""
+        self.camera.set_exposure(exposure)
+        self.camera.set_EMCCD_gain(gain, advanced=False)
+        frames = np.asarray(self.camera.grab(nframes=self.burst, frame_timeout=exposure + 5.0))
+        return frame_statistics(frames, self.saturation, self.threshold_sigma)
+
+    def correction(self, stats):
+        """:return: the factor exposure x gain should be multiplied by"""
+        if stats["saturated"] > PEAK_PIXELS:
+            return 1.0 / 4
+        if self.target == "photon_counting":
+            p = min(stats["event_fraction"], 0.999)
+            if p <= 0:
+                return MAX_STEP
+            # Poisson: the mean number of photons per pixel is -ln(1 - p), and it is what scales with exposure
+            factor = math.log1p(-self.occupancy) / math.log1p(-p)
+        else:
+            signal = stats["peak"] - stats["bias"]
+            if signal <= 3 * stats["sigma"]:
+                return MAX_STEP
+            factor = (self.peak_fraction * self.saturation - stats["bias"]) / signal
+        return min(max(factor, 1.0 / MAX_STEP), MAX_STEP)
+
+    def step(self, exposure, gain, factor):
+        """Spread a correction over exposure and gain. :return: (exposure, gain)"""
+        emin, emax = self.exposure_limits
+        gmin, gmax = self.gain_limits
+        if self.target == "photon_counting":
+            return min(max(exposure * factor, emin), emax), gain
+        if factor >= 1:
+            # exposure first, the gain makes up what the exposure limit leaves (rounded up)
+            new_exposure = min(exposure * factor, emax)
+            new_gain = math.ceil(gain * factor * exposure / new_exposure - 1e-6)
+        else:
+            # gain first (rounded down), the exposure makes up the rest
+            new_gain = math.floor(gain * factor + 1e-6)
+        new_gain = min(max(new_gain, gmin), gmax)
+        return min(max(exposure * factor * gain / new_gain, emin), emax), new_gain
+
+    def run(self, exposure=None, gain=None):
+        """
+        :param exposure, gain: starting point, defaults to the camera's current config
+        :return: dict with exposureTime, gainLevel, target, converged, iterations and the per burst history
+        """
+        cfg = self.camera.cam_config or {}
+        exposure = float(exposure or cfg.get("exposureTime") or 0.01)
+        gain = int(gain or cfg.get("emGain", {}).get("gainLevel", 1))
+        if self.target == "photon_counting":
+            gain = self.photon_counting_gain
+        exposure = min(max(exposure, self.exposure_limits[0]), self.exposure_limits[1])
+        gain = min(max(gain, self.gain_limits[0]), self.gain_limits[1])
+
+        converged = False
+        for iteration in range(1, self.max_iterations + 1):
+            stats = self.measure(exposure, gain)
+            factor = self.correction(stats)
+            product = exposure * gain
+            if stats["saturated"] > PEAK_PIXELS:
+                self._too_bright = min(self._too_bright, product)
+            elif product * factor >= self._too_bright:
+                # a saturated burst bounds the search from above, bisect (geometrically) towards it
+                factor = math.sqrt(self._too_bright / product)
+            self.history.append(dict(stats, exposure=exposure, gain=gain, factor=factor))
+            self.logger.info(f"Auto exposure {iteration}: exposure {exposure:.6g} s, gain {gain}, peak {stats['peak']} ADU, "
+                             f"saturated {stats['saturated']:.2e}, events {stats['event_fraction']:.3f}, correction x{factor:.3g}")
+            if abs(factor - 1) <= self.tolerance:
+                converged = True
+                break
+            new_exposure, new_gain = self.step(exposure, gain, factor)
+            if math.isclose(new_exposure, exposure) and new_gain == gain:
+                self.logger.warning("Auto exposure stopped at the exposure/gain limits")
+                break
+            exposure, gain = new_exposure, new_gain
+
+        return {"exposureTime": round(exposure, 6), "gainLevel": int(gain), "target": self.target,
+                "converged": converged, "iterations": len(self.history), "history": self.history}
@@ -2,28 +2,22 @@ import json
 from pprint import pprint
 from pylablib.devices import Andor
 from pylablib.devices.Andor import AndorSDK2Camera
+from pylablib.devices.Andor.AndorSDK2 import _camfunc, lib as sdk2_lib
 import os
-from enum import Enum
 import logging as log
+from backend.cameraLogging import get_camera_logger
+from backend.instrumentation import instrumentation
+from backend.cameraState import CameraState
 '''
 class: AndorCamera
 description: This is a basic andor camera class. This class will contain all of the methods needed for configuring the andor cameras
 
 '''
-class CameraState(Enum):
-    CONNECTED = 1
-    DISCONNECTED = 2
-    ACQUIRING = 3
-    NOT_ACQUIRING = 4
-    CONFIGURED = 5
-    NOT_CONFIGURED = 6
-    ERROR = 7
-    
 
 class Camera(AndorSDK2Camera):
     def __init__(self, idx, temperature=None, fan_mode='full', amp_mode=None):
         super().__init__(idx=idx, temperature=temperature, fan_mode=fan_mode, amp_mode=amp_mode)
-        self.serialNumber = None
+        self.serialNumber = None    # also sets up self.logger, see the serialNumber property
         self.cam_config = None
         self.head_model = None
         self.controller_mode = None
@@ -31,24 +25,21 @@ class Camera(AndorSDK2Camera):
         self.connection_status = CameraState.CONNECTED if self.is_opened() else CameraState.DISCONNECTED
         self.is_in_acquisition = CameraState.NOT_ACQUIRING
         self.is_configured = CameraState.NOT_CONFIGURED
-        self.logger = self.setup_logging()  # for now implement the logging feature automatically. we might want to change that later if it takes up too much time.
+        self.handed_off = False     # True while a CameraProcess owns the camera, the handle here is closed meanwhile
 
+    @property
+    def serialNumber(self):
+        return self._serialNumber
+
+    @serialNumber.setter
+    def serialNumber(self, serial):
+        # the logger is keyed on the serial, so it has to follow it (the serial is only known after get_device_info)
+        self._serialNumber = serial
+        self.logger = self.setup_logging()
 
     def setup_logging(self):
-        logger = log.getLogger(f"Camera-{self.serialNumber}")
-        logger.setLevel(log.DEBUG)
-
-        if not logger.handlers:
-            dir_path = os.path.dirname(os.path.realpath(__file__))
-            if not os.path.exists(f"{dir_path}/logs"):
-                os.makedirs(f"{dir_path}/logs")
-            save_path = f"{dir_path}/logs"
-            handler = log.FileHandler(f'{save_path}/camera_{self.serialNumber}.log')
-            handler.setLevel(log.DEBUG)
-            formatter = log.Formatter('[%(asctime)s] %(name)s:%(levelname)s:%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
-        return logger
+        """Queue backed logger routed to logs/camera_<serial>.log (camera_None.log until the serial is known)."""
+        return get_camera_logger(self.serialNumber)
     def disconnect(self):
         try:
             if self.is_opened():
@@ -61,6 +52,7 @@ class Camera(AndorSDK2Camera):
                 return False
         except Exception as e:
             self.logger.error(f"Error disconnecting camera {self.serialNumber}: {e}")
+    @instrumentation.timed("camera_configuration", key_attr="serialNumber")
     def camera_configuration(self, configDict=None, configDir = None):
         '''
         :param cameraDict: A dictionary that contains two elements. 1. Camera OBJ, 2. Camera config dict
@@ -139,7 +131,7 @@ class Camera(AndorSDK2Camera):
                     self.setup_shutter(mode='auto')
                 elif (configDict['shutterSettings']['ExternalShutter'].lower() == 'open'):
                     self.setup_shutter(mode='open')
-                elif (configDict['shutterSettings']['ExternalShutter'].lower() == 'close'):
+                elif (configDict['shutterSettings']['ExternalShutter'].lower() in ('close', 'closed')):
                     self.setup_shutter(mode='closed')
 
 
@@ -168,6 +160,7 @@ class Camera(AndorSDK2Camera):
         self.is_configured = CameraState.NOT_CONFIGURED
         return False
 
+    @instrumentation.timed("configure_amp_mode", key_attr="serialNumber")
     def _configure_amp_mode(self, configDict):
         configured_amp = False
         channel = 0
@@ -220,6 +213,15 @@ class Camera(AndorSDK2Camera):
         self.is_in_acquisition = CameraState.ACQUIRING if self.get_status() == "acquiring" else CameraState.NOT_ACQUIRING
         return self.is_in_acquisition
 
+    @_camfunc
+    def get_EMCCD_gain_range(self):
+        """
+        :return: (low, high) EM gain settings the camera accepts in its current EM gain mode (SDK GetEMGainRange).
+        In the default DAC mode these are DAC steps (0-255), which are not proportional to the real gain.
+        """
+        low, high = sdk2_lib.GetEMGainRange()
+        return int(low), int(high)
+
     def full_camera_info(self):
         pprint(self.get_full_info(include = 'all'))
         pprint(self.get_full_status(include = 'all'))
@@ -1,6 +1,12 @@
+import io
 import os
-from astropy.io import fits
+import json
+import numpy as np
 from datetime import datetime
+from backend.instrumentation import instrumentation
+
+# keywords that describe the data array itself, astropy sets these from the data we write
+STRUCTURAL_KEYWORDS = {"SIMPLE", "BITPIX", "NAXIS", "NAXIS1", "NAXIS2", "NAXIS3", "EXTEND", "BSCALE", "BZERO"}
 
 def Header_from_text(header_text, header):
     x = 0
@@ -57,15 +63,38 @@ def buildFromTextFile(filename, header):
     with open(filename, 'r') as f:
         Header_from_text(f, header)
 
+def _keyword_lines(header_text):
+    """Keep only the KEY = value lines of the FITS Header tab text (free notes are skipped)."""
+    return io.StringIO("".join(line for line in header_text.splitlines(keepends=True) if "=" in line))
+
+def _drop_structural(header):
+    """Remove user supplied cards that would rescale or reshape the data (e.g. BZERO = 32768 from a template)."""
+    for key in list(header.keys()):
+        if key.strip().upper() in STRUCTURAL_KEYWORDS:
+            del header[key]
+    return header
+
 def buildHeader(hdul, header, filename = None, header_text = None):
+    parsed = type(header)()
     if(filename is not None):
-        buildFromTextFile(filename, header)
-    else:
-        Header_from_text(header_text, header)
+        buildFromTextFile(filename, parsed)
+    elif isinstance(header_text, str):
+        Header_from_text(_keyword_lines(header_text), parsed)
+    elif header_text is not None:
+        Header_from_text(header_text, parsed)
+    for card in _drop_structural(parsed).cards:
+        header[card.keyword] = (card.value, card.comment)
 
     return
 
-def save_fits_data(data, savepath=None, header_text=None, serial=None):
+@instrumentation.timed("save_fits_data", key_arg="serial")
+def save_fits_data(data, savepath=None, header_text=None, serial=None, frame_table=None, header_cards=None):
+    """
+    Save a frame or cube to <savepath>/<date>_<serial>.fits.
+    :param header_text: FITS Header tab text, KEY = value lines are added to the primary header
+    :param frame_table: optional per-frame metadata (a FrameMetadataRecorder or a BinTableHDU), saved as the FRAMES extension
+    :param header_cards: optional {keyword: (value, comment)} added to the primary header, e.g. frame loss counters
+    """
     if data is None:
         return 
     if savepath is None:
@@ -73,13 +102,62 @@ def save_fits_data(data, savepath=None, header_text=None, serial=None):
         dir_path = os.path.dirname(os.path.realpath(__file__))
         savepath = dir_path + "/data"
     
+    from astropy.io import fits     # astropy is slow to import, only load it once a FITS file is written
     hdu = fits.PrimaryHDU(data)
     hdul = fits.HDUList([hdu])
-    hdr = buildHeader(hdul=hdul, header=hdul[0].header, filename=None)
+    buildHeader(hdul=hdul, header=hdul[0].header, filename=None, header_text=header_text)
+    for key, card in (header_cards or {}).items():
+        hdul[0].header[key] = card
+    if frame_table is not None:
+        hdul.append(frame_table.to_table_hdu() if hasattr(frame_table, "to_table_hdu") else frame_table)
     curr_date = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
     
     filename = f"{savepath}/{curr_date}_{serial}.fits" if serial else f"{savepath}/{curr_date}.fits"
     hdul.writeto(filename, overwrite=True)
+    return filename
+
+def _fits_storage(chunk):
+    """Chunk in the form FITS stores it: unsigned integers are kept signed with a BZERO offset."""
+    chunk = np.asarray(chunk)
+    if chunk.dtype.kind == "u" and chunk.dtype.itemsize > 1:
+        offset = chunk.dtype.type(1 << (8 * chunk.dtype.itemsize - 1))
+        return (chunk ^ offset).view(chunk.dtype.str.replace("u", "i"))
+    return chunk
+
+@instrumentation.timed("save_fits_chunks", key_arg="serial")
+def save_fits_chunks(chunks, frame_shape, dtype, savepath, header_text=None, serial=None, frame_table=None, header_cards=None):
+    """
+    Like save_fits_data, but the cube is streamed to disk one chunk (frame axis first) at a time, so only
+    one chunk is ever in memory. chunks must be a sequence (its chunks are read once, in order).
+    A single frame is saved as a 2D image, as save_fits_data does.
+    """
+    from astropy.io import fits
+    n_frames = sum(len(chunk) for chunk in chunks)
+    if n_frames == 0:
+        return None
+    os.makedirs(savepath, exist_ok=True)
+    shape = tuple(frame_shape) if n_frames == 1 else (n_frames,) + tuple(frame_shape)
+    # header of a one pixel image of the same type (BITPIX, BZERO), then the real axes
+    header = fits.PrimaryHDU(np.zeros((1,) * len(shape), dtype=dtype)).header
+    for axis, length in enumerate(reversed(shape), start=1):
+        header[f"NAXIS{axis}"] = length
+    buildHeader(hdul=None, header=header, filename=None, header_text=header_text)
+    for key, card in (header_cards or {}).items():
+        header[key] = card
+    curr_date = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+    filename = f"{savepath}/{curr_date}_{serial}.fits" if serial else f"{savepath}/{curr_date}.fits"
+    if os.path.exists(filename):
+        os.remove(filename)
+    stream = fits.StreamingHDU(filename, header)
+    try:
+        for chunk in chunks:
+            stream.write(_fits_storage(np.ascontiguousarray(chunk, dtype=dtype)))
+    finally:
+        stream.close()
+    if frame_table is not None:
+        with fits.open(filename, mode="append") as hdul:
+            hdul.append(frame_table.to_table_hdu() if hasattr(frame_table, "to_table_hdu") else frame_table)
+    return filename
 
 def save_csv_data(data, savepath=None, header_text=None):
     if data is None:
@@ -115,4 +193,288 @@ def save_xlsx_data(data, savepath=None, header_text=None):
     
     if header_text is not None:
         with open(f"{savepath}/{curr_date}--header.txt", 'w') as f:
-            f.write(header_text)
\ No newline at end of file
+            f.write(header_text)
+
+'''
+Binary frame writers.
+
+These keep the frame axis and can be appended to chunk by chunk while the acquisition is running,
+so a run never has to be held in memory or pushed through a DataFrame. Every format writes the
+FITS Header tab text alongside the pixels as a JSON sidecar / attributes. Every sync_frames frames the
+writers bring their on-disk shape up to date (sync()), so a run that crashes leaves a readable file
+with all but the last few frames in it.
+'''
+
+def header_text_to_dict(header_text):
+    """Parse the FITS Header tab text into a plain {keyword: value} dict for the binary formats."""
+    if not header_text:
+        return {}
+    from astropy.io import fits
+    header = fits.Header()
+    Header_from_text(_keyword_lines(header_text), header)
+    return {k: v for k, v in _drop_structural(header).items()}
+
+def _sidecar_metadata(serial, shape, dtype, header_text, extra=None):
+    meta = {
+        "serial": serial,
+        "created": datetime.now().isoformat(),
+        "shape": list(shape),
+        "dtype": np.dtype(dtype).str,
+        "header": header_text_to_dict(header_text),
+        "header_text": header_text or "",
+    }
+    if extra:
+        meta.update(extra)
+    return meta
+
+def _run_basename(savepath, serial):
+    curr_date = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+    return f"{savepath}/{curr_date}_{serial}" if serial else f"{savepath}/{curr_date}"
+
+
+class FrameWriter:
+    """
+    Base class for appendable frame writers. Frames are (rows, cols) arrays, the frame axis is axis 0 on disk.
+    """
+    extension = ""
+    sync_frames = 100       # frames between sync() calls
+
+    def __init__(self, savepath, frame_shape, dtype=np.uint16, serial=None, header_text=None):
+        os.makedirs(savepath, exist_ok=True)
+        self.frame_shape = tuple(frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.serial = serial
+        self.header_text = header_text
+        self.n_frames = 0
+        self.path = _run_basename(savepath, serial) + self.extension
+        self.header_cards = {}   # {keyword: (value, comment)} added to the metadata when the writer is closed
+        self._synced = 0
+
+    def append(self, frames):
+        """Append a frame (2D) or a chunk of frames (3D) to the file."""
+        frames = np.asarray(frames, dtype=self.dtype)
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if frames.shape[1:] != self.frame_shape:
+            raise ValueError(f"Frame shape {frames.shape[1:]} does not match writer shape {self.frame_shape}")
+        self._write(np.ascontiguousarray(frames))
+        self.n_frames += frames.shape[0]
+        if self.n_frames - self._synced >= self.sync_frames:
+            self.sync()
+            self._synced = self.n_frames
+
+    def sync(self):
+        """Make the frames written so far readable from disk, as if the file had been closed."""
+        pass
+
+    def close(self):
+        """Finish the file. Returns the path written."""
+        return self.path
+
+    def write_frame_table(self, frame_table):
+        """Save the per-frame metadata (FrameMetadataRecorder or structured array) as <path>.frames.npy"""
+        table = frame_table.table() if hasattr(frame_table, "table") else frame_table
+        np.save(self.path + ".frames.npy", table)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _write(self, frames):
+        raise NotImplementedError
+
+
+class NpyFrameWriter(FrameWriter):
+    """
+    Streams frames into a single .npy file. The header is written with room for the final shape and
+    rewritten on sync and on close, so the file can be read with np.load(path, mmap_mode='r'). Header
+    text goes into a <file>.json sidecar, written when the file is opened and again on close.
+    """
+    extension = ".npy"
+    _HEADER_LEN = 128
+
+    def __init__(self, savepath, frame_shape, dtype=np.uint16, serial=None, header_text=None):
+        super().__init__(savepath, frame_shape, dtype, serial, header_text)
+        self.file = open(self.path, "wb")
+        self._write_header()
+        self._write_sidecar()
+
+    def _write_sidecar(self):
+        with open(self.path + ".json", "w") as f:
+            json.dump(_sidecar_metadata(self.serial, (self.n_frames,) + self.frame_shape, self.dtype, self.header_text,
+                                        extra={k: v[0] for k, v in self.header_cards.items()}), f, indent=2, default=str)
+
+    def _write_header(self):
+        # .npy v1.0: magic, version, uint16 header length, then the dict padded with spaces and a newline.
+        # A fixed size header lets the frame count be patched in place when the file is closed.
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                  "shape": (self.n_frames,) + self.frame_shape}
+        prefix = b"\x93NUMPY\x01\x00" + (self._HEADER_LEN - 10).to_bytes(2, "little")
+        text = repr(header).encode("latin1")
+        text += b" " * (self._HEADER_LEN - len(prefix) - len(text) - 1) + b"\n"
+        self.file.seek(0)
+        self.file.write(prefix + text)
+        self.file.seek(0, os.SEEK_END)
+
+    def _write(self, frames):
+        frames.tofile(self.file)
+
+    def sync(self):
+        # the frames go out before the header that counts them
+        self.file.flush()
+        self._write_header()
+        self.file.flush()
+
+    def close(self):
+        if not self.file.closed:
+            self._write_header()
+            self.file.close()
+            self._write_sidecar()
+        return self.path
+
+
+class ChunkedDirectoryWriter(FrameWriter):
+    """
+    Zarr (v2) compatible directory store: a .zarray metadata file plus one raw, uncompressed file per
+    chunk of frames. Header text is stored in .zattrs. The result opens with zarr.open(path) or can be
+    read chunk by chunk with numpy alone. On sync the .zarray shape is set to the frames in the chunks
+    written so far (the partly filled chunk in memory is not on disk yet).
+    """
+    extension = ".zarr"
+
+    def __init__(self, savepath, frame_shape, dtype=np.uint16, serial=None, header_text=None, chunk_frames=64):
+        super().__init__(savepath, frame_shape, dtype, serial, header_text)
+        self.chunk_frames = chunk_frames
+        os.makedirs(self.path, exist_ok=True)
+        self._buffer = np.zeros((chunk_frames,) + self.frame_shape, dtype=self.dtype)
+        self._n_buffered = 0
+        self._n_chunks = 0
+        self._write_metadata()
+
+    def _write_metadata(self, n_frames=None):
+        n_frames = self.n_frames if n_frames is None else n_frames
+        with open(os.path.join(self.path, ".zattrs"), "w") as f:
+            json.dump(_sidecar_metadata(self.serial, (n_frames,) + self.frame_shape, self.dtype, self.header_text,
+                                        extra={k: v[0] for k, v in self.header_cards.items()}), f, indent=2, default=str)
+        self._write_zarray(n_frames)
+
+    def _write_zarray(self, n_frames):
+        meta = {
+            "zarr_format": 2,
+            "shape": [n_frames, *self.frame_shape],
+            "chunks": [self.chunk_frames, *self.frame_shape],
+            "dtype": self.dtype.str,
+            "compressor": None,
+            "fill_value": 0,
+            "order": "C",
+            "filters": None,
+        }
+        # renamed into place, a crash while it is rewritten must not leave a broken .zarray
+        path = os.path.join(self.path, ".zarray")
+        with open(path + ".tmp", "w") as f:
+            json.dump(meta, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _write(self, frames):
+        i = 0
+        while i < frames.shape[0]:
+            n = min(self.chunk_frames - self._n_buffered, frames.shape[0] - i)
+            self._buffer[self._n_buffered:self._n_buffered + n] = frames[i:i + n]
+            self._n_buffered += n
+            i += n
+            if self._n_buffered == self.chunk_frames:
+                self._flush_chunk()
+
+    def _flush_chunk(self):
+        key = ".".join([str(self._n_chunks)] + ["0"] * len(self.frame_shape))
+        if self._n_buffered < self.chunk_frames:
+            self._buffer[self._n_buffered:] = 0     # zarr chunks are always full size
+        self._buffer.tofile(os.path.join(self.path, key))
+        self._n_chunks += 1
+        self._n_buffered = 0
+
+    def sync(self):
+        self._write_zarray(min(self._n_chunks * self.chunk_frames, self.n_frames))
+
+    def close(self):
+        if self._n_buffered:
+            self._flush_chunk()
+        self._write_metadata()
+        return self.path
+
+
+class HDF5FrameWriter(FrameWriter):
+    """
+    Chunked, resizable HDF5 dataset "frames" (needs h5py). Header keywords are stored as dataset attributes.
+    """
+    extension = ".h5"
+
+    def __init__(self, savepath, frame_shape, dtype=np.uint16, serial=None, header_text=None, chunk_frames=16):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError("HDF5 export needs h5py, install it with `pip install h5py` or choose another format.")
+        super().__init__(savepath, frame_shape, dtype, serial, header_text)
+        self.file = h5py.File(self.path, "w")
+        self.dataset = self.file.create_dataset("frames", shape=(0,) + self.frame_shape, maxshape=(None,) + self.frame_shape,
+                                                dtype=self.dtype, chunks=(chunk_frames,) + self.frame_shape)
+        for key, value in header_text_to_dict(header_text).items():
+            try:
+                self.dataset.attrs[key] = value
+            except TypeError:
+                self.dataset.attrs[key] = str(value)
+        self.dataset.attrs["serial"] = str(serial)
+        self.dataset.attrs["header_text"] = header_text or ""
+
+    def write_frame_table(self, frame_table):
+        table = frame_table.table() if hasattr(frame_table, "table") else frame_table
+        self.file.create_dataset("frame_table", data=table)
+
+    def _write(self, frames):
+        n = self.dataset.shape[0]
+        self.dataset.resize(n + frames.shape[0], axis=0)
+        self.dataset[n:] = frames
+
+    def sync(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file:
+            for key, card in self.header_cards.items():
+                self.dataset.attrs[key] = card[0]
+            self.file.close()
+            self.file = None
+        return self.path
+
+
+FRAME_WRITERS = {
+    "NPY": NpyFrameWriter,
+    "ZARR": ChunkedDirectoryWriter,
+    "HDF5": HDF5FrameWriter,
+}
+
+def open_frame_writer(fmt, savepath, frame_shape, dtype=np.uint16, serial=None, header_text=None, **kwargs):
+    """Create a writer for one of the FRAME_WRITERS formats ("NPY", "ZARR", "HDF5")."""
+    try:
+        writer_cls = FRAME_WRITERS[fmt.upper()]
+    except KeyError:
+        raise ValueError(f"Unknown export format {fmt}, expected one of {list(FRAME_WRITERS)}")
+    return writer_cls(savepath, frame_shape, dtype=dtype, serial=serial, header_text=header_text, **kwargs)
+
+def save_npz_data(data, savepath=None, header_text=None, serial=None):
+    """Save a whole cube at once to a .npz (frame axis kept) with a JSON header sidecar."""
+    if data is None:
+        return
+    if savepath is None:
+        print("ERROR: No save path was provided. Saving data to current directory.")
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        savepath = dir_path + "/data"
+    os.makedirs(savepath, exist_ok=True)
+    data = np.asarray(data)
+    filename = _run_basename(savepath, serial) + ".npz"
+    np.savez(filename, data=data)
+    with open(filename + ".json", "w") as f:
+        json.dump(_sidecar_metadata(serial, data.shape, data.dtype, header_text), f, indent=2, default=str)
+    return filename
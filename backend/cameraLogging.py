@@ -1 +1,165 @@
+import os
+import json
+import atexit
+import queue
+import logging as log
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
+'''
+Asynchronous logging for the application and the cameras.
+
+Loggers only put records on a queue (QueueHandler), a single QueueListener thread does all of the file
+I/O. The listener routes records by logger name: "Camera-<serial>" goes to camera_<serial>.log, every
+other logger to <name>.log. Files are rotated by size and can be written as JSON lines instead of text.
+'''
+
+DEFAULT_LOG_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "logs")
+CAMERA_LOGGER_PREFIX = "Camera-"
+APP_LOGGER_NAME = "CameraApplication"
+
+_queue = None
+_queue_handler = None
+_listener = None
+_router = None
+_forwarding = False
+
+
+class JsonLinesFormatter(log.Formatter):
+    """One JSON object per record."""
+    def format(self, record):
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "logger": record.name,
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry)
+
+
+class SerialRoutingHandler(log.Handler):
+    """
+    Writes each record to a rotating file chosen from the logger name. Only used from the listener thread,
+    the per-file handlers are created the first time a logger name is seen.
+    """
+    def __init__(self, log_dir, formatter, json_lines=False, max_bytes=10_000_000, backup_count=5):
+        super().__init__()
+        self.log_dir = log_dir
+        self.formatter = formatter
+        self.extension = ".jsonl" if json_lines else ".log"
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.handlers = {}
+
+    def filename_for(self, name):
+        if name.startswith(CAMERA_LOGGER_PREFIX):
+            return f"camera_{name[len(CAMERA_LOGGER_PREFIX):]}{self.extension}"
+        if name == APP_LOGGER_NAME:
+            return f"cameraApplication{self.extension}"
+        return f"{name}{self.extension}"
+
+    def emit(self, record):
+        filename = self.filename_for(record.name)
+        handler = self.handlers.get(filename)
+        if handler is None:
+            handler = RotatingFileHandler(os.path.join(self.log_dir, filename), maxBytes=self.max_bytes,
+                                          backupCount=self.backup_count, delay=True)
+            handler.setFormatter(self.formatter)
+            self.handlers[filename] = handler
+        handler.handle(record)
+
+    def close(self):
+        for handler in self.handlers.values():
+            handler.close()
+        self.handlers.clear()
+        super().close()
+
+
+def setup_logging(log_dir=None, json_lines=False, max_bytes=10_000_000, backup_count=5):
+    """
+    Start the logging queue and listener thread. Calling it again once started does nothing.
+    :return: the QueueHandler that loggers should attach
+    """
+    global _queue, _queue_handler, _listener, _router
+    if _listener is not None or _forwarding:
+        return _queue_handler
+
+    log_dir = log_dir or DEFAULT_LOG_DIR
+    os.makedirs(log_dir, exist_ok=True)
+    if json_lines:
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = log.Formatter('[%(asctime)s] %(name)s:%(levelname)s:%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+
+    _queue = queue.SimpleQueue()
+    _queue_handler = QueueHandler(_queue)
+    _router = SerialRoutingHandler(log_dir, formatter, json_lines=json_lines, max_bytes=max_bytes, backup_count=backup_count)
+    _listener = QueueListener(_queue, _router, respect_handler_level=False)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _queue_handler
+
+
+class _ForwardingQueue:
+    """put_nowait() adapter so a QueueHandler can hand records to a (thread-safe) send function."""
+    def __init__(self, send):
+        self.send = send
+
+    def put_nowait(self, record):
+        self.send(record)
+
+
+def setup_forwarded_logging(send):
+    """
+    For child processes: every logger sends its (pre-formatted, picklable) records through send() instead
+    of writing files, so only the main process touches the log files. The parent hands them to handle_record().
+    """
+    global _queue_handler, _forwarding
+    _queue_handler = QueueHandler(_ForwardingQueue(send))
+    _forwarding = True
+    return _queue_handler
+
+
+def handle_record(record):
+    """Log a record forwarded from a child process as if it had been emitted here."""
+    logger = get_logger(record.name)
+    if logger.isEnabledFor(record.levelno):
+        logger.handle(record)
+
+
+def shutdown_logging():
+    """Flush the queue and close all log files."""
+    global _listener, _router
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+    if _router is not None:
+        _router.close()
+        _router = None
+
+
+def get_logger(name, level=None):
+    """
+    Return a logger that writes through the queue (starting the listener with defaults if needed).
+    :param level: set only when given, a new logger starts at DEBUG, so later lookups keep the level main.py chose
+    """
+    handler = setup_logging()
+    logger = log.getLogger(name)
+    if level is not None:
+        logger.setLevel(level)
+    elif logger.level == log.NOTSET:
+        logger.setLevel(log.DEBUG)
+    for h in list(logger.handlers):
+        if isinstance(h, QueueHandler) and h is not handler:    # left over from a stopped listener
+            logger.removeHandler(h)
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+    logger.propagate = False
+    return logger
+
+
+def get_camera_logger(serial, level=None):
+    """Logger for one camera, routed to camera_<serial>.log"""
+    return get_logger(f"{CAMERA_LOGGER_PREFIX}{serial}", level)
@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from backend.cameraLogging import get_logger, APP_LOGGER_NAME
+
+'''
+Asyncio orchestration of the cameras.
+
+One event loop runs in a background thread and every blocking SDK call is run on a bounded thread pool
+from there. Calls on one camera hold that camera's asyncio.Lock, so a configure can never overlap an
+acquisition or a preview of the same camera, while different cameras run in parallel. Coordinating the
+cameras is then ordinary asyncio: gather() runs one call per camera with a common timeout and returns
+every result or exception, and a call that times out or is cancelled first runs its stop function (e.g.
+setting the experiment stop event) and keeps the camera locked until the blocking call has returned.
+
+The Tk thread and other threads use submit() / run() to hand coroutines to the loop.
+'''
+
+STOP_GRACE = 10.0       # seconds a cancelled call without a stop function is waited for before its camera is released
+
+
+class CameraOrchestrator:
+    """
+    :param max_workers: size of the thread pool all blocking camera calls share
+    """
+    def __init__(self, max_workers=8):
+        self.max_workers = max_workers
+        self.logger = get_logger(APP_LOGGER_NAME)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="camera")
+        self.loop = None
+        self._thread = None
+        self._started = threading.Event()
+        self._locks = {}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="CameraOrchestrator", daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.loop.call_soon(self._started.set)
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def stop(self, timeout=5.0):
+        """Cancel everything still running (stop functions are called) and shut the loop down."""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, coro):
+        """Schedule a coroutine on the loop from any other thread. :return: concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the loop and block until it is done. Never call this from the loop thread."""
+        return self.submit(coro).result(timeout)
+
+    def _lock(self, camera):
+        key = getattr(camera, "serialNumber", None) or id(camera)
+        if key not in self._locks:
+            self._locks[key] = asyncio.Lock()
+        return self._locks[key]
+
+    def is_busy(self, camera):
+        """True while an exclusive call (acquisition, preview, configure) holds the camera."""
+        lock = self._locks.get(getattr(camera, "serialNumber", None) or id(camera))
+        return lock is not None and lock.locked()
+
+    async def call(self, camera, func, *args, timeout=None, exclusive=True, stop=None, **kwargs):
+        """
+        Run a blocking func(*args, **kwargs) on the thread pool.
+        :param camera: camera the call is for, None for calls that are not tied to one camera
+        :param exclusive: hold the camera's lock for the duration of the call
+        :param stop: called if the call times out or is cancelled, must make func return soon
+        """
+        lock = self._lock(camera) if camera is not None and exclusive else None
+        if lock is None:
+            return await self._run_in_executor(func, args, kwargs, timeout, stop)
+        async with lock:
+            return await self._run_in_executor(func, args, kwargs, timeout, stop)
+
+    async def _run_in_executor(self, func, args, kwargs, timeout, stop):
+        future = self.loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            if stop is not None:
+                stop()
+            # the thread cannot be interrupted, keep the camera until it has actually returned
+            done, _ = await asyncio.wait({future}, timeout=None if stop is not None else STOP_GRACE)
+            if not done:
+                self.logger.warning(f"A cancelled camera call is still running after {STOP_GRACE} s, releasing the camera")
+            raise
+
+    async def gather(self, calls, timeout=None):
+        """
+        Await a dict of {key: coroutine} together.
+        :return: {key: result or the exception it raised}, calls still running at the timeout are cancelled
+                 and return asyncio.TimeoutError
+        """
+        tasks = {key: asyncio.ensure_future(coro) for key, coro in calls.items()}
+        if not tasks:
+            return {}
+        _, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        results = {}
+        for key, task in tasks.items():
+            if task in pending:
+                results[key] = asyncio.TimeoutError(f"{key} did not finish within {timeout} s")
+            elif task.cancelled():
+                results[key] = asyncio.CancelledError()
+            else:
+                results[key] = task.exception() or task.result()
+        return results
+
+    async def connect(self, idx, timeout=60.0, **camera_kwargs):
+        """Open the camera at SDK index idx. :return: the connected Camera with serialNumber, head_model and controller_mode set"""
+        def open_camera():
+            from backend.cameraConfig import Camera, CameraState     # loads the SDK on first use
+            cam = Camera(idx=idx, **camera_kwargs)
+            if cam.connection_status != CameraState.CONNECTED:
+                raise ConnectionError(f"Failed to connect to the camera at index {idx}")
+            try:
+                info = cam.get_device_info()
+            except Exception:
+                cam.close()
+                raise
+            cam.serialNumber = str(info[2])
+            cam.head_model = info[1]
+            cam.controller_mode = info[0]
+            return cam
+        return await self.call(None, open_camera, timeout=timeout)
+
+    async def configure(self, camera, config, timeout=120.0):
+        """Apply a config dict. :return: the camera's is_configured state"""
+        await self.call(camera, camera.camera_configuration, config, timeout=timeout)
+        return camera.is_configured
+
+    async def acquire(self, camera, func, *args, stop=None, timeout=None, **kwargs):
+        """Run an acquisition function holding the camera. stop is called if it is cancelled or times out."""
+        return await self.call(camera, func, *args, timeout=timeout, stop=stop, **kwargs)
+
+    async def telemetry(self, camera, timeout=5.0):
+        """Temperature and acquisition state, read without waiting for the camera's lock (safe while acquiring)."""
+        def read():
+            return {
+                "setpoint": getattr(camera, "temperature_setpoint", None),
+                "temperature": camera.get_temperature(),
+                "temperature_status": camera.get_temperature_status(),
+                "acquiring": camera.acquisition_in_progress(),
+            }
+        return await self.call(camera, read, timeout=timeout, exclusive=False)
+
+    async def telemetry_all(self, cameras, timeout=5.0):
+        """:return: {serial: telemetry dict, or {"error": ...}} for every camera, read in parallel"""
+        results = await self.gather({cam.serialNumber: self.telemetry(cam, timeout=timeout) for cam in cameras}, timeout=timeout)
+        return {serial: ({"error": str(r) or type(r).__name__} if isinstance(r, BaseException) else r) for serial, r in results.items()}
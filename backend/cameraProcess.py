@@ -0,0 +1,215 @@
+import time
+import threading
+import multiprocessing as mp
+import numpy as np
+from backend.sharedFrameRing import SharedFrameRing
+from backend.frameMetadata import batch_host_times
+from backend.cameraLogging import get_camera_logger, setup_forwarded_logging, handle_record
+
+'''
+Run one camera's acquisition in its own process.
+
+With every camera in the GUI process the SDK polling and frame reads of all four cameras compete for one
+GIL. A CameraProcess closes the camera in the GUI process, reopens it by index in a spawned child and lets
+the child do nothing but read frames into a SharedFrameRing. Only (sequence, SDK index, host time) tuples,
+one message per read batch, go back over a pipe; log records from the child are forwarded the same way so
+only the main process writes log files. The camera is reopened in the GUI process when the run ends.
+'''
+
+CONTINUOUS_BUFFER_FRAMES = 1000     # SDK ring buffer size for run-till-abort acquisitions
+
+
+def _camera_process_main(idx, serial, config, nframes, ring_spec, conn, stop_event, dll_path=None):
+    """Child process entry point, must stay importable at module level for the spawn start method."""
+    lock = threading.Lock()
+
+    def send(message):
+        with lock:
+            conn.send(message)
+
+    setup_forwarded_logging(lambda record: send(("log", record)))
+    logger = get_camera_logger(serial)
+    ring = None
+    cam = None
+    try:
+        if dll_path:
+            import pylablib as pll
+            pll.par["devices/dlls/andor_sdk2"] = dll_path
+        from backend.cameraConfig import Camera     # imported here so the parent never loads the SDK for the child
+
+        ring = SharedFrameRing.attach(ring_spec)
+        cam = Camera(idx=idx, temperature=config.get("temperatureSetpoint"), fan_mode=config.get("fanLevel", "full"))
+        cam.serialNumber = serial
+        cam.camera_configuration(config)
+        if nframes is None:
+            cam.setup_acquisition(mode="cont", nframes=CONTINUOUS_BUFFER_FRAMES)
+        else:
+            cam.setup_acquisition(mode="kinetic", nframes=nframes)
+        cam.start_acquisition()
+        send(("started",))
+
+        frame_timeout = max(5.0, 2 * (float(config.get("KineticCycleTime", 0)) + float(config.get("exposureTime", 0))))
+        frame_period = cam.get_frame_timings().frame_period
+        last_index = -1
+        last_time = None
+        while (nframes is None or last_index < nframes - 1) and not stop_event.is_set():
+            cam.wait_for_frame(timeout=frame_timeout)
+            batch, infos = cam.read_multiple_images(return_info=True)
+            read_time = time.monotonic()
+            if not batch:
+                continue
+            status = cam.get_frames_status()
+            temperature = cam.get_temperature()
+            host_times = batch_host_times(read_time, [info.frame_index for info in infos], frame_period, not_before=last_time)
+            last_time = host_times[-1]
+            items = []
+            for frame, info, host_time in zip(batch, infos, host_times):
+                seq = ring.put(frame, should_stop=stop_event.is_set)
+                if seq is None:
+                    break
+                items.append((seq, info.frame_index, float(host_time)))
+                last_index = max(last_index, info.frame_index)
+            send(("frames", items, temperature, getattr(status, "skipped", 0) or 0))
+        cam.stop_acquisition()
+        send(("done",))
+    except Exception as e:
+        logger.error(f"Camera process for {serial} failed: {e}")
+        send(("error", f"{type(e).__name__}: {e}"))
+    finally:
+        if cam is not None:
+            try:
+                if cam.acquisition_in_progress():
+                    cam.stop_acquisition()
+                cam.close()
+            except Exception:
+                pass
+        if ring is not None:
+            ring.close()
+        conn.close()
+
+
+class CameraProcess:
+    """
+    Parent side of a camera acquisition running in a child process.
+
+    :param camera: the connected Camera from the GUI process, closed for the duration of the run
+    :param config: camera config dict applied in the child
+    :param nframes: kinetic series length, None to run until stop()
+    :param slots: frames the shared ring can hold before the child waits for the consumer
+    """
+    def __init__(self, camera, config, nframes, slots=64, dll_path=None, dtype=np.uint16):
+        self.camera = camera
+        self.serial = camera.serialNumber
+        self.config = dict(config or {})
+        self.nframes = nframes
+        self.slots = slots
+        self.dll_path = dll_path
+        self.dtype = dtype
+        self.logger = get_camera_logger(self.serial)
+        self.ring = None
+        self.process = None
+        self.conn = None
+        self.stop_event = None
+        self.done = False
+
+    def start(self, timeout=60.0):
+        """Hand the camera over to a new process and wait until its acquisition has started."""
+        rows, cols = self.camera.get_data_dimensions()
+        self.ring = SharedFrameRing((rows, cols), dtype=self.dtype, slots=self.slots)
+        # flagged before the handle goes, so the connection supervisor never probes the closed handle
+        self.camera.handed_off = True
+        self.camera.close()
+
+        ctx = mp.get_context("spawn")
+        self.conn, child_conn = ctx.Pipe(duplex=False)
+        self.stop_event = ctx.Event()
+        self.process = ctx.Process(target=_camera_process_main, name=f"Camera-{self.serial}",
+                                   args=(self.camera.idx, self.serial, self.config, self.nframes, self.ring.spec(),
+                                         child_conn, self.stop_event, self.dll_path), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.logger.info(f"Camera {self.serial} handed to process {self.process.pid}")
+
+        deadline = time.monotonic() + timeout
+        while True:
+            message = self._receive(max(deadline - time.monotonic(), 0.0))
+            if message is None:
+                raise TimeoutError(f"Camera process for {self.serial} did not start within {timeout} s")
+            if message[0] == "started":
+                return self
+            self._handle_control(message)
+
+    def _receive(self, timeout):
+        if not self.conn.poll(timeout):
+            if not self.process.is_alive():
+                raise RuntimeError(f"Camera process for {self.serial} exited with code {self.process.exitcode}")
+            return None
+        try:
+            return self.conn.recv()
+        except EOFError:
+            raise RuntimeError(f"Camera process for {self.serial} closed its pipe unexpectedly")
+
+    def _handle_control(self, message):
+        kind = message[0]
+        if kind == "log":
+            handle_record(message[1])
+        elif kind == "error":
+            raise RuntimeError(f"Camera process for {self.serial}: {message[1]}")
+        elif kind == "done":
+            self.done = True
+
+    def batches(self, timeout=10.0, counters=None):
+        """
+        Yield (frames, temperature) for every batch the child reads, where frames is a list of
+        (frame, sdk_index, host_time). Frames are copied out of the ring so they outlive their slot.
+        :param counters: FrameCounters updated with the camera's ring buffer overruns
+        """
+        while not self.done:
+            message = self._receive(timeout)
+            if message is None:
+                raise TimeoutError(f"No frames from camera process {self.serial} for {timeout} s")
+            if message[0] != "frames":
+                self._handle_control(message)
+                continue
+            _, items, temperature, skipped = message
+            if counters is not None:
+                counters.update_skipped(skipped)
+            yield [(self.ring.read(seq), index, host_time) for seq, index, host_time in items], temperature
+
+    def stop(self, timeout=10.0):
+        """Stop the child if it is still running, free the ring and reopen the camera in this process."""
+        if self.process is not None:
+            self.stop_event.set()
+            # keep releasing slots and forwarding logs so the child is never stuck on a full ring
+            deadline = time.monotonic() + timeout
+            while self.process.is_alive() and time.monotonic() < deadline:
+                try:
+                    message = self._receive(0.1)
+                except RuntimeError:
+                    break
+                if message is None:
+                    continue
+                if message[0] == "frames":
+                    for seq, _, _ in message[1]:
+                        self.ring.release(seq)
+                elif message[0] == "log":
+                    handle_record(message[1])
+            self.process.join(timeout=1.0)
+            if self.process.is_alive():
+                self.logger.warning(f"Camera process for {self.serial} did not exit, terminating it")
+                self.process.terminate()
+                self.process.join(timeout=1.0)
+            self.conn.close()
+            self.process = None
+        if self.ring is not None:
+            self.ring.close()
+            self.ring.unlink()
+            self.ring = None
+        try:
+            if not self.camera.is_opened():
+                self.camera.open()
+                if self.camera.cam_config:
+                    self.camera.camera_configuration(self.camera.cam_config)
+        except Exception as e:
+            self.logger.error(f"Could not reopen camera {self.serial} after the process run: {e}")
+        self.camera.handed_off = False
@@ -0,0 +1,15 @@
+from enum import Enum
+
+'''
+Camera states, kept apart from cameraConfig so code that only checks a state does not import the SDK.
+'''
+
+
+class CameraState(Enum):
+    CONNECTED = 1
+    DISCONNECTED = 2
+    ACQUIRING = 3
+    NOT_ACQUIRING = 4
+    CONFIGURED = 5
+    NOT_CONFIGURED = 6
+    ERROR = 7
@@ -0,0 +1,197 @@
+import asyncio
+import threading
+from backend.cameraLogging import get_logger, get_camera_logger, APP_LOGGER_NAME
+from backend.cameraState import CameraState
+
+'''
+Connection supervisor.
+
+A camera that drops off the USB bus mid-session (DRV_NOT_AVAILABLE, a reset driver stack, a pulled cable)
+leaves a dead handle behind. The supervisor runs on the CameraOrchestrator loop and every few seconds
+asks each connected camera for its temperature, a real SDK round trip. A camera that does not answer, or
+that an acquisition reports through mark_lost(), is closed and reopened by serial number with
+exponential backoff: the SDK index is tried first, then every index no other camera is using, since a
+replugged camera can come back under a different one. The reopened camera gets its last config
+(cam_config) re-applied and is handed to on_reconnected(). Probes never take the camera's lock and each
+camera is recovered by its own task, so the other cameras keep acquiring at full rate throughout.
+Cameras handed to a CameraProcess (camera.handed_off) belong to the child for the run and are skipped,
+and a probe that fails because the handle here is closed is not a dropout.
+'''
+
+PROBE_INTERVAL = 2.0        # seconds between health checks of each camera
+PROBE_TIMEOUT = 5.0
+BACKOFF_START = 1.0         # first retry delay, doubled after every failed attempt
+BACKOFF_MAX = 60.0
+WARN_AFTER_ATTEMPTS = 10    # after this many failures point the user at the README (USB stack reset)
+
+
+class CameraSupervisor:
+    """
+    :param orchestrator: running CameraOrchestrator, the supervisor's tasks run on its loop
+    :param get_cameras: returns the currently connected Camera objects
+    :param on_state: on_state(serial, state, message), state is "ok", "lost", "reconnecting" or "failed"
+    :param on_reconnected: on_reconnected(serial, camera) with the reopened and reconfigured camera
+    """
+    def __init__(self, orchestrator, get_cameras, on_state=None, on_reconnected=None, interval=PROBE_INTERVAL):
+        self.orchestrator = orchestrator
+        self.get_cameras = get_cameras
+        self.on_state = on_state or (lambda serial, state, message: None)
+        self.on_reconnected = on_reconnected or (lambda serial, camera: None)
+        self.interval = interval
+        self.logger = get_logger(APP_LOGGER_NAME)
+        self.states = {}            # serial -> last state
+        self._tasks = {}            # serial -> reconnect task (loop thread only)
+        self._reconnected = {}      # serial -> threading.Event, set once the camera is back
+        self._cameras = {}          # serial -> camera handed to on_reconnected
+        self._lock = threading.Lock()
+        self._watch = None
+
+    def start(self):
+        self._watch = self.orchestrator.submit(self._watch_loop())
+        return self
+
+    def stop(self):
+        if self._watch is not None:
+            self._watch.cancel()
+        for task in list(self._tasks.values()):
+            self.orchestrator.loop.call_soon_threadsafe(task.cancel)
+
+    @staticmethod
+    def probe(camera):
+        """:return: True if the camera answers an SDK call (blocking, any thread)"""
+        try:
+            camera.get_temperature()
+            return True
+        except Exception:
+            return False
+
+    @staticmethod
+    def _handed_off(camera):
+        """:return: True if the camera's handle in this process is closed on purpose"""
+        if getattr(camera, "handed_off", False):
+            return True
+        try:
+            return not camera.is_opened()
+        except Exception:
+            return False
+
+    def _event(self, serial):
+        with self._lock:
+            return self._reconnected.setdefault(serial, threading.Event())
+
+    def _set_state(self, serial, state, message=""):
+        self.states[serial] = state
+        try:
+            self.on_state(serial, state, message)
+        except Exception as e:
+            self.logger.error(f"Camera state callback failed: {e}")
+
+    def mark_lost(self, camera, reason=""):
+        """Report a camera as gone (e.g. from an acquisition that failed on it) and start recovering it. Any thread."""
+        # cleared here, not on the loop, so a wait_reconnected() right after cannot see an earlier recovery
+        self._event(camera.serialNumber).clear()
+        self.orchestrator.loop.call_soon_threadsafe(self._start_reconnect, camera, reason)
+
+    def wait_reconnected(self, serial, timeout=None, stop_event=None):
+        """
+        Block until the camera is back.
+        :return: the reopened camera, or None on timeout or once stop_event is set
+        """
+        event = self._event(serial)
+        waited = 0.0
+        while not event.wait(0.5):
+            waited += 0.5
+            if (stop_event is not None and stop_event.is_set()) or (timeout is not None and waited >= timeout):
+                return None
+        return self._cameras.get(serial)
+
+    async def _watch_loop(self):
+        while True:
+            for camera in list(self.get_cameras()):
+                serial = camera.serialNumber
+                if serial in self._tasks or camera.connection_status != CameraState.CONNECTED or self._handed_off(camera):
+                    continue
+                try:
+                    alive = await self.orchestrator.call(camera, self.probe, camera, timeout=PROBE_TIMEOUT, exclusive=False)
+                except asyncio.TimeoutError:
+                    alive = False
+                # a camera closed on purpose (Disconnect All, a hand-off to a camera process) while it was probed is not a dropout
+                if (not alive and camera in self.get_cameras() and camera.connection_status == CameraState.CONNECTED
+                        and not self._handed_off(camera)):
+                    self._start_reconnect(camera, "no answer to the health check")
+            await asyncio.sleep(self.interval)
+
+    def _start_reconnect(self, camera, reason):
+        serial = camera.serialNumber
+        if serial in self._tasks:
+            return
+        get_camera_logger(serial).error(f"Camera {serial} lost: {reason}")
+        self._event(serial).clear()
+        self._set_state(serial, "lost", reason)
+        self._tasks[serial] = asyncio.ensure_future(self._reconnect(camera))
+
+    async def _reconnect(self, camera):
+        serial = camera.serialNumber
+        logger = get_camera_logger(serial)
+        delay = BACKOFF_START
+        attempt = 0
+        try:
+            while True:
+                attempt += 1
+                self._set_state(serial, "reconnecting", f"attempt {attempt}")
+                try:
+                    new_camera = await self.orchestrator.call(None, self._reopen, camera, timeout=120.0)
+                except Exception as e:
+                    message = f"Reconnect attempt {attempt} for camera {serial} failed: {e}"
+                    if attempt == WARN_AFTER_ATTEMPTS:
+                        message += " (if the camera is powered and plugged in, reset its USB driver as described in the README)"
+                        self._set_state(serial, "failed", message)
+                    logger.warning(message)
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, BACKOFF_MAX)
+                    continue
+                logger.info(f"Camera {serial} reconnected after {attempt} attempt(s)")
+                self._cameras[serial] = new_camera
+                self.on_reconnected(serial, new_camera)
+                self._event(serial).set()
+                self._set_state(serial, "ok", f"reconnected after {attempt} attempt(s)")
+                return new_camera
+        finally:
+            self._tasks.pop(serial, None)
+
+    def _reopen(self, camera):
+        """Close the dead handle and find the camera again by serial (blocking, runs on the orchestrator pool)."""
+        from pylablib.devices import Andor
+        from backend.cameraConfig import Camera
+        serial = camera.serialNumber
+        try:
+            camera.close()
+        except Exception:
+            pass
+        camera.connection_status = CameraState.DISCONNECTED
+
+        in_use = {cam.idx for cam in self.get_cameras() if cam is not camera and cam.connection_status == CameraState.CONNECTED}
+        count = Andor.get_cameras_number_SDK2()
+        candidates = [camera.idx] + [i for i in range(count) if i != camera.idx]
+        for idx in candidates:
+            if idx in in_use or idx >= count:
+                continue
+            try:
+                cam = Camera(idx=idx, temperature=camera.temperature_setpoint, fan_mode='full', amp_mode=None)
+            except Exception:
+                continue
+            try:
+                info = cam.get_device_info()
+                if str(info[2]) != serial:
+                    cam.close()
+                    continue
+                cam.serialNumber = serial
+                cam.head_model = info[1]
+                cam.controller_mode = info[0]
+                if camera.cam_config:
+                    cam.camera_configuration(configDict=camera.cam_config)
+                return cam
+            except Exception:
+                cam.close()
+                raise
+        raise ConnectionError(f"camera {serial} not found among {count} camera(s) on the bus")
@@ -0,0 +1,249 @@
+import hmac
+import json
+import inspect
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from backend.cameraLogging import get_logger, APP_LOGGER_NAME
+
+'''
+Local HTTP / JSON-RPC control API.
+
+An asyncio event loop in a background thread serves JSON-RPC 2.0 on POST /rpc:
+
+    {"jsonrpc": "2.0", "id": 1, "method": "configure", "params": {"serial": "13703", "config": {...}}}
+
+A batch (a JSON array of requests) runs its calls concurrently, so e.g. one "configure" per camera in a
+single batch configures all cameras in parallel. Plain GETs are shortcuts for the parameterless calls:
+GET /status, GET /telemetry and GET /methods. Connections are kept alive, so a client doing many calls
+pays the TCP set-up once.
+
+The server only listens on localhost, but a web page open in a local browser can still reach it. Requests
+carrying an Origin header (sent by browsers, not by scripts) are refused, and POST /rpc must be
+application/json so a cross-site form post cannot get through without a CORS preflight, which is never
+answered. If a token is given, every request must also carry "Authorization: Bearer <token>".
+
+Methods are plain functions registered by the application. Blocking camera calls run on a thread pool,
+methods registered with ui=True run on the Tk thread through the UIEventBus (they may touch widgets).
+'''
+
+DEFAULT_PORT = 5556
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+SERVER_ERROR = -32000
+
+HTTP_REASONS = {200: "OK", 204: "No Content", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+                404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 415: "Unsupported Media Type"}
+MAX_BODY = 16 * 1024 * 1024
+
+
+class RPCError(Exception):
+    """Raised by a method to return a specific JSON-RPC error to the client."""
+    def __init__(self, message, code=SERVER_ERROR, data=None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class ControlServer:
+    """
+    :param ui_call: function(func, *args, **kwargs) -> concurrent Future running func on the Tk thread,
+                    normally UIEventBus.call. Required only for methods registered with ui=True.
+    :param call_timeout: seconds a single call may take before the client gets an error
+    :param token: if set, requests must send the header "Authorization: Bearer <token>"
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, ui_call=None, workers=8, call_timeout=300.0, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self.ui_call = ui_call
+        self.call_timeout = call_timeout
+        self.logger = get_logger(APP_LOGGER_NAME)
+        self.methods = {}
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rpc")
+        self.loop = None
+        self._server = None
+        self._thread = None
+        self._started = threading.Event()
+        self._start_error = None
+        self.register("methods", self.describe)
+
+    def register(self, name, func, ui=False):
+        """Expose func as the JSON-RPC method name. Its docstring is shown by the "methods" call."""
+        self.methods[name] = (func, ui)
+
+    def describe(self):
+        """List the available methods with their parameters."""
+        return {name: {"params": [p for p in inspect.signature(func).parameters], "doc": inspect.getdoc(func) or ""}
+                for name, (func, _) in sorted(self.methods.items())}
+
+    def start(self, timeout=5.0):
+        self._thread = threading.Thread(target=self._run, name="ControlServer", daemon=True)
+        self._thread.start()
+        self._started.wait(timeout)
+        if self._start_error is not None:
+            raise self._start_error
+        self.logger.info(f"Control API listening on http://{self.host}:{self.port}/rpc")
+        return self
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self._server = self.loop.run_until_complete(asyncio.start_server(self._handle_client, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self._start_error = e
+            self._started.set()
+            return
+        self._started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self._server.close()
+            # kept-alive client connections are still waiting for their next request
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    def stop(self):
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = self._check_request(method, path, headers)
+                if status is None:
+                    status, payload = await self._route(method, path, body)
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        except ValueError as e:
+            self._write_response(writer, 400, {"error": str(e)}, False)
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, path, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise ValueError("Malformed request line")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            key, _, value = line.decode("latin-1").partition(":")
+            headers[key.strip().lower()] = value.strip()
+        length = int(headers.get("content-length", 0))
+        if length > MAX_BODY:
+            raise ValueError("Request body too large")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), path.split("?", 1)[0], headers, body
+
+    def _write_response(self, writer, status, payload, keep_alive):
+        body = b"" if payload is None else json.dumps(payload, default=str).encode("utf-8")
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    def _check_request(self, method, path, headers):
+        """Refuse browser (cross-site) requests and requests without the token. :return: (None, None) if allowed"""
+        if "origin" in headers:
+            return 403, {"error": "Cross-origin requests are not allowed"}
+        if self.token is not None:
+            scheme, _, supplied = headers.get("authorization", "").partition(" ")
+            if scheme.lower() != "bearer" or not hmac.compare_digest(supplied.strip().encode(), self.token.encode()):
+                return 401, {"error": "Missing or wrong token, send 'Authorization: Bearer <token>'"}
+        if method == "POST" and path == "/rpc":
+            content_type = headers.get("content-type", "").split(";", 1)[0].strip().lower()
+            if content_type != "application/json":
+                return 415, {"error": "POST /rpc needs Content-Type: application/json"}
+        return None, None
+
+    async def _route(self, method, path, body):
+        if path == "/rpc":
+            if method != "POST":
+                return 405, {"error": "use POST for /rpc"}
+            try:
+                message = json.loads(body or b"null")
+            except ValueError as e:
+                return 200, self._error(None, PARSE_ERROR, f"Parse error: {e}")
+            if isinstance(message, list):
+                if not message:
+                    return 200, self._error(None, INVALID_REQUEST, "Empty batch")
+                replies = await asyncio.gather(*(self._dispatch(m) for m in message))
+                replies = [r for r in replies if r is not None]
+                return (200, replies) if replies else (204, None)
+            reply = await self._dispatch(message)
+            return (200, reply) if reply is not None else (204, None)
+
+        name = path.strip("/")
+        if method == "GET" and name in self.methods:
+            reply = await self._dispatch({"jsonrpc": "2.0", "id": 0, "method": name})
+            if "error" in reply:
+                return 400, reply["error"]
+            return 200, reply["result"]
+        return 404, {"error": f"Unknown path {path}, use POST /rpc or GET /methods"}
+
+    @staticmethod
+    def _error(request_id, code, message, data=None):
+        error = {"code": code, "message": message}
+        if data is not None:
+            error["data"] = data
+        return {"jsonrpc": "2.0", "id": request_id, "error": error}
+
+    async def _dispatch(self, message):
+        """Run one JSON-RPC request. :return: the response dict, or None for a notification (no id)"""
+        if not isinstance(message, dict) or not isinstance(message.get("method"), str):
+            return self._error(None, INVALID_REQUEST, "Invalid request")
+        request_id = message.get("id")
+        is_notification = "id" not in message
+        name = message["method"]
+        params = message.get("params", {})
+        if name not in self.methods:
+            return None if is_notification else self._error(request_id, METHOD_NOT_FOUND, f"Method '{name}' not found")
+        func, ui = self.methods[name]
+        args, kwargs = (params, {}) if isinstance(params, list) else ((), params or {})
+        try:
+            inspect.signature(func).bind(*args, **kwargs)
+        except TypeError as e:
+            return None if is_notification else self._error(request_id, INVALID_PARAMS, f"Invalid params for '{name}': {e}")
+
+        try:
+            if ui:
+                if self.ui_call is None:
+                    raise RPCError(f"Method '{name}' needs the GUI thread but no ui_call was given")
+                future = asyncio.wrap_future(self.ui_call(func, *args, **kwargs))
+            else:
+                future = self.loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+            result = await asyncio.wait_for(future, self.call_timeout)
+        except RPCError as e:
+            return None if is_notification else self._error(request_id, e.code, str(e), e.data)
+        except asyncio.TimeoutError:
+            return None if is_notification else self._error(request_id, SERVER_ERROR, f"'{name}' timed out after {self.call_timeout} s")
+        except Exception as e:
+            self.logger.error(f"Control API call {name} failed: {e}")
+            return None if is_notification else self._error(request_id, SERVER_ERROR, f"{type(e).__name__}: {e}")
+        return None if is_notification else {"jsonrpc": "2.0", "id": request_id, "result": result}
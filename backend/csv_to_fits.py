@@ -1,8 +1,25 @@
-import astropy
-import pandas as pd
-from astropy.table import Table
-from astropy.io import fits
 import os
+import sys
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from astropy.io import fits
+
+if not __package__:
+    # run as a script (python backend/csv_to_fits.py), make the backend package importable
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+from backend.cameraDataHandle import _drop_structural
+
+'''
+Batch CSV/XLSX to FITS converter.
+
+The header template is parsed once and shipped to a process pool as a card string. Each worker reads
+one file straight into a typed ndarray (np.loadtxt for CSV, openpyxl in read-only mode for XLSX),
+writes its FITS file and reports back the timing, so a bad file is skipped instead of ending the batch.
+'''
+
+DEFAULT_HEADER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "exmapleHeader.txt")
 
 
 def buildFromTextFile(filename, header):
@@ -13,20 +30,20 @@ def buildFromTextFile(filename, header):
                 line = line.replace("\n", "")
                 key = line.split("=")[0]
                 value = line.split("=")[1]
-            
+
                 try:
                     comment = line.split("/")[1]
                 except:
                     comment = ""
-                
+
                 value = value.split("/")[0].replace("'", "")
-                
-                
+
+
                 try:
                     value = int(float(value))
                 except:
                     pass
-                
+
                 try:
                     value = value.replace("'", "")
                 except:
@@ -36,7 +53,7 @@ def buildFromTextFile(filename, header):
                     value = value.replace('"', "")
                 except:
                     pass
-                
+
                 try:
                     if(('T' in value) and (len(value.replace(" ", "")) < 2)):
                         value = True
@@ -46,17 +63,16 @@ def buildFromTextFile(filename, header):
                         pass
                 except:
                     pass
-                
+
                 header[key] = (value, comment)
-                
+
                 x+=1
-                
-                
-                
+
+
+
             except Exception as e:
                 print(f"Error: {e} and at line {x} in {filename}")
                 continue
-    print(header.keys)            
 
 def buildHeader(hdul, header, filename = None, cameraConfig = None):
     if(filename is not None):
@@ -72,38 +88,116 @@ def buildHeader(hdul, header, filename = None, cameraConfig = None):
 
     return
 
-def convertData(source_path=None, save_path=None, df=None):
+def load_header_template(filename=None):
+    """
+    Parse a header text file once into a fits.Header, dropping the keywords that describe the data array.
+    :return: the header, or an empty header if the file does not exist
+    """
+    filename = filename or DEFAULT_HEADER_PATH
+    header = fits.Header()
+    if os.path.isfile(filename):
+        buildFromTextFile(filename, header)
+    else:
+        print(f"Header template {filename} not found, writing files without one.")
+    return _drop_structural(header)
 
+def _is_index_row(values):
+    return np.array_equal(values, np.arange(len(values)))
 
-    if((source_path is not None) and (df is None)):
+def read_csv_array(path, dtype=np.uint16):
+    """Read a CSV written by save_csv_data (optional header row of column numbers) into a typed array."""
+    with open(path, 'r') as f:
+        first = f.readline().strip().split(",")
+    try:
+        skip = 1 if _is_index_row(np.array(first, dtype=np.int64)) else 0
+    except ValueError:
+        skip = 1    # non numeric header row
+    return np.loadtxt(path, delimiter=",", skiprows=skip, dtype=dtype, ndmin=2)
 
-        df = None
-        for file in os.listdir(source_path):
-            filename = file.rsplit(".", 1)[0]
-            extension = file.rsplit(".", 1)[1]
-            if "xlsx" in extension:
-                df = pd.read_excel(f"{source_path}/{filename}.xlsx")
-            elif "csv" in extension:
-                df = pd.read_csv(f"{source_path}/{filename}.csv")
-            else:
-                print("Error, something went wrong")
-                return None
-            hdu = fits.PrimaryHDU(data=df.to_numpy())
-            hdul = fits.HDUList([hdu])
-            buildHeader(hdul, hdul[0].header, r"/home/matt/Documents/Southern_Graduate_Work/Astro /Python Coding/exmapleHeader.txt")
-            savestring  = f"{save_path}/{filename}.fits"
-            hdul.writeto(savestring, overwrite=True)
-    elif not df is None:
+def read_xlsx_array(path, dtype=np.uint16):
+    """Read the first sheet of a workbook written by save_xlsx_data, dropping its header row and index column."""
+    from openpyxl import load_workbook
+    wb = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = list(wb.worksheets[0].iter_rows(values_only=True))
+    finally:
+        wb.close()
+    if rows and (rows[0][0] is None or isinstance(rows[0][0], str)):
+        rows = rows[1:]
+    data = np.array(rows, dtype=np.float64)
+    if data.shape[1] > 1 and _is_index_row(data[:, 0]):
+        data = data[:, 1:]
+    return data.astype(dtype)
 
+READERS = {"csv": read_csv_array, "xlsx": read_xlsx_array}
+
+def convert_file(source_file, save_path, header_cards="", dtype=np.uint16):
+    """
+    Convert a single file. Runs inside the worker processes.
+    :return: (source file, output file or None, number of bytes read, seconds, error message or None)
+    """
+    start = time.perf_counter()
+    filename, _, extension = os.path.basename(source_file).rpartition(".")
+    reader = READERS.get(extension.lower())
+    if reader is None:
+        return source_file, None, 0, 0.0, f"unsupported extension '.{extension}'"
+    try:
+        data = reader(source_file, dtype=dtype)
+        header = fits.Header.fromstring(header_cards) if header_cards else fits.Header()
+        savestring = os.path.join(save_path, f"{filename}.fits")
+        fits.PrimaryHDU(data=data, header=header).writeto(savestring, overwrite=True)
+        return source_file, savestring, os.path.getsize(source_file), time.perf_counter() - start, None
+    except Exception as e:
+        return source_file, None, 0, time.perf_counter() - start, str(e)
+
+def convertData(source_path=None, save_path=None, df=None, header_path=None, workers=None, dtype=np.uint16):
+    """
+    Convert every CSV/XLSX file in source_path to FITS in save_path using a process pool.
+    Files that cannot be read are reported and skipped.
+
+    If df is given instead, a HDUList holding its data is returned (no files are written).
+    :return: list of (source file, output file, bytes, seconds, error) results for a directory conversion
+    """
+    if df is not None:
         hdu = fits.PrimaryHDU(data=df.to_numpy())
-        hdul = fits.HDUList([hdu])
-        # buildHeader(hdul, hdul[0].header)
+        return fits.HDUList([hdu])
+    if source_path is None:
+        return None
+
+    save_path = save_path or source_path
+    os.makedirs(save_path, exist_ok=True)
+    header_cards = load_header_template(header_path).tostring()
+    files = sorted(os.path.join(source_path, f) for f in os.listdir(source_path)
+                   if os.path.isfile(os.path.join(source_path, f)))
+
+    results = []
+    batch_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(convert_file, f, save_path, header_cards, dtype) for f in files]
+        for future in as_completed(futures):
+            source_file, out, nbytes, seconds, error = future.result()
+            results.append((source_file, out, nbytes, seconds, error))
+            name = os.path.basename(source_file)
+            if error:
+                print(f"SKIPPED {name}: {error}")
+            else:
+                rate = nbytes / 1e6 / seconds if seconds > 0 else float("inf")
+                print(f"Converted {name} -> {os.path.basename(out)} in {seconds:.2f} s ({rate:.1f} MB/s)")
 
-        # hdul.writeto(f"{save_path}\{filename}.fits", overwrite=True)
-        return hdul
+    converted = [r for r in results if r[4] is None]
+    elapsed = time.perf_counter() - batch_start
+    total_mb = sum(r[2] for r in converted) / 1e6
+    print(f"Converted {len(converted)}/{len(files)} files ({total_mb:.1f} MB) in {elapsed:.2f} s "
+          f"({total_mb / elapsed if elapsed > 0 else 0:.1f} MB/s overall)")
+    return results
 
 
 if __name__ == '__main__':
-    source_path = r"/home/matt/Documents/Southern_Graduate_Work/Astro /Python Coding/Data/CSV_Data"
-    save_path = r"/home/matt/Documents/Southern_Graduate_Work/Astro /Python Coding/Data/FITS_Data"
-    convertData(source_path, save_path)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Convert a directory of CSV/XLSX frames to FITS.")
+    parser.add_argument("source_path", help="directory with .csv/.xlsx files")
+    parser.add_argument("save_path", nargs="?", default=None, help="output directory (defaults to source_path)")
+    parser.add_argument("--header", default=None, help=f"header template text file (default {DEFAULT_HEADER_PATH})")
+    parser.add_argument("--workers", type=int, default=None, help="number of worker processes")
+    args = parser.parse_args()
+    results = convertData(args.source_path, args.save_path, header_path=args.header, workers=args.workers)
+    sys.exit(0 if results and all(r[4] is None for r in results) else 1)
@@ -0,0 +1,224 @@
+import os
+import re
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import numpy as np
+from astropy.io import fits
+from backend.frameMetadata import FRAME_TABLE_NAME
+
+'''
+Memory-mapped FITS cube reader and reducer.
+
+Saved cubes are opened with memmap=True and left unscaled, so slicing a chunk of frames only pulls
+those frames from disk and BZERO/BSCALE (e.g. uint16 stored as int16 + 32768) is applied per chunk. Reductions are computed per
+chunk on a thread pool (NumPy and the file reads release the GIL) and then combined, so reducing a
+20 GB night needs about chunk_size frames of memory per worker rather than the whole cube. The median
+needs every frame of a pixel at once, so it works on row strips sized so that the strips of all workers
+together stay within a memory budget.
+'''
+
+FRAME_TIME_COLUMN = "HOST_TIME"
+MEDIAN_MEMORY_BUDGET = 1 << 30      # bytes the median strips of all workers may take together
+MEDIAN_COPIES = 3                   # a strip is held as read, scaled, and as the copy np.median partitions
+_FILENAME_TIME = re.compile(r"(\d{4}_\d{2}_\d{2}__\d{2}_\d{2}_\d{2})")
+
+
+class FitsCube:
+    """
+    Lazy, read-only view of a saved cube (frame axis first).
+
+    :param path: path to the FITS file
+    :param ext: HDU that holds the image data
+    """
+    def __init__(self, path, ext=0):
+        self.path = path
+        self.hdul = fits.open(path, memmap=True, do_not_scale_image_data=True)
+        self.hdu = self.hdul[ext]
+        self.header = self.hdu.header
+        self.bzero = self.header.get("BZERO", 0)
+        self.bscale = self.header.get("BSCALE", 1)
+        raw = self.hdu.data
+        self._raw = raw if raw.ndim == 3 else raw[np.newaxis]
+        self.shape = self._raw.shape
+        self.n_frames = self.shape[0]
+        # bytes per pixel once scaled: raw, uint16 for the BZERO = 32768 shortcut, float64 otherwise
+        unscaled = self.bscale == 1 and (self.bzero == 0 or (self.bzero == 32768 and self._raw.dtype.itemsize == 2))
+        self.itemsize = self._raw.dtype.itemsize if unscaled else 8
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.n_frames
+
+    def close(self):
+        self.hdul.close()
+
+    def frames(self, start=0, stop=None):
+        """Read frames [start, stop) into memory as a (n, rows, cols) array."""
+        start, stop = self._frame_range(start, stop)
+        return self._scale(self._raw[start:stop])
+
+    def region(self, start, stop, rows):
+        """Read frames [start, stop) restricted to the row slice `rows`."""
+        start, stop = self._frame_range(start, stop)
+        return self._scale(self._raw[start:stop, rows, :])
+
+    def _scale(self, raw):
+        raw = np.asarray(raw, dtype=raw.dtype.newbyteorder('='))     # FITS is big endian, swap once per chunk
+        if self.bscale == 1 and self.bzero == 0:
+            return raw
+        if self.bscale == 1 and self.bzero == 32768 and raw.dtype == np.int16:
+            return raw.view(np.uint16) ^ np.uint16(0x8000)
+        return raw * float(self.bscale) + float(self.bzero)
+
+    def iter_chunks(self, chunk_size=256, start=0, stop=None):
+        """Yield (first frame number, frames) for consecutive chunks in [start, stop)."""
+        for a, b in self.chunk_bounds(chunk_size, start, stop):
+            yield a, self.frames(a, b)
+
+    def chunk_bounds(self, chunk_size=256, start=0, stop=None):
+        start, stop = self._frame_range(start, stop)
+        return [(a, min(a + chunk_size, stop)) for a in range(start, stop, chunk_size)]
+
+    def timestamps(self):
+        """
+        Per frame unix timestamps in seconds. Taken from the frame table extension when the file has one,
+        otherwise estimated from the start time in the file name and the kinetic cycle time (KCT) keyword.
+        """
+        if FRAME_TABLE_NAME in self.hdul:
+            table = self.hdul[FRAME_TABLE_NAME]
+            if FRAME_TIME_COLUMN in table.columns.names:
+                t = np.asarray(table.data[FRAME_TIME_COLUMN], dtype=np.float64)
+                return t - table.header.get("MONOREF", 0.0) + table.header.get("UNIXREF", 0.0)
+        t0 = 0.0
+        match = _FILENAME_TIME.search(os.path.basename(self.path))
+        if match:
+            t0 = datetime.strptime(match.group(1), "%Y_%m_%d__%H_%M_%S").timestamp()
+        cycle = float(self.header.get("KCT", 1.0) or 1.0)
+        return t0 + cycle * np.arange(self.n_frames, dtype=np.float64)
+
+    def _frame_range(self, start, stop):
+        stop = self.n_frames if stop is None else min(stop, self.n_frames)
+        return max(start, 0), stop
+
+
+def _chunk_sum(cube, a, b):
+    return cube.frames(a, b).sum(axis=0, dtype=np.float64)
+
+
+def _chunk_power_spectrum(cube, a, b):
+    chunk = cube.frames(a, b).astype(np.float32)
+    chunk -= chunk.mean(axis=(1, 2), keepdims=True)
+    return np.square(np.abs(np.fft.fft2(chunk))).sum(axis=0, dtype=np.float64)
+
+
+def _strip_median(cube, start, stop, rows):
+    return np.median(cube.region(start, stop, rows), axis=0)
+
+
+def median_rows_per_strip(n_frames, n_cols, itemsize, workers, memory_budget=MEDIAN_MEMORY_BUDGET):
+    """:return: rows per median strip so that one strip per worker fits in memory_budget bytes (at least 1)"""
+    row_bytes = n_frames * n_cols * itemsize * MEDIAN_COPIES
+    return max(int(memory_budget // (max(workers, 1) * row_bytes)), 1)
+
+
+def reduce_cube(path, op="sum", start=0, stop=None, chunk_size=256, workers=4, rows_per_strip=None,
+                memory_budget=MEDIAN_MEMORY_BUDGET):
+    """
+    Reduce a saved cube over its frame axis.
+
+    :param op: "sum", "mean", "median" or "power_spectrum" (mean |FFT|^2, zero frequency at the centre)
+    :param start, stop: frame range to reduce
+    :param chunk_size: number of frames read per task for sum/mean/power_spectrum
+    :param workers: size of the thread pool
+    :param rows_per_strip: the median needs every frame for a pixel, so it is split into row strips instead of frame chunks,
+                           None to size them from memory_budget
+    :param memory_budget: bytes the median strips in flight may take together
+    :return: 2D float array
+    """
+    with FitsCube(path) as cube:
+        start, stop = cube._frame_range(start, stop)
+        n = stop - start
+        if n <= 0:
+            raise ValueError(f"Empty frame range [{start}, {stop}) for {path}")
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            if op in ("sum", "mean", "power_spectrum"):
+                func = _chunk_power_spectrum if op == "power_spectrum" else _chunk_sum
+                futures = [pool.submit(func, cube, a, b) for a, b in cube.chunk_bounds(chunk_size, start, stop)]
+                total = None
+                for f in futures:
+                    part = f.result()
+                    total = part if total is None else total + part
+                if op == "sum":
+                    return total
+                if op == "mean":
+                    return total / n
+                return np.fft.fftshift(total / n)
+            elif op == "median":
+                n_rows = cube.shape[1]
+                if rows_per_strip is None:
+                    rows_per_strip = median_rows_per_strip(n, cube.shape[2], cube.itemsize, workers, memory_budget)
+                strips = [slice(r, min(r + rows_per_strip, n_rows)) for r in range(0, n_rows, rows_per_strip)]
+                futures = [pool.submit(_strip_median, cube, start, stop, rows) for rows in strips]
+                return np.concatenate([f.result() for f in futures], axis=0)
+            else:
+                raise ValueError(f"Unknown reduction: {op}")
+
+
+def coalign(paths, tolerance=None):
+    """
+    Match frames between cameras by timestamp. The first path is the reference camera.
+
+    :param paths: cube file per camera
+    :param tolerance: maximum time difference (s) for a match. Defaults to half the reference frame spacing.
+    :return: (reference times, list of index arrays, one per path). An index of -1 means no frame within tolerance.
+    """
+    times = []
+    for p in paths:
+        with FitsCube(p) as cube:
+            times.append(cube.timestamps())
+    ref = times[0]
+    if tolerance is None:
+        tolerance = 0.5 * float(np.median(np.diff(ref))) if len(ref) > 1 else np.inf
+
+    matches = []
+    for t in times:
+        idx = np.searchsorted(t, ref)
+        lo = np.clip(idx - 1, 0, len(t) - 1)
+        hi = np.clip(idx, 0, len(t) - 1)
+        nearest = np.where(np.abs(t[lo] - ref) <= np.abs(t[hi] - ref), lo, hi)
+        diff = np.abs(t[nearest] - ref)
+        matches.append(np.where(diff <= tolerance, nearest, -1))
+    return ref, matches
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reduce saved IFUSI FITS cubes without loading them into memory.")
+    parser.add_argument("path", help="FITS cube to reduce")
+    parser.add_argument("--op", default="sum", choices=["sum", "mean", "median", "power_spectrum"])
+    parser.add_argument("--range", default=":", help="frame range start:stop")
+    parser.add_argument("--chunk", type=int, default=256, help="frames per chunk")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--memory", type=float, default=MEDIAN_MEMORY_BUDGET / 2**20, help="memory budget of the median (MB)")
+    parser.add_argument("--out", default=None, help="output FITS file (defaults to <path>_<op>.fits)")
+    args = parser.parse_args()
+
+    a, _, b = args.range.partition(":")
+    start = int(a) if a else 0
+    stop = int(b) if b else None
+
+    result = reduce_cube(args.path, op=args.op, start=start, stop=stop, chunk_size=args.chunk, workers=args.workers,
+                         memory_budget=int(args.memory * 2**20))
+    out = args.out or f"{args.path.rsplit('.', 1)[0]}_{args.op}.fits"
+    fits.PrimaryHDU(result.astype(np.float32)).writeto(out, overwrite=True)
+    print(f"Wrote {args.op} of {args.path} to {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,229 @@
+import csv
+import time
+import threading
+from collections import deque
+import numpy as np
+from backend.cameraLogging import get_logger, APP_LOGGER_NAME
+from backend.previewViewport import profile_fwhm
+
+'''
+Focus and alignment metrics for the spectrograph set-up.
+
+Frames from any number of cameras are handed to a FocusMonitor, which keeps only the newest frame per
+camera and works through them on one worker thread, so the acquisitions never wait for it. Each frame is
+cropped to the ROI and summed along the dispersion axis by `binning` (the cross-dispersion resolution
+the trace widths are measured at is kept), then reduced to:
+
+    laplacian_var   variance of the 4-neighbour Laplacian, grows as the image sharpens
+    fwhm            median cross-dispersion FWHM of the fiber traces (pixels)
+    fwhm_segments   the same per segment along the dispersion axis, a slope means the detector is tilted
+    trace_shift     median shift of the trace centroids from the reference (first) frame, for alignment
+    centroid_x/y    background subtracted centre of light (sensor pixels)
+
+The traces are the peaks of the cross-dispersion profile. The profile is cut at the midpoints between
+neighbouring peaks, and the centroids of all traces come from one np.add.reduceat over those segments.
+Every result is kept in a rolling history per camera and, with a log_path, appended to a CSV file.
+'''
+
+DISPERSION_AXIS = 1         # axis of the raw frame the fiber traces run along
+HISTORY = 600               # samples kept per camera for the plots
+TRACE_THRESHOLD = 0.2       # a trace peak must rise this fraction of the way from the floor to the highest peak
+CSV_FIELDS = ("time", "serial", "laplacian_var", "fwhm", "fwhm_segments", "n_traces", "trace_shift",
+              "centroid_x", "centroid_y")
+
+
+def laplacian_variance(img):
+    img = np.asarray(img, dtype=np.float32)
+    lap = img[1:-1, :-2] + img[1:-1, 2:] + img[:-2, 1:-1] + img[2:, 1:-1] - 4.0 * img[1:-1, 1:-1]
+    return float(lap.var())
+
+
+def find_traces(profile, threshold=TRACE_THRESHOLD):
+    """:return: indices of the trace peaks of a cross-dispersion profile"""
+    floor = np.percentile(profile, 5)
+    top = profile.max()
+    if top <= floor:
+        return np.empty(0, dtype=np.intp)
+    p = profile
+    is_peak = (p[1:-1] > p[:-2]) & (p[1:-1] >= p[2:]) & (p[1:-1] > floor + threshold * (top - floor))
+    return np.flatnonzero(is_peak) + 1
+
+
+def trace_segments(peaks):
+    """:return: start index of the profile segment owned by each peak (cut halfway between neighbours)"""
+    if peaks.size == 0:
+        return peaks
+    return np.concatenate(([0], (peaks[:-1] + peaks[1:] + 1) // 2))
+
+
+def trace_centroids(profile, peaks, floor):
+    """Centroid of every trace in its own segment, all at once."""
+    starts = trace_segments(peaks)
+    w = np.clip(profile - floor, 0, None)
+    x = np.arange(profile.size, dtype=np.float64)
+    flux = np.add.reduceat(w, starts)
+    return np.add.reduceat(w * x, starts) / np.maximum(flux, 1e-12)
+
+
+def trace_fwhms(profile, peaks):
+    """FWHM of every trace in its own segment, above the segment's minimum."""
+    bounds = np.append(trace_segments(peaks), profile.size)
+    widths = np.empty(peaks.size)
+    for i in range(peaks.size):
+        seg = profile[bounds[i]:bounds[i + 1]]
+        widths[i] = profile_fwhm(seg - seg.min())
+    return widths
+
+
+def _bin_along(img, axis, binning):
+    if binning <= 1:
+        return img
+    n = (img.shape[axis] // binning) * binning
+    img = img[:, :n] if axis == 1 else img[:n]
+    if axis == 1:
+        return img.reshape(img.shape[0], n // binning, binning).sum(axis=2, dtype=np.float32)
+    return img.reshape(n // binning, binning, img.shape[1]).sum(axis=1, dtype=np.float32)
+
+
+def focus_metrics(frame, roi=None, binning=4, dispersion_axis=DISPERSION_AXIS, segments=4, reference=None):
+    """
+    :param roi: (r0, r1, c0, c1) in sensor pixels, None for the whole frame
+    :param reference: trace centroids to measure trace_shift against
+    :return: metrics dict, the trace centroids are under "traces" (cross-dispersion sensor pixels)
+    """
+    r0, c0 = (roi[0], roi[2]) if roi else (0, 0)
+    img = frame[roi[0]:roi[1], roi[2]:roi[3]] if roi else frame
+    img = _bin_along(np.asarray(img, dtype=np.float32), dispersion_axis, binning)
+    background = float(np.median(img))
+    light = np.clip(img - background, 0, None)
+    total = float(light.sum())
+    if total > 0:
+        rows = np.arange(img.shape[0], dtype=np.float64)
+        cols = np.arange(img.shape[1], dtype=np.float64)
+        cy, cx = light.sum(axis=1) @ rows / total, light.sum(axis=0) @ cols / total
+    else:
+        cy, cx = (img.shape[0] - 1) / 2.0, (img.shape[1] - 1) / 2.0
+    # undo the binning along the dispersion axis, the centre of a bin is binning/2 - 0.5 sensor pixels in
+    if dispersion_axis == 1:
+        cx = cx * binning + (binning - 1) / 2.0
+    else:
+        cy = cy * binning + (binning - 1) / 2.0
+
+    profile = img.sum(axis=dispersion_axis)
+    peaks = find_traces(profile)
+    floor = float(np.percentile(profile, 5))
+    metrics = {
+        "laplacian_var": laplacian_variance(img),
+        "fwhm": float("nan"),
+        "fwhm_segments": [],
+        "n_traces": int(peaks.size),
+        "trace_shift": float("nan"),
+        "centroid_x": float(c0 + cx),
+        "centroid_y": float(r0 + cy),
+        "traces": np.empty(0),
+    }
+    if peaks.size == 0:
+        return metrics
+    offset = c0 if dispersion_axis == 0 else r0
+    traces = trace_centroids(profile, peaks, floor) + offset
+    metrics["traces"] = traces
+    metrics["fwhm"] = float(np.nanmedian(trace_fwhms(profile, peaks)))
+    for part in np.array_split(img, segments, axis=dispersion_axis):
+        if part.size:
+            metrics["fwhm_segments"].append(float(np.nanmedian(trace_fwhms(part.sum(axis=dispersion_axis), peaks))))
+    if reference is not None and reference.size:
+        # shift of each trace to the nearest reference trace
+        if reference.size == 1:
+            nearest = reference[0]
+        else:
+            idx = np.clip(np.searchsorted(reference, traces), 1, reference.size - 1)
+            left, right = reference[idx - 1], reference[idx]
+            nearest = np.where(np.abs(traces - left) < np.abs(traces - right), left, right)
+        metrics["trace_shift"] = float(np.median(traces - nearest))
+    return metrics
+
+
+class FocusMonitor:
+    """
+    Computes focus metrics for several cameras on one background thread, newest frame per camera only.
+
+    :param roi: (r0, r1, c0, c1) sensor pixels the metrics are computed on, None for the whole frame
+    :param binning: frames are summed this many pixels along the dispersion axis before anything else
+    :param log_path: CSV file every sample is appended to, None for no log
+    :param on_metrics: called as on_metrics(serial, time, metrics) from the worker thread
+    """
+    def __init__(self, roi=None, binning=4, dispersion_axis=DISPERSION_AXIS, segments=4, history=HISTORY,
+                 log_path=None, on_metrics=None):
+        self.roi = roi
+        self.binning = binning
+        self.dispersion_axis = dispersion_axis
+        self.segments = segments
+        self.log_path = log_path
+        self.on_metrics = on_metrics
+        self.history = {}           # serial -> deque of (time, metrics)
+        self.logger = get_logger(APP_LOGGER_NAME)
+        self._maxlen = history
+        self._latest = {}
+        self._reference = {}
+        self._lock = threading.Lock()
+        self._ready = threading.Event()
+        self._running = False
+        self.thread = None
+        self._log_file = None
+        self._writer = None
+
+    def start(self):
+        if self.log_path:
+            self._log_file = open(self.log_path, "w", newline="")
+            self._writer = csv.writer(self._log_file)
+            self._writer.writerow(CSV_FIELDS)
+        self._running = True
+        self.thread = threading.Thread(target=self._worker_loop, name="FocusMonitor", daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        self._running = False
+        self._ready.set()
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+    def submit(self, serial, frame):
+        """Offer a frame, replacing any frame of the same camera that was not processed yet. Never blocks."""
+        with self._lock:
+            self._latest[serial] = frame
+        self._ready.set()
+
+    def reset_reference(self):
+        """Measure trace_shift from the next frame of every camera."""
+        self._reference = {}
+
+    def _worker_loop(self):
+        while self._running:
+            if not self._ready.wait(0.5):
+                continue
+            self._ready.clear()
+            with self._lock:
+                latest, self._latest = self._latest, {}
+            for serial, frame in latest.items():
+                try:
+                    self._process(serial, frame)
+                except Exception as e:
+                    self.logger.error(f"Focus metrics failed for camera {serial}: {e}")
+
+    def _process(self, serial, frame):
+        now = time.time()
+        metrics = focus_metrics(frame, self.roi, self.binning, self.dispersion_axis, self.segments,
+                                reference=self._reference.get(serial))
+        if serial not in self._reference and metrics["n_traces"]:
+            self._reference[serial] = metrics["traces"]
+        self.history.setdefault(serial, deque(maxlen=self._maxlen)).append((now, metrics))
+        if self._writer is not None:
+            self._writer.writerow([f"{now:.3f}", serial] + [
+                ";".join(f"{v:.3f}" for v in metrics[k]) if k == "fwhm_segments" else metrics[k]
+                for k in CSV_FIELDS[2:]])
+        if self.on_metrics is not None:
+            self.on_metrics(serial, now, metrics)
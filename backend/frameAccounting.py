@@ -0,0 +1,119 @@
+import time
+from backend.cameraLogging import get_camera_logger
+
+'''
+Dropped-frame detection and buffer-overrun accounting.
+
+The SDK numbers every frame it acquires. Comparing those indices against the frames we actually read
+shows frames that were skipped (gaps), read twice (repeated index) or read late (host interval well
+above the expected cycle time). The camera's frame status additionally reports how many frames were
+overwritten in the ring buffer before they could be read.
+'''
+
+FRAME_LOSS_POLICIES = ["Continue", "Fail"]
+
+
+class FrameLossError(RuntimeError):
+    """Raised when frames are lost and the run policy is to fail fast."""
+    pass
+
+
+class FrameCounters:
+    """
+    Per camera frame counters for one acquisition.
+
+    :param expected_interval: expected time between frames (s), used to flag late frames. None disables the check.
+    :param late_factor: a frame is late if it arrives more than late_factor * expected_interval after the previous one
+    :param policy: "Continue" to only count losses, "Fail" to raise FrameLossError on the first missed or overwritten frame
+    """
+    def __init__(self, serial=None, expected_interval=None, late_factor=2.0, policy="Continue"):
+        self.serial = serial
+        self.expected_interval = expected_interval if expected_interval else None
+        self.late_factor = late_factor
+        self.policy = policy
+        self.logger = get_camera_logger(serial)
+        self.read = 0
+        self.missed = 0
+        self.duplicated = 0
+        self.late = 0
+        self.overruns = 0
+        self.last_index = None
+        self.last_time = None
+        self._last_skipped = 0
+
+    def update(self, sdk_index, host_time=None):
+        """
+        Account for one frame that was read.
+        :return: (missed, duplicate, late) for this frame. Duplicates should not be saved.
+        """
+        host_time = time.monotonic() if host_time is None else host_time
+        missed, duplicate, late = 0, False, False
+        if self.last_index is not None:
+            if sdk_index <= self.last_index:
+                duplicate = True
+                self.duplicated += 1
+            else:
+                missed = sdk_index - self.last_index - 1
+        if not duplicate:
+            if self.expected_interval and self.last_time is not None:
+                late = (host_time - self.last_time) > self.late_factor * self.expected_interval
+                self.late += int(late)
+            self.read += 1
+            self.missed += missed
+            self.last_index = sdk_index
+            self.last_time = host_time
+        if missed:
+            self.logger.warning(f"Camera {self.serial} missed {missed} frame(s) before SDK frame {sdk_index}")
+            self._apply_policy(f"missed {missed} frame(s) before SDK frame {sdk_index}")
+        return missed, duplicate, late
+
+    def check_buffer(self, camera):
+        """
+        Poll the camera ring buffer status and count frames that were overwritten before being read.
+        :return: number of new overruns since the last call
+        """
+        try:
+            status = camera.get_frames_status()
+        except Exception as e:
+            self.logger.debug(f"Could not read frame status for camera {self.serial}: {e}")
+            return 0
+        return self.update_skipped(getattr(status, "skipped", 0) or 0)
+
+    def update_skipped(self, skipped):
+        """
+        Same as check_buffer, for a skipped count read elsewhere (e.g. by a camera process).
+        :param skipped: total number of frames the camera reports as skipped so far
+        :return: number of new overruns since the last call
+        """
+        new = max(skipped - self._last_skipped, 0)
+        self._last_skipped = skipped
+        if new:
+            self.overruns += new
+            self.logger.warning(f"Camera {self.serial} ring buffer overrun, {new} frame(s) overwritten before read")
+            self._apply_policy(f"ring buffer overrun ({new} frame(s) overwritten)")
+        return new
+
+    def _apply_policy(self, reason):
+        if self.policy == "Fail":
+            raise FrameLossError(f"Camera {self.serial}: {reason}")
+
+    def has_losses(self):
+        return bool(self.missed or self.overruns)
+
+    def summary(self):
+        return f"read {self.read}, missed {self.missed}, dup {self.duplicated}, late {self.late}, overrun {self.overruns}"
+
+    def as_dict(self):
+        return {"read": self.read, "missed": self.missed, "duplicated": self.duplicated,
+                "late": self.late, "overruns": self.overruns}
+
+    def header_cards(self):
+        """:return: {keyword: (value, comment)} for the saved header"""
+        return {
+            "NREAD": (self.read, "frames read from the camera"),
+            "NMISSED": (self.missed, "frames skipped by the SDK (index gaps)"),
+            "NDUPL": (self.duplicated, "duplicate frames dropped"),
+            "NLATE": (self.late, "frames read later than expected"),
+            "NOVERRUN": (self.overruns, "frames overwritten in the ring buffer"),
+            "LOSSPOL": (self.policy, "frame loss policy"),
+        }
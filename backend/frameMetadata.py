@@ -0,0 +1,110 @@
+import time
+import numpy as np
+
+'''
+Per-frame metadata collected during acquisition.
+
+Every frame read from a camera gets one row in a preallocated NumPy structured array: host monotonic
+time at readout, the SDK frame index, the latest camera temperature sample, the number of frames
+the SDK skipped right before it and whether it arrived late. The table is saved next to the pixels
+(a FRAMES binary table in FITS, a .frames.npy file for the binary formats), so dropped frames and
+timing jitter are visible downstream.
+
+Frames are read from the SDK buffer in batches and only the read is timed, so batch_host_times()
+gives the newest frame of a batch the read time and dates the earlier ones back one frame period per
+SDK index (the HOSTTIME card of the FRAMES table says so).
+'''
+
+FRAME_TABLE_NAME = "FRAMES"
+
+FRAME_DTYPE = np.dtype([
+    ("FRAME", np.int64),        # running number of the frame in the saved cube
+    ("SDK_INDEX", np.int64),    # frame index reported by the SDK
+    ("HOST_TIME", np.float64),  # time.monotonic() the frame was read at, see batch_host_times (s)
+    ("TEMP", np.float32),       # camera temperature sample (C), NaN if not sampled
+    ("MISSED", np.int32),       # frames skipped by the SDK between the previous frame and this one
+    ("LATE", np.uint8),         # 1 if the frame arrived later than expected (see FrameCounters)
+])
+
+
+HOST_TIME_NOTE = "read time - SDK index gap x frame period"      # fits one FITS card with its comment
+
+
+def batch_host_times(read_time, sdk_indices, frame_period, not_before=None):
+    """
+    Host times for the frames of one batch read from the SDK buffer. The newest frame gets read_time, an
+    earlier one read_time minus its SDK index distance to the newest times frame_period.
+    :param not_before: last time of the previous batch, no frame is dated before it
+    :return: float64 array with one time per frame
+    """
+    idx = np.asarray(sdk_indices, dtype=np.float64)
+    times = read_time - (idx[-1] - idx) * max(float(frame_period), 0.0)
+    if not_before is not None:
+        times = np.maximum(times, not_before)
+    return times
+
+
+class FrameMetadataRecorder:
+    """
+    Collects one FRAME_DTYPE row per frame. The array is preallocated for the expected number of frames
+    and doubled if a run goes past it, so recording a frame is a handful of array writes.
+    """
+    def __init__(self, capacity=1024):
+        self.rows = np.zeros(max(int(capacity), 1), dtype=FRAME_DTYPE)
+        self.n = 0
+        self.last_index = None
+        # reference pair so monotonic host times can be turned into wall clock times later
+        self.mono_ref = time.monotonic()
+        self.unix_ref = time.time()
+
+    def __len__(self):
+        return self.n
+
+    def record(self, sdk_index=None, temperature=np.nan, host_time=None, missed=None, late=False):
+        """
+        Add a row for the frame that was just read. Returns the row number.
+        If missed is None it is worked out from the gap to the previous SDK index.
+        """
+        if self.n == len(self.rows):
+            grown = np.zeros(2 * len(self.rows), dtype=FRAME_DTYPE)
+            grown[:self.n] = self.rows
+            self.rows = grown
+        if sdk_index is None:
+            sdk_index = self.n if self.last_index is None else self.last_index + 1
+        row = self.rows[self.n]
+        row["FRAME"] = self.n
+        row["SDK_INDEX"] = sdk_index
+        row["HOST_TIME"] = time.monotonic() if host_time is None else host_time
+        row["TEMP"] = temperature
+        if missed is None:
+            missed = 0 if self.last_index is None else max(sdk_index - self.last_index - 1, 0)
+        row["MISSED"] = missed
+        row["LATE"] = late
+        self.last_index = sdk_index
+        self.n += 1
+        return self.n - 1
+
+    def table(self):
+        """:return: the filled part of the structured array"""
+        return self.rows[:self.n]
+
+    def to_table_hdu(self):
+        """:return: a FRAMES fits.BinTableHDU holding the recorded rows"""
+        from astropy.io import fits
+        hdu = fits.BinTableHDU(data=self.table(), name=FRAME_TABLE_NAME)
+        hdu.header["MONOREF"] = (self.mono_ref, "host monotonic clock at UNIXREF (s)")
+        hdu.header["UNIXREF"] = (self.unix_ref, "unix time matching MONOREF (s)")
+        hdu.header["NMISSED"] = (int(self.table()["MISSED"].sum()), "frames skipped by the SDK")
+        hdu.header["HOSTTIME"] = (HOST_TIME_NOTE, "HOST_TIME")
+        return hdu
+
+    def summary(self):
+        """:return: dict with frame count, missed frames and mean/max frame interval (s)"""
+        t = self.table()["HOST_TIME"]
+        dt = np.diff(t) if len(t) > 1 else np.zeros(1)
+        return {
+            "frames": self.n,
+            "missed": int(self.table()["MISSED"].sum()),
+            "mean_interval": float(dt.mean()),
+            "max_interval": float(dt.max()),
+        }
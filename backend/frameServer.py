@@ -0,0 +1,298 @@
+import sys
+import json
+import time
+import zlib
+import socket
+import struct
+import argparse
+import threading
+from collections import deque
+import numpy as np
+from backend.cameraLogging import get_logger, APP_LOGGER_NAME
+
+'''
+Live frame and status streaming over TCP.
+
+A subscriber connects and sends one JSON line describing what it wants:
+
+    {"serials": ["13703"], "every": 10, "binning": 4, "maxQueue": 4, "compress": true, "status": true}
+
+(serials null or missing means every camera). From then on the server sends messages, each made of an
+8 byte prefix (">II": header length, payload length), a UTF-8 JSON header and a binary payload:
+
+    {"type": "frame", "serial": "13703", "index": 1234, "host_time": ..., "shape": [256, 256],
+     "dtype": "<u2", "compression": "zlib" | null}
+    {"type": "status", "serial": "13703", "text": "Acquiring (read 1000, missed 0, ...)"}
+
+publish() only appends a reference to each matching subscriber's bounded deque (the oldest entry is
+dropped when it is full), so a slow display never holds up the acquisition. Temporal and spatial
+downsampling, compression and the socket writes all happen on the subscriber's own sender thread.
+'''
+
+PREFIX = struct.Struct(">II")
+DEFAULT_PORT = 5555
+
+
+def encode_message(header, payload=b""):
+    header = json.dumps(header).encode("utf-8")
+    return PREFIX.pack(len(header), len(payload)) + header + payload
+
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Connection closed by the server")
+        buf.extend(chunk)
+    return bytes(buf)
+
+
+def read_message(sock):
+    """:return: (header dict, frame array or None) for the next message on a subscriber socket"""
+    header_len, payload_len = PREFIX.unpack(_recv_exact(sock, PREFIX.size))
+    header = json.loads(_recv_exact(sock, header_len))
+    payload = _recv_exact(sock, payload_len) if payload_len else b""
+    if header.get("type") != "frame":
+        return header, None
+    if header.get("compression") == "zlib":
+        payload = zlib.decompress(payload)
+    frame = np.frombuffer(payload, dtype=np.dtype(header["dtype"])).reshape(header["shape"])
+    return header, frame
+
+
+def subscribe(host="127.0.0.1", port=DEFAULT_PORT, **options):
+    """Connect to a FrameServer and yield (header, frame) for every message (frame is None for status)."""
+    with socket.create_connection((host, port)) as sock:
+        sock.sendall((json.dumps(options) + "\n").encode("utf-8"))
+        while True:
+            yield read_message(sock)
+
+
+def bin_frame(frame, binning):
+    """Sum binning x binning pixel blocks (edges that do not fill a block are dropped)."""
+    if binning <= 1:
+        return frame
+    rows, cols = (frame.shape[0] // binning) * binning, (frame.shape[1] // binning) * binning
+    binned = frame[:rows, :cols].reshape(rows // binning, binning, cols // binning, binning)
+    return binned.sum(axis=(1, 3), dtype=np.uint32)
+
+
+class Subscriber:
+    """One connected client: its options, drop-oldest queue and sender thread."""
+    def __init__(self, server, sock, address, options):
+        self.server = server
+        self.sock = sock
+        self.address = address
+        serials = options.get("serials")
+        self.serials = {str(s) for s in serials} if serials else None
+        self.every = max(int(options.get("every", 1)), 1)
+        self.binning = max(int(options.get("binning", 1)), 1)
+        self.compress = bool(options.get("compress", False))
+        self.want_status = bool(options.get("status", True))
+        self.queue = deque(maxlen=max(int(options.get("maxQueue", 4)), 1))
+        self.ready = threading.Event()
+        self.seen = {}          # serial -> frames offered, for the every-N downsampling
+        self.sent = 0
+        self.dropped = 0
+        self.running = True
+        self.thread = threading.Thread(target=self._send_loop, name=f"subscriber-{address[0]}:{address[1]}", daemon=True)
+
+    def wants(self, serial):
+        return self.serials is None or str(serial) in self.serials
+
+    def offer(self, item):
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += 1
+        self.queue.append(item)     # deque(maxlen) drops the oldest entry itself
+        self.ready.set()
+
+    def offer_frame(self, serial, frame, index, host_time, payload):
+        n = self.seen.get(serial, 0)
+        self.seen[serial] = n + 1
+        if n % self.every == 0:
+            self.offer(("frame", serial, frame, index, host_time, payload))
+
+    def _send_loop(self):
+        try:
+            while self.running:
+                if not self.queue:
+                    self.ready.wait(0.5)
+                    self.ready.clear()
+                    continue
+                item = self.queue.popleft()
+                self.sock.sendall(self._encode(item))
+                self.sent += 1
+        except OSError:
+            pass
+        finally:
+            self.server._remove(self)
+
+    def _encode(self, item):
+        if item[0] == "status":
+            return encode_message({"type": "status", "serial": item[1], **item[2]})
+        _, serial, frame, index, host_time, payload = item
+        header = {"type": "frame", "serial": serial, "index": int(index), "host_time": host_time, "binning": self.binning}
+        if payload is not None and self.binning == 1:
+            # already compressed by the pipeline's compress stage
+            header.update(shape=list(frame.shape), dtype=frame.dtype.str, compression="zlib")
+            return encode_message(header, payload)
+        frame = np.ascontiguousarray(bin_frame(frame, self.binning))
+        header.update(shape=list(frame.shape), dtype=frame.dtype.str, compression="zlib" if self.compress else None)
+        data = zlib.compress(frame.data, 1) if self.compress else frame.tobytes()
+        return encode_message(header, data)
+
+    def close(self):
+        self.running = False
+        self.ready.set()
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class FrameServer:
+    """
+    TCP pub/sub server for live frames and camera status.
+    :param host: interface to listen on, keep the default 127.0.0.1 unless remote displays need it
+    """
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.host = host
+        self.port = port
+        self.logger = get_logger(APP_LOGGER_NAME)
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._sock = None
+        self._thread = None
+        self.running = False
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.host, self.port))
+        self.port = self._sock.getsockname()[1]
+        self._sock.listen(8)
+        self._sock.settimeout(0.5)
+        self.running = True
+        self._thread = threading.Thread(target=self._accept_loop, name="FrameServer", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Frame server listening on {self.host}:{self.port}")
+        return self
+
+    def _accept_loop(self):
+        while self.running:
+            try:
+                sock, address = self._sock.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            threading.Thread(target=self._handshake, args=(sock, address), daemon=True).start()
+
+    def _handshake(self, sock, address):
+        try:
+            sock.settimeout(5.0)
+            line = b""
+            while not line.endswith(b"\n") and len(line) < 4096:
+                chunk = sock.recv(1)
+                if not chunk:
+                    raise ConnectionError("closed during subscribe")
+                line += chunk
+            options = json.loads(line or b"{}")
+            sock.settimeout(None)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Rejected frame server client {address}: {e}")
+            sock.close()
+            return
+        subscriber = Subscriber(self, sock, address, options)
+        with self._lock:
+            self.subscribers.append(subscriber)
+        subscriber.thread.start()
+        self.logger.info(f"Frame server client {address} subscribed with {options}")
+
+    def _remove(self, subscriber):
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+                self.logger.info(f"Frame server client {subscriber.address} left "
+                                 f"(sent {subscriber.sent}, dropped {subscriber.dropped})")
+
+    def publish(self, serial, frame, index=0, host_time=None, payload=None):
+        """Offer a frame to every subscriber of this camera. Never blocks."""
+        if not self.subscribers:
+            return
+        host_time = time.monotonic() if host_time is None else host_time
+        for subscriber in list(self.subscribers):
+            if subscriber.wants(serial):
+                subscriber.offer_frame(serial, frame, index, host_time, payload)
+
+    def publish_status(self, serial, text, **extra):
+        for subscriber in list(self.subscribers):
+            if subscriber.want_status and subscriber.wants(serial):
+                subscriber.offer(("status", serial, dict(extra, text=text)))
+
+    def stats(self):
+        return [{"address": f"{s.address[0]}:{s.address[1]}", "sent": s.sent, "dropped": s.dropped,
+                 "queued": len(s.queue)} for s in list(self.subscribers)]
+
+    def stop(self):
+        self.running = False
+        if self._sock is not None:
+            self._sock.close()
+        for subscriber in list(self.subscribers):
+            subscriber.close()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+
+_server = None
+
+
+def start_frame_server(host="127.0.0.1", port=DEFAULT_PORT):
+    """Start the process wide frame server (once) and return it."""
+    global _server
+    if _server is None:
+        _server = FrameServer(host, port).start()
+    return _server
+
+
+def get_frame_server():
+    """:return: the running frame server, or None if streaming is off"""
+    return _server
+
+
+def stop_frame_server():
+    global _server
+    if _server is not None:
+        _server.stop()
+        _server = None
+
+
+def main(argv=None):
+    """Minimal subscriber that prints what arrives, e.g. python -m backend.frameServer --every 10 --binning 4"""
+    parser = argparse.ArgumentParser(description="Subscribe to a running frame server and print the stream.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--serial", action="append", dest="serials", help="camera serial, may be repeated")
+    parser.add_argument("--every", type=int, default=1, help="only send every N-th frame")
+    parser.add_argument("--binning", type=int, default=1, help="spatial binning factor")
+    parser.add_argument("--compress", action="store_true")
+    args = parser.parse_args(argv)
+
+    start = time.monotonic()
+    n = 0
+    for header, frame in subscribe(args.host, args.port, serials=args.serials, every=args.every,
+                                   binning=args.binning, compress=args.compress):
+        if frame is None:
+            print(f"[{header.get('serial')}] {header.get('text')}")
+            continue
+        n += 1
+        rate = n / max(time.monotonic() - start, 1e-9)
+        print(f"[{header['serial']}] frame {header['index']} {frame.shape} mean {frame.mean():.1f} ({rate:.1f} frames/s)")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    main()
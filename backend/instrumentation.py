@@ -0,0 +1,245 @@
+import os
+import sys
+import json
+import math
+import time
+import threading
+import functools
+from collections import Counter
+
+'''
+Lightweight timing instrumentation.
+
+Named spans and counters aggregated per (name, key), where the key is usually a camera serial. Span
+durations go into log2 microsecond histograms, so recording is O(1) and the memory use is fixed. When
+instrumentation is disabled span() hands back a shared no-op context manager and timed() calls straight
+through, so leaving the hooks in the hot paths costs one attribute check.
+
+A SamplingProfiler can also be started (main.py -d) to see where the Python threads spend their time.
+'''
+
+N_BUCKETS = 32      # bucket i holds durations in [2**i, 2**(i+1)) microseconds
+
+
+class Histogram:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buckets = [0] * N_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds):
+        us = seconds * 1e6
+        bucket = min(max(int(us).bit_length() - 1, 0), N_BUCKETS - 1)
+        with self.lock:
+            self.buckets[bucket] += 1
+            self.count += 1
+            self.total += seconds
+            if seconds < self.min:
+                self.min = seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q):
+        """Approximate percentile (s), taken as the upper edge of the bucket holding it."""
+        if self.count == 0:
+            return 0.0
+        target = q / 100.0 * self.count
+        running = 0
+        for i, n in enumerate(self.buckets):
+            running += n
+            if running >= target:
+                return min(2 ** (i + 1) * 1e-6, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "total_s": self.total,
+            "mean_s": self.total / self.count if self.count else 0.0,
+            "min_s": self.min if self.count else 0.0,
+            "p50_s": self.percentile(50),
+            "p99_s": self.percentile(99),
+            "max_s": self.max,
+            "buckets_us_log2": list(self.buckets),
+        }
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.add(time.perf_counter() - self.start)
+        return False
+
+
+class Instrumentation:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.histograms = {}
+        self.counters = Counter()
+        self._lock = threading.Lock()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {}
+            self.counters = Counter()
+
+    def _histogram(self, name, key):
+        h = self.histograms.get((name, key))
+        if h is None:
+            with self._lock:
+                h = self.histograms.setdefault((name, key), Histogram())
+        return h
+
+    def span(self, name, key=None):
+        """Context manager timing the enclosed block under (name, key)."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self._histogram(name, key))
+
+    def record(self, name, seconds, key=None):
+        """Add an externally measured duration."""
+        if self.enabled:
+            self._histogram(name, key).add(seconds)
+
+    def count(self, name, key=None, n=1):
+        if self.enabled:
+            with self._lock:
+                self.counters[(name, key)] += n
+
+    def timed(self, name, key_attr=None, key_arg=None):
+        """
+        Decorator timing every call of a function as a span.
+        :param key_attr: attribute of the first argument (self) used as key, e.g. "serialNumber"
+        :param key_arg: keyword argument used as key, e.g. "serial"
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                key = None
+                if key_attr is not None and args:
+                    key = getattr(args[0], key_attr, None)
+                elif key_arg is not None:
+                    key = kwargs.get(key_arg)
+                with _Span(self._histogram(name, key)):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def snapshot(self):
+        """:return: {"spans": {...}, "counters": {...}} keyed by "name" or "name[key]" """
+        def label(name, key):
+            return name if key is None else f"{name}[{key}]"
+        with self._lock:
+            items = list(self.histograms.items())
+            counters = dict(self.counters)
+        return {
+            "spans": {label(n, k): h.as_dict() for (n, k), h in sorted(items, key=lambda i: (i[0][0], str(i[0][1])))},
+            "counters": {label(n, k): v for (n, k), v in sorted(counters.items(), key=lambda i: (i[0][0], str(i[0][1])))},
+        }
+
+    def dump_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.snapshot(), f, indent=2)
+        return path
+
+    def format_table(self):
+        """Plain text table of the spans and counters for the Diagnostics tab."""
+        snap = self.snapshot()
+        lines = [f"{'span':<48}{'count':>8}{'mean ms':>11}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, h in snap["spans"].items():
+            lines.append(f"{name:<48}{h['count']:>8}{h['mean_s'] * 1e3:>11.3f}{h['p50_s'] * 1e3:>10.3f}"
+                         f"{h['p99_s'] * 1e3:>10.3f}{h['max_s'] * 1e3:>10.3f}")
+        if snap["counters"]:
+            lines.append("")
+            lines.append(f"{'counter':<48}{'value':>8}")
+            for name, v in snap["counters"].items():
+                lines.append(f"{name:<48}{v:>8}")
+        return "\n".join(lines)
+
+
+instrumentation = Instrumentation()
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every other Python thread at a fixed interval and counts the frames seen,
+    giving a statistical profile of all threads without the overhead of cProfile.
+    """
+    def __init__(self, interval=0.005, max_depth=20):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.functions = Counter()    # innermost function -> samples
+        self.stacks = Counter()       # collapsed stack (outer;...;inner) -> samples
+        self.samples = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def _run(self):
+        own = threading.get_ident()
+        while self._running:
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                if stack:
+                    self.functions[stack[0]] += 1
+                    self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+            time.sleep(self.interval)
+
+    def report(self, top=30):
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms"]
+        total = sum(self.functions.values()) or 1
+        for func, n in self.functions.most_common(top):
+            lines.append(f"{100.0 * n / total:6.2f}%  {func}")
+        return "\n".join(lines)
+
+    def dump(self, path):
+        """Write the report plus collapsed stacks (flamegraph.pl / speedscope format)."""
+        with open(path, "w") as f:
+            f.write(self.report() + "\n\n")
+            for stack, n in self.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        return path
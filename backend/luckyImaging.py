@@ -0,0 +1,112 @@
+import heapq
+import math
+import numpy as np
+
+'''
+Streaming shift-and-add / lucky imaging.
+
+Frames are handed to a LuckyAccumulator while the acquisition is still running (by the lucky sink of
+the acquisition pipeline, on the sink's thread). It re-centres every frame on its brightest speckle
+(or centroid), keeps a running shift-and-add sum and holds the sharpest frames in a bounded min-heap,
+so the lucky-image products exist as soon as the run ends without re-reading the cube from disk.
+'''
+
+
+def locate_speckle(frame, method="peak"):
+    """
+    Return the (row, col) position used to register a frame.
+    :param frame: 2D image
+    :param method: "peak" for the brightest pixel, "centroid" for the background subtracted centre of light
+    """
+    if method == "centroid":
+        img = frame.astype(np.float32)
+        img -= np.median(img)
+        np.clip(img, 0, None, out=img)
+        total = img.sum()
+        if total <= 0:
+            return frame.shape[0] // 2, frame.shape[1] // 2
+        rows = np.arange(frame.shape[0], dtype=np.float32)
+        cols = np.arange(frame.shape[1], dtype=np.float32)
+        r = float(img.sum(axis=1) @ rows / total)
+        c = float(img.sum(axis=0) @ cols / total)
+        return int(round(r)), int(round(c))
+    idx = int(np.argmax(frame))
+    return divmod(idx, frame.shape[1])
+
+
+def sharpness_metric(frame, method="peak"):
+    """
+    Score a frame, higher is sharper.
+    "peak" is the peak-to-total flux ratio (a Strehl proxy), "variance" is the normalised sum of squares.
+    """
+    img = frame.astype(np.float64)
+    img -= np.median(img)
+    total = np.clip(img, 0, None).sum()
+    if total <= 0:
+        return 0.0
+    if method == "variance":
+        return float(np.square(img).sum() / (total * total))
+    return float(img.max() / total)
+
+
+class LuckyAccumulator:
+    """
+    Shift-and-add and lucky frame selection for one camera. Not thread safe, feed it from one thread.
+
+    :param serial: camera serial number the frames come from
+    :param keep_fraction: fraction of frames (0-1] to keep as lucky frames
+    :param expected_frames: number of frames in the run, used to size the heap. If None, max_keep is used.
+    :param max_keep: upper bound on the number of kept frames (bounds memory for long runs)
+    :param locate: "peak" or "centroid", see locate_speckle
+    :param metric: "peak" or "variance", see sharpness_metric
+    """
+    def __init__(self, serial=None, keep_fraction=0.1, expected_frames=None, max_keep=500,
+                 locate="peak", metric="peak"):
+        self.serial = serial
+        self.keep_fraction = min(max(float(keep_fraction), 0.0), 1.0)
+        if expected_frames:
+            self.keep = max(1, min(max_keep, int(math.ceil(self.keep_fraction * expected_frames))))
+        else:
+            self.keep = max(1, max_keep)
+        self.locate = locate
+        self.metric = metric
+
+        self.n_frames = 0
+        self.saa_sum = None
+        self._heap = []     # (score, frame number, registered frame) -- smallest score on top
+
+    def add_frame(self, frame):
+        """Register one frame, add it to the shift-and-add sum and offer it to the lucky frame heap."""
+        r, c = locate_speckle(frame, self.locate)
+        shift = (frame.shape[0] // 2 - r, frame.shape[1] // 2 - c)
+        registered = np.roll(frame, shift, axis=(0, 1))
+
+        if self.saa_sum is None:
+            self.saa_sum = np.zeros(frame.shape, dtype=np.float64)
+        self.saa_sum += registered
+
+        score = sharpness_metric(frame, self.metric)
+        entry = (score, self.n_frames, registered)
+        if len(self._heap) < self.keep:
+            heapq.heappush(self._heap, entry)
+        elif score > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+        self.n_frames += 1
+
+    def products(self):
+        """
+        :return: dict with the shift-and-add image, lucky image, the kept frames (best first),
+                 their scores and frame numbers. None if no frames were processed.
+        """
+        if self.n_frames == 0:
+            return None
+        kept = sorted(self._heap, key=lambda e: e[0], reverse=True)
+        lucky_frames = np.stack([e[2] for e in kept])
+        return {
+            "shift_and_add": (self.saa_sum / self.n_frames).astype(np.float32),
+            "lucky_image": lucky_frames.mean(axis=0, dtype=np.float64).astype(np.float32),
+            "lucky_frames": lucky_frames,
+            "scores": np.array([e[0] for e in kept]),
+            "frame_numbers": np.array([e[1] for e in kept]),
+            "n_frames": self.n_frames,
+        }
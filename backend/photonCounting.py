@@ -0,0 +1,163 @@
+import numpy as np
+from backend.cameraLogging import get_camera_logger
+
+'''
+EMCCD photon-counting mode.
+
+At high EM gain a pixel that reads more than a few bias sigma above its bias level almost certainly
+saw one (or more) photoelectrons. Thresholding every frame turns the raw ADU cube into binary event
+frames, which can either be summed into a photon map or bit-packed (8 pixels per byte) for storage.
+All of the work is done with NumPy on batches of frames.
+
+The bias level and noise should come from real bias frames (calibrate() with a dark, shutter closed stack).
+Without them the first batch of science frames is used. The median and the MAD used for both are not pulled up
+by the events as long as fewer than half of the frames have an event in a pixel, which holds at photon
+counting occupancies.
+'''
+
+
+MAD_TO_SIGMA = 1.4826           # sigma of a Gaussian from its median absolute deviation
+PIXEL_SIGMA_FRAMES = 8          # frames needed for a per pixel noise estimate
+
+
+def photon_counting_settings(configDict):
+    """
+    Read the photon counting settings from the emGain section of a camera config.
+    :return: dict of settings, or None if photon counting is turned off
+    """
+    if not configDict:
+        return None
+    em = configDict.get('emGain', {})
+    if str(em.get('photonCounting', 'OFF')).upper() != 'ON':
+        return None
+    return {
+        'thresholdSigma': float(em.get('thresholdSigma', 5.0)),
+        'coincidenceCorrection': str(em.get('coincidenceCorrection', 'ON')).upper() == 'ON',
+        'photonOutput': str(em.get('photonOutput', 'map')).lower(),
+        'emGainOn': str(em.get('state', 'OFF')).upper() == 'ON',
+        'gainLevel': em.get('gainLevel', 1),
+    }
+
+
+def coincidence_loss_correction(counts, n_frames):
+    """
+    Correct a photon map for coincidence losses. A thresholded pixel can only register one event per frame,
+    so if a fraction p of frames fired the Poisson mean per frame is -ln(1 - p).
+    :param counts: per pixel number of frames above threshold
+    :param n_frames: number of frames that went into counts
+    :return: float32 map of estimated photons
+    """
+    if n_frames == 0:
+        return counts.astype(np.float32)
+    p = np.clip(counts / float(n_frames), 0.0, 1.0 - 0.5 / n_frames)
+    return (-np.log1p(-p) * n_frames).astype(np.float32)
+
+
+class PhotonCounter:
+    """
+    Thresholds frames into photon events and accumulates the results for one camera.
+
+    :param threshold_sigma: number of bias sigma above the bias level a pixel must reach to count as an event
+    :param store_events: if True the bit-packed event frames are kept, otherwise only the photon map
+    :param batch_size: frames are buffered and thresholded this many at a time
+    """
+    def __init__(self, threshold_sigma=5.0, coincidence_correction=True, store_events=False, batch_size=32, serial=None):
+        self.threshold_sigma = threshold_sigma
+        self.coincidence_correction = coincidence_correction
+        self.store_events = store_events
+        self.batch_size = batch_size
+        self.logger = get_camera_logger(serial)
+
+        self.bias = None
+        self.bias_sigma = None
+        self.threshold = None
+        self.counts = None
+        self.n_frames = 0
+        self.events = []
+        self._batch = None
+        self._n_batch = 0
+
+    @classmethod
+    def from_config(cls, configDict, serial=None, batch_size=32):
+        """Build a PhotonCounter from a camera config, or return None if photon counting is off."""
+        settings = photon_counting_settings(configDict)
+        if settings is None:
+            return None
+        return cls(threshold_sigma=settings['thresholdSigma'],
+                   coincidence_correction=settings['coincidenceCorrection'],
+                   store_events=settings['photonOutput'] == 'events',
+                   batch_size=batch_size, serial=serial)
+
+    def calibrate(self, bias_frames):
+        """
+        Set the per pixel bias level (median) and noise (MAD) from a stack of frames (frame axis first).
+        The noise is per pixel with at least PIXEL_SIGMA_FRAMES frames and one global value below that.
+        Both estimates stay put when the frames hold sparse photon events, so science frames can stand in
+        for bias frames, but a real bias stack gives the cleaner threshold.
+        """
+        bias_frames = np.asarray(bias_frames, dtype=np.float32)
+        if bias_frames.ndim == 2:
+            bias_frames = bias_frames[np.newaxis]
+        self.bias = np.median(bias_frames, axis=0)
+        resid = np.abs(bias_frames - self.bias)
+        if bias_frames.shape[0] >= PIXEL_SIGMA_FRAMES:
+            self.bias_sigma = MAD_TO_SIGMA * np.median(resid, axis=0)
+        else:
+            self.bias_sigma = np.full(self.bias.shape, MAD_TO_SIGMA * np.median(resid), dtype=np.float32)
+        self.bias_sigma = np.maximum(self.bias_sigma, 1e-3)
+        self.threshold = self.bias + self.threshold_sigma * self.bias_sigma
+        self.logger.info(f"Photon counting threshold set at {self.threshold_sigma} sigma "
+                         f"(median bias {float(np.median(self.bias)):.1f} ADU, median sigma {float(np.median(self.bias_sigma)):.2f} ADU)")
+
+    def add_frame(self, frame):
+        """Buffer a single frame, thresholding once a full batch has been collected."""
+        if self._batch is None:
+            self._batch = np.empty((self.batch_size,) + frame.shape, dtype=frame.dtype)
+        self._batch[self._n_batch] = frame
+        self._n_batch += 1
+        if self._n_batch == self.batch_size:
+            self.process(self._batch)
+            self._n_batch = 0
+
+    def flush(self):
+        """Threshold any frames left in a partially filled batch."""
+        if self._n_batch:
+            self.process(self._batch[:self._n_batch])
+            self._n_batch = 0
+
+    def process(self, frames):
+        """Threshold a batch of frames (frame axis first) and accumulate the events."""
+        frames = np.asarray(frames)
+        if frames.ndim == 2:
+            frames = frames[np.newaxis]
+        if self.threshold is None:
+            self.calibrate(frames)
+        events = frames > self.threshold
+        if self.counts is None:
+            self.counts = np.zeros(frames.shape[1:], dtype=np.uint32)
+        self.counts += events.sum(axis=0, dtype=np.uint32)
+        self.n_frames += frames.shape[0]
+        if self.store_events:
+            self.events.append(np.packbits(events, axis=-1))
+        return events
+
+    def photon_map(self):
+        """:return: the accumulated photon map, coincidence loss corrected if enabled"""
+        self.flush()
+        if self.counts is None:
+            return None
+        if self.coincidence_correction:
+            return coincidence_loss_correction(self.counts, self.n_frames)
+        return self.counts
+
+    def packed_events(self):
+        """:return: uint8 cube of bit-packed event frames (frame, row, ceil(col/8)), or None"""
+        self.flush()
+        if not self.events:
+            return None
+        return np.concatenate(self.events, axis=0)
+
+    @staticmethod
+    def unpack_events(packed, width):
+        """Inverse of the bit packing, returns a boolean event cube with the given frame width."""
+        return np.unpackbits(packed, axis=-1, count=width).astype(bool)
@@ -0,0 +1,140 @@
+import math
+import numpy as np
+
+'''
+Preview display scaling.
+
+Every stretch is a 65536 entry uint16 -> uint8 lookup table, so displaying a frame costs one table
+lookup per pixel whatever the mode. The limits come from a histogram of a strided subsample of the
+frame (np.bincount, no sorting), and the table is only rebuilt when the mode, its parameters or the
+limits (quantised to LIMIT_STEP of the range) change, which for a steady scene is almost never.
+
+    minmax      full range of the frame
+    percentile  low / high percentiles (defaults 1 and 99.5)
+    zscale      the IRAF / DS9 zscale limits, fitted to a sorted sample
+    log         percentile limits, logarithmic transfer
+    asinh       percentile limits, asinh transfer (linear for faint, logarithmic for bright pixels)
+    histeq      histogram equalisation, the table is the cumulative histogram itself (refreshed every
+                HISTEQ_EVERY frames, it follows the noise of the histogram otherwise)
+'''
+
+MODES = ("minmax", "percentile", "zscale", "log", "asinh", "histeq")
+LIMIT_STEP = 0.01           # limits moving by less than this fraction of their range keep the current table
+HISTEQ_EVERY = 10
+LOG_A = 1000.0
+ZSCALE_SAMPLES = 1000
+ZSCALE_CONTRAST = 0.25
+
+
+def histogram_limits(hist, low, high):
+    """:return: (low, high) ADU percentiles of a bincount histogram"""
+    cdf = np.cumsum(hist)
+    n = cdf[-1]
+    lo = int(np.searchsorted(cdf, low / 100.0 * n))
+    hi = int(np.searchsorted(cdf, high / 100.0 * n))
+    return lo, max(hi, lo + 1)
+
+
+def zscale_limits(sample, contrast=ZSCALE_CONTRAST, iterations=3, rejection=2.5):
+    """
+    zscale limits of a 1D pixel sample: a line is fitted to the sorted values (rejecting outliers),
+    and the range is the median -/+ the slope / contrast over half the sample.
+    """
+    values = np.sort(sample.astype(np.float64))
+    n = values.size
+    if n < 3:
+        return float(values[0]), float(values[-1]) + 1
+    x = np.arange(n, dtype=np.float64)
+    keep = np.ones(n, dtype=bool)
+    slope, intercept = 0.0, float(values[n // 2])
+    for _ in range(iterations):
+        if keep.sum() < n // 2:
+            break
+        slope, intercept = np.polyfit(x[keep], values[keep], 1)
+        resid = values - (slope * x + intercept)
+        sigma = resid[keep].std()
+        keep = np.abs(resid) < rejection * max(sigma, 1e-9)
+    median = float(values[n // 2])
+    half = slope / contrast * n / 2
+    lo, hi = max(median - half, values[0]), min(median + half, values[-1])
+    return float(lo), float(max(hi, lo + 1))
+
+
+class PreviewScaler:
+    """
+    Cached uint16 -> uint8 stretch for the live preview. Not thread safe by itself, use one per display thread
+    (changing mode or params from another thread is fine, the next frame picks them up).
+
+    :param stride: subsampling step in both axes for the statistics
+    """
+    def __init__(self, mode="minmax", low=1.0, high=99.5, asinh_beta=0.1, stride=4):
+        self.mode = mode
+        self.low = low
+        self.high = high
+        self.asinh_beta = asinh_beta
+        self.stride = stride
+        self.limits = (0, 65535)
+        self.lut = None
+        self._key = None
+        self._frames = 0
+        self.rebuilds = 0
+
+    def set_mode(self, mode, **params):
+        if mode not in MODES:
+            raise ValueError(f"Unknown preview scaling '{mode}', expected one of {MODES}")
+        self.mode = mode
+        for name, value in params.items():
+            setattr(self, name, value)
+
+    def update(self, frame):
+        """Recompute the limits from a frame and rebuild the table if they moved. :return: the table"""
+        sample = frame[::self.stride, ::self.stride]
+        if sample.dtype != np.uint16:
+            sample = np.clip(sample, 0, 65535).astype(np.uint16)
+        # read once, set_mode() from another thread must not change them half way through
+        mode, low, high, beta = self.mode, self.low, self.high, self.asinh_beta
+        hist = None
+        if mode == "minmax":
+            lo, hi = int(sample.min()), int(sample.max())
+            hi = max(hi, lo + 1)
+        elif mode == "zscale":
+            flat = sample.ravel()
+            lo, hi = zscale_limits(flat[::max(flat.size // ZSCALE_SAMPLES, 1)])
+        else:
+            hist = np.bincount(sample.ravel(), minlength=65536)
+            lo, hi = histogram_limits(hist, low, high)
+
+        # quantise the limits so noise in the statistics does not rebuild the table every frame
+        step = max((hi - lo) * LIMIT_STEP, 1.0)
+        key = ((mode, low, high, beta), round(lo / step), round(hi / step), round(math.log2(step)))
+        if mode == "histeq":
+            key += (self._frames // HISTEQ_EVERY,)
+        self._frames += 1
+        if key != self._key or self.lut is None:
+            self.limits = (lo, hi)
+            self.lut = self._build(mode, lo, hi, hist, beta)
+            self._key = key
+            self.rebuilds += 1
+        return self.lut
+
+    def _build(self, mode, lo, hi, hist=None, asinh_beta=0.1):
+        values = np.arange(65536, dtype=np.float64)
+        if mode == "histeq":
+            cdf = np.cumsum(hist).astype(np.float64)
+            return np.round(255 * (cdf - cdf[0]) / max(cdf[-1] - cdf[0], 1)).astype(np.uint8)
+        x = np.clip((values - lo) / (hi - lo), 0.0, 1.0)
+        if mode == "log":
+            x = np.log1p(LOG_A * x) / math.log1p(LOG_A)
+        elif mode == "asinh":
+            x = np.arcsinh(x / asinh_beta) / math.asinh(1.0 / asinh_beta)
+        return np.round(255 * x).astype(np.uint8)
+
+    def apply(self, frame, lut=None):
+        """Map a uint16 frame (or a resized view of it) through the table, one lookup per pixel."""
+        lut = self.lut if lut is None else lut
+        if frame.dtype != np.uint16:
+            frame = np.clip(frame, 0, 65535).astype(np.uint16)
+        return np.take(lut, frame)
+
+    def __call__(self, frame):
+        return self.apply(frame, self.update(frame))
@@ -0,0 +1,171 @@
+import numpy as np
+
+'''
+Zoom / pan viewport and region statistics for the live preview.
+
+The viewport is a window (rows r0:r1, columns c0:c1) of the full frame. Only that window is resampled
+to the display size and put through the scaling table, so zooming in makes a preview frame cheaper,
+not dearer. Zoom, pan and the statistics region are kept in frame coordinates, so they stay on the
+same pixels while the frame updates. The last rendered mapping is remembered so mouse positions on the
+display can be turned back into frame pixels.
+
+region_stats() works on the region alone: background is the region median, and the FWHM along each
+axis comes from the half-maximum crossings of the background-subtracted marginal profile, interpolated
+between pixels.
+'''
+
+FWHM_FACTOR = 2.0 * np.sqrt(2.0 * np.log(2.0))
+
+
+def profile_fwhm(profile):
+    """
+    Full width at half maximum of a 1D background-subtracted profile around its peak, in pixels.
+    :return: the width, or nan if the profile has no positive peak or does not drop below half on both sides
+    """
+    profile = np.asarray(profile, dtype=np.float64)
+    i = int(np.argmax(profile))
+    peak = profile[i]
+    if peak <= 0:
+        return float("nan")
+    half = peak / 2.0
+    left = np.flatnonzero(profile[:i] < half)
+    right = np.flatnonzero(profile[i + 1:] < half)
+    if left.size == 0 or right.size == 0:
+        return float("nan")
+    l, r = left[-1], i + 1 + right[0]
+    # linear interpolation of the crossing between the pixel below and the pixel above half maximum
+    x_left = l + (half - profile[l]) / (profile[l + 1] - profile[l])
+    x_right = r - 1 + (profile[r - 1] - half) / (profile[r - 1] - profile[r])
+    return float(x_right - x_left)
+
+
+def region_stats(frame, region):
+    """
+    :param region: (r0, r1, c0, c1) in frame coordinates
+    :return: dict with mean, peak, peak_pos (row, col), background, fwhm_x, fwhm_y and pixels, or None if empty
+    """
+    r0, r1, c0, c1 = region
+    sub = frame[r0:r1, c0:c1]
+    if sub.size == 0:
+        return None
+    idx = int(np.argmax(sub))
+    pr, pc = divmod(idx, sub.shape[1])
+    img = sub.astype(np.float32)
+    background = float(np.median(img))
+    img -= background
+    return {
+        "mean": float(sub.mean()),
+        "peak": int(sub.flat[idx]),
+        "peak_pos": (r0 + pr, c0 + pc),
+        "background": background,
+        "fwhm_x": profile_fwhm(img.sum(axis=0)),
+        "fwhm_y": profile_fwhm(img.sum(axis=1)),
+        "pixels": int(sub.size),
+    }
+
+
+class PreviewViewport:
+    """
+    Zoomed / panned view of the preview frames.
+    :param max_zoom: largest zoom, in display pixels per frame pixel relative to the fitted view
+    """
+    def __init__(self, max_zoom=32.0):
+        self.max_zoom = max_zoom
+        self.zoom = 1.0
+        self.center = None          # (row, col) in frame coordinates, None for the frame centre
+        self.region = None          # (r0, r1, c0, c1) for region_stats, None for no region
+        self.shape = None
+        self._mapping = None        # (window, display size) of the last render
+
+    def reset(self):
+        self.zoom = 1.0
+        self.center = None
+
+    def window(self, shape):
+        """:return: (r0, r1, c0, c1) of the frame visible at the current zoom and centre"""
+        rows, cols = shape[:2]
+        h = max(int(round(rows / self.zoom)), 1)
+        w = max(int(round(cols / self.zoom)), 1)
+        cr, cc = self.center if self.center is not None else (rows / 2.0, cols / 2.0)
+        r0 = int(round(min(max(cr - h / 2.0, 0), rows - h)))
+        c0 = int(round(min(max(cc - w / 2.0, 0), cols - w)))
+        return r0, r0 + h, c0, c0 + w
+
+    def render(self, frame, scaler, lut, display_size):
+        """
+        Crop the visible window, resample it to display_size (width, height) and map it through the table.
+        The statistics region is drawn as a box. :return: uint8 image for the display
+        """
+        import cv2      # deferred like the other preview imports in main.py
+        self.shape = frame.shape
+        r0, r1, c0, c1 = window = self.window(frame.shape)
+        width, height = display_size
+        crop = frame[r0:r1, c0:c1]
+        # blocks when zoomed in so single pixels can be inspected, smooth when the window is shrunk
+        interpolation = cv2.INTER_NEAREST if (c1 - c0) < width else cv2.INTER_LINEAR
+        view = scaler.apply(cv2.resize(crop, (width, height), interpolation=interpolation), lut)
+        self._mapping = (window, display_size)
+        if self.region is not None:
+            self._draw_box(view, self.region)
+        return view
+
+    def to_frame(self, x, y):
+        """:return: (row, col) frame pixel under display position x, y of the last render, or None"""
+        if self._mapping is None:
+            return None
+        (r0, r1, c0, c1), (width, height) = self._mapping
+        row = r0 + int(y * (r1 - r0) / height)
+        col = c0 + int(x * (c1 - c0) / width)
+        if not (r0 <= row < r1 and c0 <= col < c1):
+            return None
+        return row, col
+
+    def to_display(self, row, col):
+        (r0, r1, c0, c1), (width, height) = self._mapping
+        return int((col - c0) * width / (c1 - c0)), int((row - r0) * height / (r1 - r0))
+
+    def zoom_at(self, x, y, factor):
+        """Zoom by factor keeping the frame pixel under display position x, y where it is."""
+        if self.shape is None or self._mapping is None:
+            return
+        (r0, r1, c0, c1), (width, height) = self._mapping
+        new_zoom = min(max(self.zoom * factor, 1.0), self.max_zoom)
+        # the point under the cursor keeps its relative position in the window
+        fr, fc = y / height, x / width
+        row, col = r0 + fr * (r1 - r0), c0 + fc * (c1 - c0)
+        h, w = self.shape[0] / new_zoom, self.shape[1] / new_zoom
+        self.zoom = new_zoom
+        self.center = (row - fr * h + h / 2.0, col - fc * w + w / 2.0)
+
+    def pan(self, dx, dy):
+        """Move the view by dx, dy display pixels (dragging right shows what is left of the view)."""
+        if self.shape is None or self._mapping is None:
+            return
+        (r0, r1, c0, c1), (width, height) = self._mapping
+        cr, cc = (r0 + r1) / 2.0, (c0 + c1) / 2.0
+        self.center = (cr - dy * (r1 - r0) / height, cc - dx * (c1 - c0) / width)
+
+    def set_region(self, x0, y0, x1, y1):
+        """Set the statistics region from two display corners. :return: the region, None if it is empty"""
+        a, b = self.to_frame(x0, y0), self.to_frame(x1, y1)
+        if a is None or b is None:
+            return None
+        r0, r1 = sorted((a[0], b[0]))
+        c0, c1 = sorted((a[1], b[1]))
+        self.region = (r0, r1 + 1, c0, c1 + 1) if (r1 > r0 or c1 > c0) else None
+        return self.region
+
+    def _draw_box(self, view, region):
+        (w0, w1, v0, v1), _ = self._mapping
+        r0, r1, c0, c1 = region
+        if r1 <= w0 or r0 >= w1 or c1 <= v0 or c0 >= v1:
+            return
+        height, width = view.shape
+        x0, y0 = self.to_display(max(r0, w0), max(c0, v0))
+        x1, y1 = self.to_display(min(r1, w1), min(c1, v1))
+        x0, x1 = min(max(x0, 0), width - 1), min(max(x1 - 1, 0), width - 1)
+        y0, y1 = min(max(y0, 0), height - 1), min(max(y1 - 1, 0), height - 1)
+        view[y0, x0:x1 + 1] = 255
+        view[y1, x0:x1 + 1] = 255
+        view[y0:y1 + 1, x0] = 255
+        view[y0:y1 + 1, x1] = 255
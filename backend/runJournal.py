@@ -0,0 +1,219 @@
+import os
+import json
+import shutil
+import numpy as np
+from datetime import datetime
+from backend.frameMetadata import FrameMetadataRecorder, FRAME_DTYPE
+from backend.cameraDataHandle import save_fits_chunks
+from backend.cameraLogging import get_camera_logger
+
+'''
+Write-ahead journal for FITS runs.
+
+A FITS cube can only be written once the run is over, so without a journal every frame of a run lives in RAM
+until then and a crash loses all of it. The journal writes every completed chunk of frames (and their FRAMES
+rows) to <save path>/.journal/<run>/ as .npy files, and only then lists the chunk in manifest.json. Chunk files
+and the manifest are written to a temporary name and renamed into place, so the manifest never names a chunk
+that is not complete on disk. A normal run streams the chunks into its FITS file one at a time (memory mapped,
+so the run is never in RAM as a whole) and deletes the journal.
+Anything left in .journal on start-up belongs to a run that did not finish, and recover_journals() turns
+its listed chunks into a FITS file and reports which SDK frame ranges survived.
+'''
+
+JOURNAL_DIRNAME = ".journal"
+MANIFEST_NAME = "manifest.json"
+
+
+def _atomic_write_json(path, obj):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _atomic_save_npy(path, array):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def frame_ranges(sdk_indices):
+    """:return: [[first, last], ...] runs of consecutive SDK indices"""
+    idx = np.asarray(sdk_indices, dtype=np.int64)
+    if idx.size == 0:
+        return []
+    breaks = np.nonzero(np.diff(idx) != 1)[0]
+    starts = np.concatenate(([0], breaks + 1))
+    stops = np.concatenate((breaks, [idx.size - 1]))
+    return [[int(idx[a]), int(idx[b])] for a, b in zip(starts, stops)]
+
+
+class RunJournal:
+    """
+    Journal for one run of one camera.
+
+    :param save_path: the run's data directory, the journal goes in save_path/.journal
+    :param chunk_frames: frames per journaled chunk, bounds both the RAM held and the frames a crash can lose
+    """
+    def __init__(self, save_path, serial, header_text=None, chunk_frames=100):
+        self.serial = serial
+        self.save_path = save_path
+        self.chunk_frames = max(int(chunk_frames), 1)
+        curr_date = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+        self.path = os.path.join(save_path, JOURNAL_DIRNAME, f"{curr_date}_{serial}")
+        os.makedirs(self.path, exist_ok=True)
+        self.recorder = FrameMetadataRecorder(capacity=1)      # only used for the clock reference pair
+        self.manifest = {
+            "serial": serial,
+            "created": datetime.now().isoformat(),
+            "header_text": header_text or "",
+            "mono_ref": self.recorder.mono_ref,
+            "unix_ref": self.recorder.unix_ref,
+            "frame_shape": None,
+            "dtype": None,
+            "chunks": [],
+            "status": "open",
+        }
+        self.frames = []
+        self.rows = []
+        self.n_frames = 0
+        _atomic_write_json(os.path.join(self.path, MANIFEST_NAME), self.manifest)
+
+    def append(self, frame, sdk_index, host_time, temperature=np.nan, missed=0, late=False):
+        """Add a frame, writing out the chunk once chunk_frames frames are buffered."""
+        if self.manifest["frame_shape"] is None:
+            self.manifest["frame_shape"] = list(frame.shape)
+            self.manifest["dtype"] = np.dtype(frame.dtype).str
+        self.frames.append(frame)
+        self.rows.append((self.n_frames, sdk_index, host_time, temperature, missed, late))
+        self.n_frames += 1
+        if len(self.frames) >= self.chunk_frames:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered frames as a chunk and list it in the manifest."""
+        if not self.frames:
+            return
+        number = len(self.manifest["chunks"])
+        name = f"chunk_{number:05d}"
+        rows = np.array(self.rows, dtype=FRAME_DTYPE)
+        _atomic_save_npy(os.path.join(self.path, name + ".npy"), np.stack(self.frames))
+        _atomic_save_npy(os.path.join(self.path, name + ".frames.npy"), rows)
+        self.manifest["chunks"].append({
+            "file": name + ".npy",
+            "frames_file": name + ".frames.npy",
+            "n_frames": len(rows),
+            "first_frame": int(rows["SDK_INDEX"][0]),
+            "last_frame": int(rows["SDK_INDEX"][-1]),
+        })
+        _atomic_write_json(os.path.join(self.path, MANIFEST_NAME), self.manifest)
+        self.frames = []
+        self.rows = []
+
+    def finalize(self, header_cards=None, serial=None):
+        """
+        Flush the last chunk and assemble the FITS file from the journal, then delete the journal.
+        :param serial: name used in the FITS file name (defaults to the camera serial)
+        :return: the FITS file name, or None if no frames were journaled
+        """
+        self.flush()
+        path = _write_fits(self.path, self.manifest, self.save_path, header_cards=header_cards, serial=serial)
+        self.discard()
+        return path
+
+    def discard(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+def _load_chunks(journal_path, manifest):
+    """Load every listed chunk that is complete on disk. :return: (frames, rows, problems)"""
+    frames, rows, problems = [], [], []
+    shape = tuple(manifest["frame_shape"] or ())
+    for chunk in manifest["chunks"]:
+        try:
+            data = np.load(os.path.join(journal_path, chunk["file"]), mmap_mode="r")
+            table = np.load(os.path.join(journal_path, chunk["frames_file"]))
+            if data.shape[1:] != shape or data.shape[0] != chunk["n_frames"] or len(table) != chunk["n_frames"]:
+                raise ValueError(f"shape {data.shape} does not match the manifest")
+        except Exception as e:
+            problems.append(f"{chunk['file']}: {e}")
+            continue
+        frames.append(data)
+        rows.append(table)
+    return frames, rows, problems
+
+
+def _write_fits(journal_path, manifest, save_path, header_cards=None, serial=None):
+    frames, rows, problems = _load_chunks(journal_path, manifest)
+    if problems:
+        raise RuntimeError(f"Journal {journal_path} has unreadable chunks: {'; '.join(problems)}")
+    if not frames:
+        return None
+    recorder = FrameMetadataRecorder(capacity=1)
+    recorder.rows = np.concatenate(rows)
+    recorder.rows["FRAME"] = np.arange(len(recorder.rows))
+    recorder.n = len(recorder.rows)
+    recorder.mono_ref, recorder.unix_ref = manifest["mono_ref"], manifest["unix_ref"]
+    return save_fits_chunks(frames, manifest["frame_shape"], np.dtype(manifest["dtype"]), save_path,
+                            header_text=manifest["header_text"], serial=serial or manifest["serial"],
+                            frame_table=recorder, header_cards=header_cards)
+
+
+def find_journals(save_path):
+    """:return: paths of the journals left behind in save_path (runs that did not finish and were not recovered yet)"""
+    root = os.path.join(save_path, JOURNAL_DIRNAME)
+    if not os.path.isdir(root):
+        return []
+    journals = []
+    for d in sorted(os.listdir(root)):
+        manifest_path = os.path.join(root, d, MANIFEST_NAME)
+        try:
+            with open(manifest_path, "r") as f:
+                if json.load(f).get("status") == "recovered":
+                    continue
+        except (OSError, ValueError):
+            continue
+        journals.append(os.path.join(root, d))
+    return journals
+
+
+def recover_journals(save_path, remove=True):
+    """
+    Turn every unfinished journal in save_path into a FITS file.
+    :param remove: delete each journal once its FITS file has been written
+    :return: list of dicts with the journal, written file, frames recovered, surviving SDK frame ranges and problems
+    """
+    reports = []
+    for journal_path in find_journals(save_path):
+        report = {"journal": journal_path, "file": None, "n_frames": 0, "frame_ranges": [], "problems": []}
+        try:
+            with open(os.path.join(journal_path, MANIFEST_NAME), "r") as f:
+                manifest = json.load(f)
+            logger = get_camera_logger(manifest.get("serial"))
+            frames, rows, problems = _load_chunks(journal_path, manifest)
+            report["problems"] = problems
+            if frames:
+                table = np.concatenate(rows)
+                report["n_frames"] = int(len(table))
+                report["frame_ranges"] = frame_ranges(table["SDK_INDEX"])
+                # assemble from the chunks that loaded only
+                readable = dict(manifest, chunks=[c for c in manifest["chunks"] if not any(p.startswith(c["file"]) for p in problems)])
+                report["file"] = _write_fits(journal_path, readable, save_path, serial=f"{manifest['serial']}_recovered",
+                                             header_cards={"RECOVERD": (True, "assembled from the write-ahead journal")})
+            logger.warning(f"Recovered {report['n_frames']} frames of an unfinished run to {report['file']}, "
+                           f"SDK frame ranges {report['frame_ranges']}")
+            if remove and not problems:
+                shutil.rmtree(journal_path, ignore_errors=True)
+            else:
+                # keep the damaged chunks for inspection, but do not recover the same run again
+                manifest["status"] = "recovered"
+                _atomic_write_json(os.path.join(journal_path, MANIFEST_NAME), manifest)
+        except Exception as e:
+            report["problems"].append(str(e))
+        reports.append(report)
+    return reports
@@ -0,0 +1,240 @@
+import os
+import copy
+import json
+import time
+import threading
+from datetime import datetime
+from backend.cameraLogging import get_camera_logger
+
+'''
+Observing sequences.
+
+A sequence file is an ordered list of steps run against one camera:
+
+    {"name": "M42 night",
+     "steps": [
+        {"action": "configure", "profile": "kinetic", "overrides": {"exposureTime": 0.02}},
+        {"action": "waitTemperature", "target": -60, "tolerance": 1.0, "timeout": 1800},
+        {"action": "bias", "frames": 50},
+        {"action": "repeat", "count": 3, "steps": [
+            {"action": "acquire", "frames": 1000, "label": "M42"},
+            {"action": "set", "values": {"exposureTime": 0.05}}
+        ]},
+        {"action": "dark", "frames": 50, "exposureTime": 0.05},
+        {"action": "wait", "seconds": 10}
+     ]}
+
+Profiles come from backend/acquistion_profiles.json and are merged over the camera's current config.
+Saving an acquisition runs in the background while the following steps (reconfiguring, cooling, waiting)
+already go ahead; only the next acquisition waits for it, so at most two runs are in memory. Steps that
+only change the exposure are applied without a full camera_configuration. Every step is timed, and the
+dead time between the end of one acquisition and the start of the next is reported.
+'''
+
+PROFILES_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), "acquistion_profiles.json")
+SEQUENCE_ACTIONS = ["configure", "set", "waitTemperature", "acquire", "bias", "dark", "wait", "repeat"]
+CLOSED_SHUTTER = {"InternalShutter": "Closed", "ExternalShutter": "Closed"}
+# keys that can be changed on an idle camera without going through camera_configuration
+FAST_KEYS = {"exposureTime"}
+
+
+class SequenceError(ValueError):
+    """Raised for a malformed sequence file."""
+    pass
+
+
+def deep_merge(base, overrides):
+    """Return a copy of base with overrides merged in, nested dicts are merged key by key."""
+    merged = copy.deepcopy(base) if base else {}
+    for key, value in (overrides or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = deep_merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def load_profiles(path=PROFILES_PATH):
+    with open(path, "r") as f:
+        return json.load(f).get("acquisitionMode", {})
+
+
+def expand_steps(steps):
+    """Flatten repeat blocks into a plain list of steps, checking every action."""
+    flat = []
+    for step in steps:
+        action = step.get("action")
+        if action not in SEQUENCE_ACTIONS:
+            raise SequenceError(f"Unknown sequence action '{action}', expected one of {SEQUENCE_ACTIONS}")
+        if action == "repeat":
+            inner = expand_steps(step.get("steps", []))
+            for _ in range(int(step.get("count", 1))):
+                flat.extend(copy.deepcopy(inner))
+        else:
+            if action in ("acquire", "bias", "dark") and int(step.get("frames", 0)) <= 0:
+                raise SequenceError(f"Step {step} needs a positive number of frames")
+            flat.append(step)
+    return flat
+
+
+def load_sequence(path):
+    """:return: (name, flat list of steps) from a sequence file"""
+    with open(path, "r") as f:
+        sequence = json.load(f)
+    name = sequence.get("name", os.path.splitext(os.path.basename(path))[0])
+    return name, expand_steps(sequence.get("steps", []))
+
+
+class SequenceRunner:
+    """
+    Runs a flat list of steps on one camera.
+
+    :param camera: connected Camera
+    :param acquire: acquire(num_frames, tag, extra_cards) -> finish, where acquire returns once the camera has
+                    stopped and finish() saves the run (blocking). See CameraMonitorApp._acquire.
+    :param log: function taking a message for the experiment log
+    :param stop_event: threading.Event, checked between steps
+    """
+    def __init__(self, camera, steps, acquire, name="sequence", log=None, stop_event=None, profiles=None):
+        self.camera = camera
+        self.serial = camera.serialNumber
+        self.steps = steps
+        self.acquire = acquire
+        self.name = name
+        self.log = log or (lambda message: None)
+        self.stop_event = stop_event or threading.Event()
+        self.profiles = profiles if profiles is not None else load_profiles()
+        self.logger = get_camera_logger(self.serial)
+        self.stats = []
+        self._saver = None
+        self._save_error = None
+        self._last_acquisition_end = None
+
+    def run(self):
+        """Run every step in order. Returns the per step statistics."""
+        start = time.monotonic()
+        try:
+            for number, step in enumerate(self.steps):
+                if self.stop_event.is_set():
+                    self.log(f"Sequence '{self.name}' stopped before step {number}")
+                    break
+                self._run_step(number, step)
+        finally:
+            self._wait_for_save()
+        total = time.monotonic() - start
+        acquiring = sum(s["duration"] for s in self.stats if s["action"] in ("acquire", "bias", "dark"))
+        dead = sum(s.get("dead_time", 0.0) for s in self.stats)
+        self.log(f"Sequence '{self.name}' finished in {total:.1f} s, {acquiring:.1f} s acquiring, {dead:.1f} s dead time between acquisitions")
+        return self.stats
+
+    def _run_step(self, number, step):
+        action = step["action"]
+        label = step.get("label", action)
+        self.log(f"Step {number + 1}/{len(self.steps)}: {action} {label if label != action else ''}".rstrip())
+        entry = {"step": number, "action": action, "label": label, "start": time.time()}
+        t0 = time.monotonic()
+        if action == "configure":
+            self._configure(step)
+        elif action == "set":
+            self._apply(deep_merge(self.camera.cam_config, step.get("values", {})))
+        elif action == "waitTemperature":
+            entry["temperature"] = self._wait_temperature(step)
+        elif action == "wait":
+            self.stop_event.wait(float(step.get("seconds", 0)))
+        elif action in ("acquire", "bias", "dark"):
+            entry.update(self._acquisition(number, step, action, label))
+        entry["duration"] = time.monotonic() - t0
+        self.stats.append(entry)
+
+    def _configure(self, step):
+        base = self.camera.cam_config or {}
+        if "profile" in step:
+            if step["profile"] not in self.profiles:
+                raise SequenceError(f"Unknown acquisition profile '{step['profile']}', expected one of {list(self.profiles)}")
+            base = deep_merge(base, self.profiles[step["profile"]])
+            base["acquisitionMode"] = step["profile"]
+        if "config" in step:
+            with open(step["config"], "r") as f:
+                base = deep_merge(base, json.load(f))
+        self._apply(deep_merge(base, step.get("overrides", {})))
+
+    def _apply(self, config):
+        """Apply a config, skipping the full camera_configuration when only the exposure changed."""
+        current = self.camera.cam_config or {}
+        changed = {k for k in set(config) | set(current) if config.get(k) != current.get(k)}
+        if not changed:
+            return
+        if changed <= FAST_KEYS and self.camera.is_opened():
+            self.camera.set_exposure(exposure=config["exposureTime"])
+            self.camera.cam_config = config
+            return
+        if not self.camera.camera_configuration(config):
+            raise RuntimeError(f"Camera {self.serial} rejected the configuration")
+
+    def _wait_temperature(self, step):
+        target = float(step.get("target", (self.camera.cam_config or {}).get("temperatureSetpoint", -25)))
+        tolerance = float(step.get("tolerance", 1.0))
+        timeout = float(step.get("timeout", 1800))
+        if "target" in step:
+            self.camera.set_temperature(int(target))
+        deadline = time.monotonic() + timeout
+        temperature = self.camera.get_temperature()
+        while abs(temperature - target) > tolerance:
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Camera {self.serial} at {temperature:.1f} C did not reach {target:.1f} C within {timeout:.0f} s")
+            if self.stop_event.wait(2.0):
+                break
+            temperature = self.camera.get_temperature()
+        self.log(f"Camera at {temperature:.1f} C (target {target:.1f} C)")
+        return temperature
+
+    def _acquisition(self, number, step, action, label):
+        science_config = self.camera.cam_config
+        if action in ("bias", "dark"):
+            exposure = 0.0 if action == "bias" else float(step.get("exposureTime", (science_config or {}).get("exposureTime", 0.0)))
+            self._apply(deep_merge(science_config, {"exposureTime": exposure, "shutterSettings": CLOSED_SHUTTER}))
+
+        self._wait_for_save()       # at most one run saving while the next one is taken
+        t0 = time.monotonic()
+        dead_time = t0 - self._last_acquisition_end if self._last_acquisition_end is not None else 0.0
+        cards = {
+            "SEQNAME": (self.name, "observing sequence"),
+            "SEQSTEP": (number, "step number in the sequence"),
+            "IMAGETYP": ({"acquire": "object"}.get(action, action), "frame type"),
+            "OBJECT": (label, "step label"),
+        }
+        tag = f"{number:03d}_{label}".replace(" ", "_")
+        finish = self.acquire(int(step["frames"]), tag, cards)
+        acquired = time.monotonic() - t0
+        self._last_acquisition_end = time.monotonic()
+        self._save_in_background(finish, tag)
+
+        if action in ("bias", "dark"):
+            self._apply(science_config)     # overlaps with the save started above
+        return {"frames": int(step["frames"]), "acquisition_time": acquired, "dead_time": dead_time}
+
+    def _save_in_background(self, finish, tag):
+        def save():
+            try:
+                finish()
+            except Exception as e:
+                self._save_error = f"{tag}: {e}"
+                self.logger.error(f"Saving sequence step {tag} failed: {e}")
+        self._saver = threading.Thread(target=save, name=f"save-{self.serial}", daemon=True)
+        self._saver.start()
+
+    def _wait_for_save(self):
+        if self._saver is not None:
+            self._saver.join()
+            self._saver = None
+        if self._save_error is not None:
+            error, self._save_error = self._save_error, None
+            raise RuntimeError(f"Saving step {error}")
+
+    def write_report(self, save_path):
+        """Write the per step statistics next to the data, returns the path."""
+        curr_date = datetime.now().strftime("%Y_%m_%d__%H_%M_%S")
+        path = os.path.join(save_path, f"{curr_date}_{self.serial}_sequence.json")
+        with open(path, "w") as f:
+            json.dump({"name": self.name, "serial": self.serial, "steps": self.stats}, f, indent=2)
+        return path
@@ -0,0 +1,103 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+'''
+Single producer / single consumer frame ring in multiprocessing shared memory.
+
+The producer (a camera process) copies each frame into slot seq % slots and then only the sequence number
+travels to the consumer over a pipe. Two int64 counters at the start of the block hold the number of
+frames written and released; each is only ever written by one side, so no lock is needed. The producer
+waits while the ring is full, which back-pressures the camera instead of overwriting unread frames.
+'''
+
+HEADER_BYTES = 64       # write count, release count, padded to a cache line
+_WRITTEN, _RELEASED = 0, 1
+
+
+class RingTimeout(TimeoutError):
+    """Raised when the producer waited too long for a free slot."""
+    pass
+
+
+class SharedFrameRing:
+    """
+    :param frame_shape: (rows, cols) of every frame
+    :param dtype: pixel type, frames of another type are cast when written
+    :param slots: number of frames the ring can hold
+    :param name: name of an existing block to attach to, None to create a new one
+    """
+    def __init__(self, frame_shape, dtype=np.uint16, slots=64, name=None):
+        self.frame_shape = tuple(int(n) for n in frame_shape)
+        self.dtype = np.dtype(dtype)
+        self.slots = int(slots)
+        self.frame_bytes = int(np.prod(self.frame_shape)) * self.dtype.itemsize
+        self.owner = name is None
+        size = HEADER_BYTES + self.slots * self.frame_bytes
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=size if self.owner else 0)
+        self.counters = np.ndarray((2,), dtype=np.int64, buffer=self.shm.buf)
+        self.frames = np.ndarray((self.slots,) + self.frame_shape, dtype=self.dtype, buffer=self.shm.buf, offset=HEADER_BYTES)
+        if self.owner:
+            self.counters[:] = 0
+
+    @classmethod
+    def attach(cls, spec):
+        """Attach to a ring created in another process, spec comes from SharedFrameRing.spec()."""
+        return cls(spec["frame_shape"], spec["dtype"], spec["slots"], name=spec["name"])
+
+    def spec(self):
+        """Picklable description used to attach from another process."""
+        return {"name": self.shm.name, "frame_shape": self.frame_shape, "dtype": self.dtype.str, "slots": self.slots}
+
+    def free_slots(self):
+        return self.slots - int(self.counters[_WRITTEN] - self.counters[_RELEASED])
+
+    def put(self, frame, timeout=None, should_stop=None):
+        """
+        Copy a frame into the next slot and publish it (producer side).
+        :param should_stop: optional callable, checked while waiting for a free slot
+        :return: the sequence number of the frame, or None if should_stop returned True while waiting
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.free_slots() <= 0:
+            if should_stop is not None and should_stop():
+                return None
+            if deadline is not None and time.monotonic() > deadline:
+                raise RingTimeout(f"No free slot in the frame ring after {timeout} s")
+            time.sleep(0.0005)
+        seq = int(self.counters[_WRITTEN])
+        if frame.shape != self.frame_shape:
+            raise ValueError(f"Frame shape {frame.shape} does not match ring shape {self.frame_shape}")
+        np.copyto(self.frames[seq % self.slots], frame, casting="unsafe")
+        self.counters[_WRITTEN] = seq + 1       # publish only after the copy is complete
+        return seq
+
+    def view(self, seq):
+        """Zero copy view of a published frame (consumer side), valid until release(seq)."""
+        return self.frames[seq % self.slots]
+
+    def read(self, seq):
+        """Copy a published frame out of the ring and release its slot."""
+        frame = self.view(seq).copy()
+        self.release(seq)
+        return frame
+
+    def release(self, seq):
+        """Hand the slot (and every slot before it) back to the producer. Frames must be released in order."""
+        self.counters[_RELEASED] = seq + 1
+
+    def drained(self):
+        return self.counters[_WRITTEN] == self.counters[_RELEASED]
+
+    def close(self):
+        # drop the numpy views before closing, otherwise the buffer is still exported
+        self.counters = None
+        self.frames = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,94 @@
+import time
+from collections import deque
+from concurrent.futures import Future
+from backend.cameraLogging import get_logger, APP_LOGGER_NAME
+
+'''
+Thread-safe GUI update bus.
+
+Tk may only be touched from the thread running mainloop. Worker threads post lightweight events into a
+deque (append/popleft are atomic in CPython, so posting never takes a lock or waits on the Tcl
+interpreter) and the Tk loop drains it at a fixed cadence. Keyed events are coalesced so only the latest
+status per key is applied, and all log lines from one drain are handed over in a single call.
+'''
+
+
+class UIEventBus:
+    """
+    :param root: Tk root (anything with .after) used to schedule the drain
+    :param log_handler: called on the Tk thread with a list of log lines
+    :param interval_ms: drain cadence
+    :param max_events: maximum number of events handled per drain, the rest wait for the next tick
+    """
+    def __init__(self, root, log_handler=None, interval_ms=50, max_events=5000):
+        self.root = root
+        self.log_handler = log_handler
+        self.interval_ms = interval_ms
+        self.max_events = max_events
+        self.logger = get_logger(APP_LOGGER_NAME)
+        self._events = deque()
+        self._running = False
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.interval_ms, self._drain)
+
+    def stop(self):
+        self._running = False
+
+    def post(self, key, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) on the Tk thread. If key is not None only the most recent call
+        posted with that key in a drain interval is run (e.g. one status label per camera).
+        """
+        self._events.append((key, func, args, kwargs))
+
+    def call(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on the Tk thread and return a Future for its result."""
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as e:
+                future.set_exception(e)
+        self._events.append((None, run, (), {}))
+        return future
+
+    def post_log(self, message):
+        """Queue a log line, timestamped now rather than when it is drawn."""
+        self._events.append(("__log__", None, (f"{time.strftime('%H:%M:%S')} - {message}",), None))
+
+    def drain(self):
+        """Apply everything queued so far. Called from the Tk thread."""
+        latest = {}
+        ordered = []
+        log_lines = []
+        for _ in range(min(len(self._events), self.max_events)):
+            key, func, args, kwargs = self._events.popleft()
+            if key == "__log__":
+                log_lines.append(args[0])
+            elif key is None:
+                ordered.append((None, (func, args, kwargs)))
+            else:
+                if key not in latest:
+                    ordered.append((key, None))
+                latest[key] = (func, args, kwargs)
+
+        for key, call in ordered:
+            func, args, kwargs = latest[key] if key is not None else call
+            try:
+                func(*args, **kwargs)
+            except Exception:
+                self.logger.exception(f"UI update {getattr(func, '__name__', func)} failed")
+        if log_lines and self.log_handler is not None:
+            self.log_handler(log_lines)
+
+    def _drain(self):
+        if not self._running:
+            return
+        self.drain()
+        self.root.after(self.interval_ms, self._drain)
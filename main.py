@@ -6,152 +6,99 @@ Description: Main executable frontend for handing the iXAndor cameras.
 
 '''
 
+import time
+STARTUP_T0 = time.perf_counter()    # cold start reference, see CameraMonitorApp._log_startup_time
+import os
 import tkinter as tk
-import cv2
 from tkinter import filedialog
 import numpy as np
 from time import sleep
 from tkinter.font import Font
 from tkinter import ttk, messagebox
-from PIL import ImageTk, Image
 import threading
-import time
-from queue import Queue
 from typing import Dict
-from backend.cameraConfig import *
+from backend.cameraState import CameraState
 from backend.cameraDataHandle import *
+from backend.photonCounting import photon_counting_settings
+from backend.cameraProcess import CameraProcess, CONTINUOUS_BUFFER_FRAMES
+from backend.sequenceRunner import SequenceRunner, load_sequence
+from backend.runJournal import find_journals, recover_journals
+from backend.acquisitionPipeline import (build_pipeline, default_pipeline_spec, load_pipeline_profiles,
+                                         Pipeline, PipelineContext, FramePacket, CallbackSink, NetworkSink)
+from backend.frameServer import start_frame_server, get_frame_server, stop_frame_server, DEFAULT_PORT
+from backend.controlServer import ControlServer, RPCError, DEFAULT_PORT as CONTROL_PORT
+from backend.cameraOrchestrator import CameraOrchestrator
+from backend.cameraSupervisor import CameraSupervisor
+from backend.autoExposure import AutoExposure, apply_result, TARGETS as AUTO_EXPOSURE_TARGETS
+from backend.previewScaling import PreviewScaler, MODES as PREVIEW_SCALINGS
+from backend.previewViewport import PreviewViewport, region_stats
+from backend.focusMetrics import FocusMonitor
+from backend.frameMetadata import FrameMetadataRecorder, batch_host_times
+from backend.frameAccounting import FrameCounters, FrameLossError, FRAME_LOSS_POLICIES
+from backend.uiEventBus import UIEventBus
+from backend.cameraLogging import setup_logging, shutdown_logging, get_logger, APP_LOGGER_NAME
+from backend.instrumentation import instrumentation, SamplingProfiler
 import logging as log
 import sys
 from pprint import pprint
 import json
-import pylablib as pll
-pll.par["devices/dlls/andor_sdk2"] = r"./Andor_Driver_Pack_2"
-import pylablib.devices.Andor as Andor
+# cv2, PIL, astropy and pylablib (with the Andor SDK) are only imported when first needed, they dominate start-up
 
 
+ANDOR_DLL_PATH = r"./Andor_Driver_Pack_2"
 save_data_path = ""
 path_to_config_options_json = "./backend/configuration_options.json"
 cam_config_options_json = None
 
 
-class CameraWorker:
-    def __init__(self, camera, command_queue: Queue):
-        self.camera = camera
-        self.command_queue = command_queue
-        self.running = False
-        self.thread = None
-        self.acquisition_count = 0
-        self.total_acquisitions = 1000
-        self.acquisition_interval = 0.04  # 40ms in seconds
-        self.image_buffer = np.zeros((1024, 720, self.total_acquisitions), dtype=np.uint16)
-        
-    def start_worker(self):
-        """Start the worker thread"""
-        self.running = True
-        self.thread = threading.Thread(target=self._worker_loop, daemon=True)
-        self.thread.start()
-        
-    def stop_worker(self):
-        """Stop the worker thread"""
-        self.running = False
-        self.camera.data = self.image_buffer
-        if self.thread and self.thread.is_alive():
-            self.thread.join(timeout=1.0)
-            
-    def _worker_loop(self):
-        """Main worker loop that processes commands for the camera"""
-        while self.running:
-            try:
-                command = self.command_queue.get(timeout=0.1)  # 100ms timeout
-                if command is None:
-                    break
-                    
-                action = command.get('action')
-                if action == 'start_acquisition':
-                    self._handle_acquisition()
-                elif action == 'configure':
-                    settings = command.get('settings', {})
-                    self._handle_configure(settings)
-                    
-                self.command_queue.task_done()
-            except Exception as e:
-                continue
-                
-    def _handle_acquisition(self):
-        """Handle starting acquisition with precise timing"""
-        try:
-            self.acquisition_count = 0
-            print(f"Starting acquisition for camera {self.camera.serialNumber}")
-            
-            while self.running and self.acquisition_count < self.total_acquisitions:
-                start_time = time.time()
-                
-                # Start acquisition
-                self.camera.start_acquisition()
-                # Wait for the frame to be ready
-                time.sleep(self.acquisition_interval)
-                # Stop acquisition
-                self.camera.stop_acquisition()
-                
-            
-                frame = self.camera.read_newest_image()
-                if frame is not None:
-                    self.image_buffer[self.acquisition_count, :,:] = frame
-                    
-                # Update progress
-                self.acquisition_count += 1
-                if self.acquisition_count % 100 == 0:
-                    break
+RESUME_TIMEOUT = 300.0     # seconds a run till abort waits for a lost camera before it is aborted
+FOCUS_PLOT_SPAN = 60.0     # seconds of focus metrics shown in the plots
+FOCUS_COLORS = ("#4fc3f7", "#ffb74d", "#81c784", "#e57373", "#ba68c8", "#fff176")
+
+
+def load_andor_sdk():
+    """Import pylablib's Andor module on first use, pointing it at the bundled SDK DLLs."""
+    import pylablib as pll
+    pll.par["devices/dlls/andor_sdk2"] = ANDOR_DLL_PATH
+    import pylablib.devices.Andor as Andor
+    return Andor
 
-                    
-        except Exception as e:
-            print(f"Error during acquisition for camera {self.camera.serialNumber}: {e}")
-            self.running = False
-        finally:
-            # Save the acquired data
-            if self.acquisition_count > 0:
-                try:
-                    
-                    # save_fits_data(self.image_buffer[self.acquisition_count, :,:])
-                    
-                    print(f"Saved {self.acquisition_count} frames for camera {self.camera.serialNumber}")
-                except Exception as e:
-                    print(f"Error saving data for camera {self.camera.serialNumber}: {e}")
-                     
-    def _handle_configure(self, settings):
-        """Handle camera configuration"""
-        try:
-            self.camera.camera_configuration(settings)
-        except Exception as e:
-            print(f"Error configuring camera {self.camera.serialNumber}: {e}")
 
 # Main application class
 class CameraMonitorApp:
-    def __init__(self, root, debugLogging = False, cam_config_options_json = None):
+    def __init__(self, root, debugLogging = False, cam_config_options_json = None, jsonLogging = False, stream_port = None, control_port = None, control_token = None):
         self.root = root
         self.root.title("Camera Monitoring System")
         self.root.geometry("1200x800")
         self.root.minsize(800, 600)
-        self.logger = self._setup_logging(debugLogging)
+        self.logger = self._setup_logging(debugLogging, jsonLogging)
+        self.profiler = None
+        if debugLogging:
+            # debug runs also collect hot path timings and a sampled profile, dumped to logs/ on exit
+            instrumentation.enable()
+            self.profiler = SamplingProfiler().start()
+        if stream_port is not None:
+            try:
+                start_frame_server(port=stream_port)
+            except OSError as e:
+                self.logger.error(f"Could not start the frame server on port {stream_port}: {e}")
         self.custom_font = Font(family="Helvetica", size=14, weight="bold")
         self.cam_config_options_json = cam_config_options_json
 
-        self.cameras = []
-        self.__identify_cameras__()
         self.cameras_dict = {}
-        self.camera_serials = ["13703", "12606", "12574", "13251"]
+        self.camera_serials = []    # every camera seen this session, in discovery order; rows are added by _add_camera_rows
 
 
         # Creating UI elements
         self.monitoring = True
         self.monitor_thread = None
 
-        self.camera_queues: Dict[str, Queue] = {}
-        self.camera_workers: Dict[str, CameraWorker] = {}
-        self.running_experiment = False
         self.running_acquisition = False
 
         self.has_run_experiment = False
+        self.frame_counters: Dict[str, FrameCounters] = {}
+        self.stop_requested = threading.Event()
+        self.experiment_active = False
 
         self.queryingConnection = False
 
@@ -162,17 +109,38 @@ class CameraMonitorApp:
 
         self.config_dir = os.path.join(os.getcwd(), "configs")
         os.makedirs(self.config_dir, exist_ok=True)
+        self._config_locks = {}     # serial -> lock serialising configure calls from the control API
         self.create_ui()
+        # worker threads never touch Tk directly, they post status/log updates here and the Tk loop applies them
+        self.ui_bus = UIEventBus(self.root, log_handler=self._write_experiment_log, interval_ms=50)
+        self.ui_bus.start()
+        # every blocking camera call (connect, configure, acquire, preview) goes through this, see backend/cameraOrchestrator.py
+        # each acquiring camera holds one worker for the whole run, leave room for eight plus telemetry and configure calls
+        self.orchestrator = CameraOrchestrator(max_workers=16).start()
+        # probes the connected cameras and reopens any that drop off the bus, see backend/cameraSupervisor.py
+        self.supervisor = CameraSupervisor(self.orchestrator, lambda: list(self.cameras_dict.values()),
+                                           on_state=self._on_camera_state, on_reconnected=self._on_camera_reconnected).start()
+        self.control_server = None
+        if control_port is not None:
+            self.setup_control_api(control_port, control_token)
+        # runs that crashed before their FITS file was written left a journal behind, rebuild them in the background
+        threading.Thread(target=self._recover_unfinished_runs, daemon=True).start()
+        # loading the SDK and counting cameras waits until the window is up
+        self.root.after_idle(self._log_startup_time)
+        self.root.after_idle(lambda: self.orchestrator.submit(self.orchestrator.call(None, self.__identify_cameras__)))
         # self.checking_connected_cams_temp()
-        # self.check_camera_conection()
+
+    def _log_startup_time(self):
+        elapsed = time.perf_counter() - STARTUP_T0
+        instrumentation.record("startup", elapsed)
+        self.logger.info(f"Window interactive {elapsed:.3f} s after start")
 
     def __identify_cameras__(self):
         try:
-            num_cameras = Andor.get_cameras_number_SDK2()
+            num_cameras = load_andor_sdk().get_cameras_number_SDK2()
             print(f"Number of cameras detected: {num_cameras}")
             self.logger.info(f"Number of cameras detected: {num_cameras}")
             if(num_cameras == 0):
-                self.cameras = None
                 return None
 
             if num_cameras < 1:
@@ -182,15 +150,6 @@ class CameraMonitorApp:
             print(f"Error identifying cameras: {e}")
         return 0
         
-    def setup_camera_workers(self):
-        """Initialize worker threads for each camera"""
-        self.logger.info("Setting up camera workers")
-        for camera in list(self.cameras_dict.values()):
-            queue = Queue()
-            worker = CameraWorker(camera, queue)
-            self.camera_queues[camera.serialNumber] = queue
-            self.camera_workers[camera.serialNumber] = worker
-
     def create_ui(self):
         """Create the main UI elements"""
         self.logger.info("Creating UI")
@@ -226,12 +185,16 @@ class CameraMonitorApp:
         self.experiment_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.experiment_frame, text="Experiment")
 
+        self.diagnostics_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.diagnostics_frame, text="Diagnostics")
+
         # Setup the tabs
         self.setup_status_display()
         self.setup_notes_display()
         self.setup_preview_options()
         self.setup_config_display()
         self.setup_experiment_tab()
+        self.setup_diagnostics_tab()
 
         # --- Bottom Button Bar ---
         self.button_frame = ttk.Frame(self.main_frame)
@@ -294,8 +257,8 @@ class CameraMonitorApp:
             self.camera_status_labels (dict): A dictionary mapping each camera's serial number to its
                                        corresponding labels for serial and status.
         Note:
-            This method assumes that `self.status_frame` is a valid tkinter frame and that
-            `self.camera_serials` is a list of camera serial numbers.
+            This method assumes that `self.status_frame` is a valid tkinter frame. The per camera rows are
+            added by `_add_camera_rows` as cameras are discovered.
         """
         """Setup the camera status display"""
         # Title label
@@ -303,32 +266,12 @@ class CameraMonitorApp:
         status_title = ttk.Label(self.status_frame, text="Camera Status Monitor", font=("Arial", 14, "bold"))
         status_title.pack(pady=10)
         
-        # Frame for camera status
-        status_display_frame = ttk.Frame(self.status_frame)
-        status_display_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        # Create labels for each camera
+        # Frame for camera status, one row per discovered camera
+        self.status_display_frame = ttk.Frame(self.status_frame)
+        self.status_display_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        self.no_cameras_label = ttk.Label(self.status_display_frame, text="No cameras connected yet, press Connect All.")
+        self.no_cameras_label.pack(pady=5)
         self.camera_status_labels = {}
-        for i, serial in enumerate(self.camera_serials):
-            frame = ttk.Frame(status_display_frame)
-            frame.pack(fill=tk.X, pady=5)
-            
-            label = ttk.Label(frame, text=f"Camera {i+1}:")
-            label.pack(side=tk.LEFT, padx=5)
-            
-            serial_label = tk.Label(frame, text=serial, font=("Courier", 12, "bold"))
-            serial_label.pack(side=tk.LEFT, padx=5)
-            serial_label.config(fg="red")
-            
-                    
-            status_label = ttk.Label(frame, text="Disconnected", font=("Arial", 12))
-
-            status_label.pack(side=tk.LEFT, padx=20)
-            
-            self.camera_status_labels[serial] = {
-                "serial_label": serial_label,
-                "status_label": status_label
-            }
         
         # Additional buttons for camera operations
         ops_frame = ttk.Frame(self.status_frame)
@@ -340,6 +283,40 @@ class CameraMonitorApp:
         disconnect_all_btn = ttk.Button(ops_frame, text="Disconnect All", command=self.disconnect_all_cameras)
         disconnect_all_btn.pack(side=tk.LEFT, padx=5)
 
+    def _add_camera_rows(self, serial):
+        """Create the status and experiment rows for a newly discovered camera (Tk thread only, idempotent)."""
+        if serial in self.camera_status_labels:
+            return
+        self.camera_serials.append(serial)
+        number = len(self.camera_serials)
+        self.no_cameras_label.pack_forget()
+
+        frame = ttk.Frame(self.status_display_frame)
+        frame.pack(fill=tk.X, pady=5)
+        ttk.Label(frame, text=f"Camera {number}:").pack(side=tk.LEFT, padx=5)
+        serial_label = tk.Label(frame, text=serial, font=("Courier", 12, "bold"), fg="red")
+        serial_label.pack(side=tk.LEFT, padx=5)
+        status_label = ttk.Label(frame, text="Disconnected", font=("Arial", 12))
+        status_label.pack(side=tk.LEFT, padx=20)
+        self.camera_status_labels[serial] = {
+            "serial_label": serial_label,
+            "status_label": status_label
+        }
+
+        frame = ttk.Frame(self.experiment_status_frame)
+        frame.pack(fill=tk.X, pady=5)
+        ttk.Label(frame, text=f"Camera {number} ({serial}):").pack(side=tk.LEFT, padx=5)
+        experiment_label = ttk.Label(frame, text="Not Ready", font=("Arial", 12))
+        experiment_label.pack(side=tk.LEFT, padx=20)
+        self.experiment_status_labels[serial] = experiment_label
+
+    def _set_camera_status(self, serial, text, color):
+        """Update a camera's row on the status tab (Tk thread only)."""
+        self._add_camera_rows(serial)
+        labels = self.camera_status_labels[serial]
+        labels["status_label"].config(text=text, foreground=color)
+        labels["serial_label"].config(fg="green" if text == "Connected" else "red")
+
     def setup_config_display(self):
         """Build the Camera Configuration tab with a more organized tabbed layout."""
         self.logger.info("Setting up redesigned camera configuration tab")
@@ -359,6 +336,11 @@ class CameraMonitorApp:
         apply_btn.pack(side="left", padx=(0, 5))
         reset_btn = ttk.Button(top_frame, text="Reset to Defaults", command=self._reset_camera_config)
         reset_btn.pack(side="left")
+        self.auto_exposure_target_var = tk.StringVar(value=AUTO_EXPOSURE_TARGETS[0])
+        ttk.Combobox(top_frame, textvariable=self.auto_exposure_target_var, values=AUTO_EXPOSURE_TARGETS,
+                     state="readonly", width=16).pack(side="right")
+        self.auto_exposure_btn = ttk.Button(top_frame, text="Auto Expose", command=self._auto_expose_selected)
+        self.auto_exposure_btn.pack(side="right", padx=(0, 5))
 
         # --- Two-column main layout (unchanged) ---
         content_frame = ttk.Frame(self.config_frame)
@@ -440,8 +422,9 @@ class CameraMonitorApp:
             ttk.Label(config_notebook, text="No configuration JSON loaded").pack(pady=20)
 
     def check_if_idx_connected_already(self, cam_index : int):
-        for sn, cam in self.cameras_dict.items():
-            if cam.idx == cam_index and cam.is_opened():
+        for sn, cam in list(self.cameras_dict.items()):
+            # a camera handed to a CameraProcess has its handle here closed, but the child has the index open
+            if cam.idx == cam_index and (cam.is_opened() or cam.handed_off):
                 return True
         return False
 
@@ -464,18 +447,8 @@ class CameraMonitorApp:
         status_frame = ttk.LabelFrame(self.experiment_frame, text="Camera Status", padding=10)
         status_frame.pack(fill="x", padx=20, pady=10)
 
+        self.experiment_status_frame = status_frame
         self.experiment_status_labels = {}
-        for i, serial in enumerate(self.camera_serials):
-            frame = ttk.Frame(status_frame)
-            frame.pack(fill=tk.X, pady=5)
-            
-            label = ttk.Label(frame, text=f"Camera {i+1} ({serial}):")
-            label.pack(side=tk.LEFT, padx=5)
-            
-            status_label = ttk.Label(frame, text="Not Ready", font=("Arial", 12))
-            status_label.pack(side=tk.LEFT, padx=20)
-            
-            self.experiment_status_labels[serial] = status_label
 
         # --- Controls ---
         control_frame = ttk.Frame(self.experiment_frame)
@@ -484,9 +457,15 @@ class CameraMonitorApp:
         self.run_experiment_btn = ttk.Button(control_frame, text="Run Experiment", command=self.run_experiment)
         self.run_experiment_btn.pack(side=tk.LEFT, padx=5)
 
+        self.stop_experiment_btn = ttk.Button(control_frame, text="Stop", command=self.stop_experiment, state="disabled")
+        self.stop_experiment_btn.pack(side=tk.LEFT, padx=5)
+
+        self.run_sequence_btn = ttk.Button(control_frame, text="Run Sequence...", command=self.run_sequence)
+        self.run_sequence_btn.pack(side=tk.LEFT, padx=5)
+
         ttk.Label(control_frame, text="Acquisition Mode:").pack(side=tk.LEFT, padx=(10, 5))
         self.acq_mode_var = tk.StringVar(value="Kinetic Series")
-        acq_mode_cb = ttk.Combobox(control_frame, textvariable=self.acq_mode_var, values=["Single Scan", "Kinetic Series"], state="readonly", width=15)
+        acq_mode_cb = ttk.Combobox(control_frame, textvariable=self.acq_mode_var, values=["Single Scan", "Kinetic Series", "Run Till Abort"], state="readonly", width=15)
         acq_mode_cb.pack(side=tk.LEFT)
         acq_mode_cb.bind("<<ComboboxSelected>>", self._on_acq_mode_change)
 
@@ -497,6 +476,52 @@ class CameraMonitorApp:
         self.num_frames_entry = ttk.Entry(control_frame, textvariable=self.num_frames_var, width=10)
         self.num_frames_entry.pack(side=tk.LEFT)
 
+        ttk.Label(control_frame, text="On Frame Loss:").pack(side=tk.LEFT, padx=(10, 5))
+        self.frame_loss_policy_var = tk.StringVar(value=FRAME_LOSS_POLICIES[0])
+        ttk.Combobox(control_frame, textvariable=self.frame_loss_policy_var, values=FRAME_LOSS_POLICIES, state="readonly", width=10).pack(side=tk.LEFT)
+
+        # --- Run till abort: output is rolled to a new segment file every N frames and/or seconds ---
+        segment_frame = ttk.Frame(self.experiment_frame)
+        segment_frame.pack(fill="x", padx=20, pady=(0, 10))
+
+        ttk.Label(segment_frame, text="Segment Frames:").pack(side=tk.LEFT, padx=5)
+        self.segment_frames_var = tk.StringVar(value="1000")
+        ttk.Entry(segment_frame, textvariable=self.segment_frames_var, width=10).pack(side=tk.LEFT)
+
+        ttk.Label(segment_frame, text="Segment Seconds:").pack(side=tk.LEFT, padx=(10, 5))
+        self.segment_seconds_var = tk.StringVar(value="")
+        ttk.Entry(segment_frame, textvariable=self.segment_seconds_var, width=10).pack(side=tk.LEFT)
+        ttk.Label(segment_frame, text="(Run Till Abort only, blank disables)").pack(side=tk.LEFT, padx=10)
+
+        # --- Lucky imaging (streaming shift-and-add) ---
+        lucky_frame = ttk.Frame(self.experiment_frame)
+        lucky_frame.pack(fill="x", padx=20, pady=(0, 10))
+
+        self.lucky_enabled_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(lucky_frame, text="Lucky Imaging (shift-and-add)", variable=self.lucky_enabled_var).pack(side=tk.LEFT, padx=5)
+
+        ttk.Label(lucky_frame, text="Keep Best (%):").pack(side=tk.LEFT, padx=(10, 5))
+        self.lucky_keep_var = tk.StringVar(value="10")
+        ttk.Entry(lucky_frame, textvariable=self.lucky_keep_var, width=6).pack(side=tk.LEFT)
+
+        ttk.Label(lucky_frame, text="Register On:").pack(side=tk.LEFT, padx=(10, 5))
+        self.lucky_locate_var = tk.StringVar(value="peak")
+        ttk.Combobox(lucky_frame, textvariable=self.lucky_locate_var, values=["peak", "centroid"], state="readonly", width=10).pack(side=tk.LEFT)
+
+        ttk.Label(lucky_frame, text="Save Format:").pack(side=tk.LEFT, padx=(20, 5))
+        self.save_format_var = tk.StringVar(value="FITS")
+        ttk.Combobox(lucky_frame, textvariable=self.save_format_var, values=["FITS"] + list(FRAME_WRITERS), state="readonly", width=8).pack(side=tk.LEFT)
+
+        # "Default" builds the pipeline from the settings above, the rest come from backend/pipeline_profiles.json
+        ttk.Label(lucky_frame, text="Pipeline:").pack(side=tk.LEFT, padx=(20, 5))
+        self.pipeline_profiles = load_pipeline_profiles()
+        self.pipeline_profile_var = tk.StringVar(value="Default")
+        ttk.Combobox(lucky_frame, textvariable=self.pipeline_profile_var, values=["Default"] + list(self.pipeline_profiles),
+                     state="readonly", width=16).pack(side=tk.LEFT)
+
+        self.camera_processes_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(lucky_frame, text="Camera per Process", variable=self.camera_processes_var).pack(side=tk.LEFT, padx=(20, 5))
+
         # --- Log Area ---
         log_frame = ttk.LabelFrame(self.experiment_frame, text="Experiment Log", padding=10)
         log_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -504,39 +529,146 @@ class CameraMonitorApp:
         self.experiment_log = tk.Text(log_frame, height=10, wrap=tk.WORD, state="disabled")
         self.experiment_log.pack(fill="both", expand=True)
 
+    def setup_diagnostics_tab(self):
+        """Timing table for the instrumented hot paths (configuration, frame reads, preview, saving)."""
+        control_frame = ttk.Frame(self.diagnostics_frame, padding=10)
+        control_frame.pack(fill="x")
+
+        self.instrumentation_var = tk.BooleanVar(value=instrumentation.enabled)
+        ttk.Checkbutton(control_frame, text="Collect Timings", variable=self.instrumentation_var,
+                        command=lambda: instrumentation.enable(self.instrumentation_var.get())).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Refresh", command=self._refresh_diagnostics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Reset", command=self._reset_diagnostics).pack(side=tk.LEFT, padx=5)
+        ttk.Button(control_frame, text="Dump JSON", command=self._dump_diagnostics).pack(side=tk.LEFT, padx=5)
+
+        self.diagnostics_text = tk.Text(self.diagnostics_frame, wrap=tk.NONE, font=("Courier", 10), state="disabled")
+        self.diagnostics_text.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
+    def _refresh_diagnostics(self):
+        self.diagnostics_text.config(state="normal")
+        self.diagnostics_text.delete("1.0", tk.END)
+        self.diagnostics_text.insert(tk.END, instrumentation.format_table())
+        self.diagnostics_text.config(state="disabled")
+
+    def _reset_diagnostics(self):
+        instrumentation.reset()
+        self._refresh_diagnostics()
+
+    def _dump_diagnostics(self):
+        """Write the timing snapshot (and the sampled profile if running) to logs/."""
+        log_dir = os.path.join(os.path.dirname(os.path.realpath(__file__)), "logs")
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        try:
+            if instrumentation.enabled or instrumentation.histograms:
+                path = instrumentation.dump_json(os.path.join(log_dir, f"timings_{stamp}.json"))
+                self.logger.info(f"Timings written to {path}")
+            if self.profiler is not None:
+                self.profiler.stop()
+                path = self.profiler.dump(os.path.join(log_dir, f"profile_{stamp}.txt"))
+                self.logger.info(f"Sampled profile written to {path}")
+                self.profiler = None
+        except Exception as e:
+            self.logger.error(f"Failed to write diagnostics: {e}")
+
     def _on_acq_mode_change(self, event=None):
         """Handles changes in the acquisition mode dropdown."""
         mode = self.acq_mode_var.get()
         if mode == "Single Scan":
             self.num_frames_entry.config(state="disabled")
             self.num_frames_var.set("1")
+        elif mode == "Run Till Abort":
+            self.num_frames_entry.config(state="disabled")
         else: # Kinetic Series
             self.num_frames_entry.config(state="normal")
 
-    def run_experiment(self):
-        """Runs the parallel camera acquisition experiment."""
+    def run_experiment(self, serials=None):
+        """
+        Runs the parallel camera acquisition experiment.
+        :param serials: cameras to run, all connected cameras if None
+        :return: True if the acquisition threads were started
+        """
         self.run_experiment_btn.config(state="disabled")
         self._log_experiment("Starting experiment...")
 
-        if not self._pre_experiment_check():
+        if not self._pre_experiment_check(serials):
             self._log_experiment("Pre-experiment check failed. Aborting.")
             self.run_experiment_btn.config(state="normal")
-            return
-
-        self._log_experiment("All cameras are ready. Starting acquisition threads...")
-
-        threads = []
-        for serial, camera in self.cameras_dict.items():
-            thread = threading.Thread(target=self._acquisition_thread_worker, args=(camera,), daemon=True)
-            threads.append(thread)
-            thread.start()
-
-        # We can optionally add a thread to monitor the completion of all acquisition threads
-        monitor_thread = threading.Thread(target=self._monitor_experiment_completion, args=(threads,), daemon=True)
-        monitor_thread.start()
+            return False
+        try:
+            mode, num_frames = self._read_acquisition_mode()
+        except ValueError as e:
+            self._log_experiment(f"Invalid number of frames: {self.num_frames_var.get()}. Aborting. Error: {e}")
+            self.run_experiment_btn.config(state="normal")
+            return False
+
+        self._read_experiment_settings()
+        header_text = self.notes_text.get("1.0", tk.END)
+        self._log_experiment("All cameras are ready. Starting acquisition...")
+        self.experiment_active = True
+
+        cameras = [cam for serial, cam in self.cameras_dict.items() if serials is None or serial in serials]
+        calls = {cam.serialNumber: self.orchestrator.acquire(cam, self._acquisition_thread_worker, cam, mode, num_frames, header_text,
+                                                             stop=self.stop_requested.set)
+                 for cam in cameras}
+        self.orchestrator.submit(self._run_camera_calls(calls))
+        return True
+
+    def _read_acquisition_mode(self):
+        """:return: (mode, num_frames) from the Experiment tab, mode is "single", "kinetic" or "continuous" (Tk thread only)"""
+        acq_mode = self.acq_mode_var.get()
+        if acq_mode == "Kinetic Series":
+            num_frames = int(self.num_frames_var.get())
+            if num_frames <= 0:
+                raise ValueError("Number of frames must be positive.")
+            return "kinetic", num_frames
+        if acq_mode == "Single Scan":
+            return "single", 1
+        if acq_mode == "Run Till Abort":
+            return "continuous", None
+        raise ValueError(f"Unknown acquisition mode: {acq_mode}")
+
+    async def _run_camera_calls(self, calls):
+        """Await one orchestrator call per camera (on the orchestrator loop), then end the experiment."""
+        try:
+            results = await self.orchestrator.gather(calls)
+            for serial, result in results.items():
+                if isinstance(result, BaseException):
+                    self._set_experiment_status(serial, "Error", "red")
+                    self._log_experiment(f"[{serial}] Error: {result}")
+        finally:
+            self._experiment_finished()
 
-    def _pre_experiment_check(self):
-        """Checks if all cameras are connected and configured."""
+    def _read_experiment_settings(self):
+        """Copy the Experiment tab settings into attributes the acquisition threads can read without touching Tk."""
+        try:
+            keep_pct = float(self.lucky_keep_var.get())
+        except ValueError:
+            keep_pct = 10.0
+        self.lucky_settings = {
+            "enabled": self.lucky_enabled_var.get(),
+            "keep_fraction": keep_pct / 100.0,
+            "locate": self.lucky_locate_var.get(),
+        }
+
+        self.save_format = self.save_format_var.get()
+        self.frame_loss_policy = self.frame_loss_policy_var.get()
+        self.pipeline_profile = self.pipeline_profile_var.get()
+        try:
+            self.segment_settings = {
+                "framesPerSegment": int(self.segment_frames_var.get()) if self.segment_frames_var.get().strip() else None,
+                "secondsPerSegment": float(self.segment_seconds_var.get()) if self.segment_seconds_var.get().strip() else None,
+            }
+        except ValueError:
+            self._log_experiment("Invalid segment length, using 1000 frames per segment.")
+            self.segment_settings = {"framesPerSegment": 1000, "secondsPerSegment": None}
+        if not any(self.segment_settings.values()):
+            self.segment_settings["framesPerSegment"] = 1000
+        self.stop_requested.clear()
+        self.stop_experiment_btn.config(state="normal")
+        self.use_camera_processes = self.camera_processes_var.get()
+
+    def _pre_experiment_check(self, serials=None):
+        """Checks if all cameras (or only the given serials) are connected and configured."""
         self._log_experiment("Performing pre-experiment check...")
         all_ready = True
         
@@ -544,7 +676,12 @@ class CameraMonitorApp:
         #     self._log_experiment(f"Error: Expected 4 connected cameras, but found {len(self.cameras_dict)}.")
         #     all_ready = False
 
-        for serial, label in self.experiment_status_labels.items():
+        if not self.cameras_dict:
+            self._log_experiment("Error: no cameras are connected.")
+            return False
+        for serial in (serials if serials is not None else list(self.cameras_dict)):
+            self._add_camera_rows(serial)
+            label = self.experiment_status_labels[serial]
             if serial in self.cameras_dict:
                 camera = self.cameras_dict[serial]
                 if camera.connection_status == CameraState.CONNECTED and camera.is_configured == CameraState.CONFIGURED:
@@ -559,86 +696,309 @@ class CameraMonitorApp:
         
         return all_ready
 
-    def _acquisition_thread_worker(self, camera):
-        """The function that each camera thread will execute."""
+    def _acquisition_thread_worker(self, camera, mode, num_frames, header_text):
+        """One camera's part of an experiment, run on an orchestrator thread holding the camera."""
         serial = camera.serialNumber
-        try:
-            self._log_experiment(f"[{serial}] Starting acquisition.")
-            self.experiment_status_labels[serial].config(text="Acquiring", foreground="orange")
-
-            acq_mode = self.acq_mode_var.get()
-
-            if acq_mode == "Kinetic Series":
-                try:
-                    num_frames = int(self.num_frames_var.get())
-                    if num_frames <= 0:
-                        raise ValueError("Number of frames must be positive.")
-                except ValueError as e:
-                    self._log_experiment(f"[{serial}] Invalid number of frames: {self.num_frames_var.get()}. Aborting. Error: {e}")
-                    self.experiment_status_labels[serial].config(text="Error", foreground="red")
+        save_path = os.path.join(os.getcwd(), "Data")
+        os.makedirs(save_path, exist_ok=True)
+        resumed = 0
+        while True:
+            try:
+                self._log_experiment(f"[{serial}] Starting acquisition.")
+                self._set_experiment_status(serial, "Acquiring", "orange")
+                finish = self._acquire(camera, mode, num_frames, save_path, header_text,
+                                       tag=f"resumed{resumed}" if resumed else None)
+                self._log_experiment(f"[{serial}] Flushing pipeline and saving data.")
+                finish()
+                self._log_experiment(f"[{serial}] Data saved successfully.")
+                return
+            except FrameLossError as e:
+                # the "Fail" frame loss policy stopped the run, the camera itself is fine
+                self._set_experiment_status(serial, "Failed (frame loss)", "red")
+                self._log_experiment(f"[{serial}] Acquisition stopped on frame loss: {e}. The frames read so far were saved.")
+                return
+            except Exception as e:
+                if self.supervisor.probe(camera):
+                    self._set_experiment_status(serial, "Error", "red")
+                    self._log_experiment(f"[{serial}] Error: {e}")
                     return
+                # the camera is gone, _acquire has already closed the pipeline so the frames read so far are saved
+                self._log_experiment(f"[{serial}] Camera lost during the acquisition ({e}), the frames read so far were saved.")
+                self.supervisor.mark_lost(camera, str(e))
+            if mode != "continuous" or self.stop_requested.is_set():
+                self._set_experiment_status(serial, "Aborted (camera lost)", "red")
+                return
+            # a run till abort carries on in new files once the camera is back
+            self._set_experiment_status(serial, "Waiting for camera", "orange")
+            camera = self.supervisor.wait_reconnected(serial, timeout=RESUME_TIMEOUT, stop_event=self.stop_requested)
+            if camera is None:
+                self._set_experiment_status(serial, "Aborted (camera lost)", "red")
+                self._log_experiment(f"[{serial}] Camera did not come back, acquisition aborted.")
+                return
+            resumed += 1
+            self._log_experiment(f"[{serial}] Camera reconnected, resuming the acquisition.")
 
-                camera.setup_acquisition(mode="kinetic", nframes=num_frames)
-                camera.start_acquisition()
-                
-                # Wait for acquisition to finish by polling
-                for i in range(num_frames):
-                    camera.wait_for_frame()
-                
-                self._log_experiment(f"[{serial}] Acquisition finished. Reading {num_frames} frames...")
-
-                # Read all frames from buffer
-                frames = []
-                for i in range(num_frames):
-                    frame = camera.read_newest_image(return_info=False)
-                    if frame is not None:
-                        frames.append(frame)
-                
-                if not frames:
+    def _acquire(self, camera, mode, num_frames, save_path, header_text, tag=None, extra_cards=None):
+        """
+        Run one acquisition through a pipeline. Returns once the camera has stopped, handing back a finish()
+        function that flushes the pipeline and saves (blocking), so a caller may save in the background while
+        the camera is already being set up for the next acquisition.
+        :param mode: "single", "kinetic" or "continuous" (num_frames None, runs until Stop)
+        :param tag: appended to the serial in the output file names
+        :param extra_cards: {keyword: (value, comment)} added to the saved headers
+        """
+        serial = camera.serialNumber
+        pipeline = None
+        camera_process = None
+        continuous = mode == "continuous"
+        try:
+            cfg = camera.cam_config or {}
+            # a run till abort keeps its frame tables per segment, so nothing grows with the length of the run
+            metadata = None if continuous else FrameMetadataRecorder(capacity=num_frames)
+            counters = FrameCounters(serial=serial, expected_interval=float(cfg.get("KineticCycleTime", 0)) if mode != "single" else None,
+                                     policy=self.frame_loss_policy)
+            self.frame_counters[serial] = counters
+
+            extra_sinks = [NetworkSink(serial)] if get_frame_server() is not None else None
+            pipeline = build_pipeline(self._pipeline_spec(camera, num_frames), serial=serial, extra_sinks=extra_sinks)
+            pipeline.start(PipelineContext(serial=f"{serial}_{tag}" if tag else serial, save_path=save_path, header_text=header_text,
+                                           config=cfg, metadata=metadata, counters=counters, extra_cards=extra_cards,
+                                           log=lambda m: self._log_experiment(f"[{serial}] {m}")))
+            self._log_experiment(f"[{serial}] Pipeline: {' -> '.join(s.name for s in pipeline.stages) or 'raw'} "
+                                 f"-> {', '.join(s.name for s in pipeline.sinks)}")
+
+            if mode != "single":
+                frame_timeout = max(5.0, 2 * (float(cfg.get("KineticCycleTime", 0)) + float(cfg.get("exposureTime", 0))))
+                if self.use_camera_processes:
+                    # the camera is read in its own process, frames arrive through a shared memory ring
+                    camera_process = CameraProcess(camera, cfg, num_frames, dll_path=ANDOR_DLL_PATH).start()
+                    source = camera_process.batches(timeout=frame_timeout, counters=counters)
+                else:
+                    if continuous:
+                        camera.setup_acquisition(mode="cont", nframes=CONTINUOUS_BUFFER_FRAMES)
+                    else:
+                        camera.setup_acquisition(mode="kinetic", nframes=num_frames)
+                    camera.start_acquisition()
+                    source = self._read_camera_batches(camera, counters, frame_timeout)
+
+                # Read frames as they arrive, keeping the SDK frame index and a temperature sample for each
+                n_read = 0
+                last_index = -1
+                next_status_update = time.monotonic() + 1.0
+                for batch, temperature in source:
+                    for frame, sdk_index, host_time in batch:
+                        missed, duplicate, late = counters.update(sdk_index, host_time)
+                        if duplicate:
+                            continue
+                        last_index = sdk_index
+                        if metadata is not None:
+                            metadata.record(sdk_index=sdk_index, temperature=temperature, host_time=host_time, missed=missed, late=late)
+                        n_read += 1
+                        pipeline.submit(FramePacket(frame, index=sdk_index, host_time=host_time, temperature=temperature,
+                                                    missed=missed, late=late))
+                    if time.monotonic() >= next_status_update:
+                        self._set_experiment_status(serial, f"Acquiring ({counters.summary()})", "orange")
+                        next_status_update = time.monotonic() + 1.0
+                    if self.stop_requested.is_set():
+                        self._log_experiment(f"[{serial}] Stop requested after {n_read} frames.")
+                        break
+                    if not continuous and last_index >= num_frames - 1:
+                        break
+                if camera_process is None:
+                    camera.stop_acquisition()
+
+                if n_read == 0:
                     raise RuntimeError("Acquired no frames from the camera.")
+                self._log_experiment(f"[{serial}] Acquisition finished ({counters.summary()}).")
+                if metadata is not None:
+                    stats = metadata.summary()
+                    self._log_experiment(f"[{serial}] Max frame interval {stats['max_interval'] * 1000:.1f} ms.")
 
-                data = np.stack(frames)
-
-            elif acq_mode == "Single Scan":
+            else:
                 camera.setup_acquisition(mode="single", nframes=1)
                 self._log_experiment(f"[{serial}] Snapping single image...")
                 data = camera.snap(timeout=5) # 10 second timeout for a single snap
+                temperature = camera.get_temperature()
+                counters.update(0)
+                metadata.record(sdk_index=0, temperature=temperature)
+                pipeline.submit(FramePacket(np.squeeze(data), index=0, temperature=temperature))
                 self._log_experiment(f"[{serial}] Single image snapped.")
 
-            else:
-                raise ValueError(f"Unknown acquisition mode: {acq_mode}")
+        except Exception:
+            if pipeline is not None:
+                try:
+                    pipeline.close(timeout=5.0)     # keep whatever the sinks have before the error
+                except Exception as e:
+                    self._log_experiment(f"[{serial}] Pipeline did not close cleanly: {e}")
+            raise
+        finally:
+            try:
+                if camera_process is not None:
+                    camera_process.stop()
+                elif camera.acquisition_in_progress():
+                    camera.stop_acquisition()
+            except Exception as e:
+                self._log_experiment(f"[{serial}] Could not stop acquisition: {e}")
+
+        def finish():
+            summaries = pipeline.close()
+            for summary in summaries:
+                self._log_experiment(f"[{serial}] {summary}")
+            self._set_experiment_status(serial, f"Finished ({counters.summary()})",
+                                        "orange" if counters.has_losses() else "blue")
+            return summaries
+        return finish
+
+    def _read_camera_batches(self, camera, counters, frame_timeout):
+        """
+        In-process frame source: yields ([(frame, sdk_index, host_time), ...], temperature) per read.
+        Host times are spread over the batch with the camera's frame period (see batch_host_times).
+        """
+        serial = camera.serialNumber
+        try:
+            frame_period = camera.get_frame_timings().frame_period
+        except Exception:
+            frame_period = 0.0
+        last_time = None
+        while True:
+            with instrumentation.span("wait_for_frame", serial):
+                camera.wait_for_frame(timeout=frame_timeout)
+            with instrumentation.span("read_batch", serial):
+                batch, infos = camera.read_multiple_images(return_info=True)
+            read_time = time.monotonic()
+            counters.check_buffer(camera)
+            if not batch:
+                continue
+            instrumentation.count("frames_read", serial, len(batch))
+            temperature = camera.get_temperature()
+            indices = [info.frame_index for info in infos]
+            host_times = batch_host_times(read_time, indices, frame_period, not_before=last_time)
+            last_time = host_times[-1]
+            yield [(frame, index, float(t)) for frame, index, t in zip(batch, indices, host_times)], temperature
+
+    def _pipeline_spec(self, camera, num_frames):
+        """
+        The named pipeline profile chosen on the Experiment tab, or the one built from the tab's settings.
+        num_frames is None for a run till abort, in which case whole-run file sinks are swapped for segmented ones.
+        """
+        segments = self.segment_settings if num_frames is None else None
+        profile = self.pipeline_profile
+        if profile in self.pipeline_profiles:
+            spec = dict(self.pipeline_profiles[profile])
+            sinks = []
+            for s in spec.get("sinks", []):
+                if segments and s["type"] in ("fits", "writer"):
+                    s = dict(segments, type="segments", format=s.get("format", "FITS"))
+                elif s["type"] == "lucky" and s.get("expectedFrames") is None:
+                    # the run length sizes keepFraction, as in default_pipeline_spec
+                    s = dict(s, expectedFrames=num_frames)
+                sinks.append(s)
+            spec["sinks"] = sinks
+            return spec
+        return default_pipeline_spec(save_format=self.save_format,
+                                     photon_counting=photon_counting_settings(camera.cam_config) is not None,
+                                     lucky_settings=self.lucky_settings, expected_frames=num_frames, segments=segments)
+
+    def run_sequence(self):
+        """Pick a sequence file and run it on every connected camera in parallel."""
+        path = filedialog.askopenfilename(title="Select Sequence File", initialdir=os.path.join(os.getcwd(), "sequences"),
+                                          filetypes=[("Sequence files", "*.json")])
+        if not path:
+            return
+        try:
+            name, steps = load_sequence(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"Could not load sequence {path}: {e}")
+            self.logger.error(f"Could not load sequence {path}: {e}")
+            return
+        if not self._pre_experiment_check():
+            self._log_experiment("Pre-experiment check failed. Aborting.")
+            return
+        self._read_experiment_settings()
+        self.run_experiment_btn.config(state="disabled")
+        self.run_sequence_btn.config(state="disabled")
+        self._log_experiment(f"Running sequence '{name}' ({len(steps)} steps) on {len(self.cameras_dict)} camera(s)...")
+        self.experiment_active = True
 
-            
-            self._log_experiment(f"[{serial}] Saving data to FITS file.")
-            
-            header_text = self.notes_text.get("1.0", tk.END)
-            save_path = os.path.join(os.getcwd(), "Data")
-            os.makedirs(save_path, exist_ok=True)
-            
-            save_fits_data(data, savepath=save_path, header_text=header_text, serial=serial)
-            
-            self.experiment_status_labels[serial].config(text="Finished", foreground="blue")
-            self._log_experiment(f"[{serial}] Data saved successfully.")
+        header_text = self.notes_text.get("1.0", tk.END)
+        calls = {serial: self.orchestrator.acquire(camera, self._sequence_thread_worker, camera, name, steps, header_text,
+                                                   stop=self.stop_requested.set)
+                 for serial, camera in self.cameras_dict.items()}
+        self.orchestrator.submit(self._run_camera_calls(calls))
+
+    def _sequence_thread_worker(self, camera, name, steps, header_text):
+        serial = camera.serialNumber
+        save_path = os.path.join(os.getcwd(), "Data")
+        os.makedirs(save_path, exist_ok=True)
+
+        def acquire(num_frames, tag, extra_cards):
+            self._set_experiment_status(serial, f"Acquiring {tag}", "orange")
+            return self._acquire(camera, "kinetic", num_frames, save_path, header_text, tag=tag, extra_cards=extra_cards)
 
+        runner = SequenceRunner(camera, steps, acquire, name=name, stop_event=self.stop_requested,
+                                log=lambda m: self._log_experiment(f"[{serial}] {m}"))
+        try:
+            runner.run()
+            self._set_experiment_status(serial, "Sequence finished", "blue")
         except Exception as e:
-            self.experiment_status_labels[serial].config(text="Error", foreground="red")
-            self._log_experiment(f"[{serial}] Error: {e}")
-        
-    def _monitor_experiment_completion(self, threads):
-        """Waits for all acquisition threads to complete."""
-        for thread in threads:
-            thread.join()
-        
+            self._set_experiment_status(serial, "Error", "red")
+            self._log_experiment(f"[{serial}] Sequence error: {e}")
+        finally:
+            if runner.stats:
+                self._log_experiment(f"[{serial}] Step timings written to {runner.write_report(save_path)}")
+
+    def _recover_unfinished_runs(self):
+        save_path = os.path.join(os.getcwd(), "Data")
+        if not find_journals(save_path):
+            return
+        self.logger.warning("Found unfinished runs in the journal, recovering them...")
+        for report in recover_journals(save_path):
+            if report["file"]:
+                ranges = ", ".join(f"{a}-{b}" for a, b in report["frame_ranges"])
+                message = f"Recovered {report['n_frames']} frames (SDK frames {ranges}) to {report['file']}"
+            else:
+                message = f"Nothing recoverable in {report['journal']}"
+            if report["problems"]:
+                message += f" ({len(report['problems'])} damaged chunk(s) left in the journal: {'; '.join(report['problems'])})"
+            self.logger.warning(message)
+            self._log_experiment(message)
+
+    def stop_experiment(self):
+        """Ask every acquisition thread to stop reading, the pipelines then flush and close their files."""
+        self._log_experiment("Stop requested, flushing data...")
+        self.stop_requested.set()
+        self.stop_experiment_btn.config(state="disabled")
+
+    def _experiment_finished(self):
+        """Called once every camera of an experiment or sequence is done. Safe to call from any thread."""
         self._log_experiment("All cameras have finished their tasks. Experiment complete.")
-        self.run_experiment_btn.config(state="normal")
+        self.experiment_active = False
+        self.ui_bus.post("run_experiment_btn", self.run_experiment_btn.config, state="normal")
+        self.ui_bus.post("run_sequence_btn", self.run_sequence_btn.config, state="normal")
+        self.ui_bus.post("stop_experiment_btn", self.stop_experiment_btn.config, state="disabled")
 
     def _log_experiment(self, message):
-        """Logs a message to the experiment log text widget."""
+        """Queues a message for the experiment log. Safe to call from any thread."""
+        self.ui_bus.post_log(message)
+
+    def _write_experiment_log(self, lines):
+        """Writes a batch of queued log lines to the experiment log text widget (Tk thread only)."""
         self.experiment_log.config(state="normal")
-        self.experiment_log.insert(tk.END, f"{time.strftime('%H:%M:%S')} - {message}\n")
+        self.experiment_log.insert(tk.END, "\n".join(lines) + "\n")
         self.experiment_log.see(tk.END)
         self.experiment_log.config(state="disabled")
 
+    def _set_experiment_status(self, serial, text, color):
+        """Queues an experiment status label update for a camera. Safe to call from any thread."""
+        self.ui_bus.post(("experiment_status", serial), self._apply_experiment_status, serial, text, color)
+        server = get_frame_server()
+        if server is not None:
+            server.publish_status(serial, text, color=color)
+
+    def _apply_experiment_status(self, serial, text, color):
+        self._add_camera_rows(serial)
+        self.experiment_status_labels[serial].config(text=text, foreground=color)
+
     def _update_current_camera_display(self, event=None):
         """When a camera is selected, load its JSON file (or create one if missing) and display."""
         serial = self.selected_camera_var.get()
@@ -656,26 +1016,34 @@ class CameraMonitorApp:
         else:
             # Create a new config from template defaults
             cam_cfg = self._get_default_config_from_template(self.cam_config_options_json)
-            with open(cfg_path, "w") as f:
-                json.dump(cam_cfg, f, indent=2)
+            self._write_config_file(cfg_path, cam_cfg)
             self.logger.info(f"Created new config file for camera {serial}")
 
         # Populate UI fields
         self._populate_config_fields_from_dict(cam_cfg)
 
-        #update the selected camera with the config settings
-        self.cameras_dict[serial].camera_configuration(configDict = cam_cfg)
-        if(self.cameras_dict[serial].is_configured != CameraState.CONFIGURED):
-            self._display_camera_config_text(f"ERROR: Camera {serial} was not configured upon selection. Please continue with camera configuration.")
-        else:
+        #update the selected camera with the config settings, unless it is in use
+        camera = self.cameras_dict.get(serial)
+        if camera is None:
             self._display_camera_config_text(json.dumps(cam_cfg, indent=2))
+            return
+        if self.orchestrator.is_busy(camera):
+            self._display_camera_config_text(f"Camera {serial} is acquiring, previewing or being configured, its saved config "
+                                             f"was loaded but not applied.\n\n" + json.dumps(cam_cfg, indent=2))
+            return
+        self._display_camera_config_text(f"Configuring camera {serial}...")
+        self._configure_in_background(camera, cam_cfg)
 
     def _apply_camera_config(self):
         """Apply current UI settings and save to camera-specific JSON file."""
         serial = self.selected_camera_var.get()
-        if not serial:
+        camera = self.cameras_dict.get(serial)
+        if camera is None:
             messagebox.showwarning("No Camera", "Please select a camera first.")
             return
+        if self.orchestrator.is_busy(camera):
+            messagebox.showwarning("Camera Busy", f"Camera {serial} is acquiring, previewing or being configured.")
+            return
 
         cfg_path = os.path.join(self.config_dir, f"{serial}_config.json")
 
@@ -684,14 +1052,93 @@ class CameraMonitorApp:
         # Convert from dot notation back to nested JSON
         new_cfg = self._unflatten_config(all_values)
 
-        # Save to file
-        with open(cfg_path, "w") as f:
-            json.dump(new_cfg, f, indent=2)
+        # saved once the camera has taken it
+        self._display_camera_config_text(f"Configuring camera {serial}...")
+        self._configure_in_background(camera, new_cfg, cfg_path)
 
-        self.logger.info(f"Saved updated config for camera {serial}")
-        self._display_camera_config_text(json.dumps(new_cfg, indent=2))
+    def _configure_camera(self, camera, config, cfg_path=None):
+        """
+        Apply a config dict (blocking, on an orchestrator thread holding the camera) and save it to cfg_path if the
+        camera took it. The file is written while the camera is still held, so it is always the config applied last.
+        :return: True if the camera is configured
+        """
+        configured = bool(camera.camera_configuration(configDict=config))
+        if configured and cfg_path is not None:
+            self._write_config_file(cfg_path, config)
+        return configured
+
+    def _configure_in_background(self, camera, config, cfg_path=None):
+        """Configure a camera from the Config tab without blocking the Tk thread, the outcome is shown when done."""
+        serial = camera.serialNumber
+        future = self.orchestrator.submit(self.orchestrator.call(camera, self._configure_camera, camera, config, cfg_path,
+                                                                 timeout=120.0))
+        future.add_done_callback(lambda f: self.ui_bus.post(None, self._configure_done, serial, config, cfg_path, f))
+
+    def _configure_done(self, serial, config, cfg_path, future):
+        try:
+            configured = future.result()
+        except Exception as e:
+            self.logger.error(f"Configuring camera {serial} failed: {e}")
+            configured = False
+        if not configured:
+            self._display_camera_config_text(f"ERROR: Camera {serial} was not configured. Please continue with camera configuration."
+                                             + (f" {cfg_path} was left as it was." if cfg_path else ""))
+            return
+        if cfg_path is not None:
+            self.logger.info(f"Saved updated config for camera {serial}")
+        self._display_camera_config_text(json.dumps(config, indent=2))
+
+    def _auto_expose_selected(self):
+        """Tune the selected camera's exposure and EM gain in the background, the saved config is updated."""
+        serial = self.selected_camera_var.get()
+        camera = self.cameras_dict.get(serial)
+        if camera is None:
+            messagebox.showwarning("No Camera", "Please select a camera first.")
+            return
+        if self.orchestrator.is_busy(camera):
+            messagebox.showwarning("Camera Busy", f"Camera {serial} is acquiring or previewing.")
+            return
+        target = self.auto_exposure_target_var.get()
+        self.auto_exposure_btn.config(state="disabled")
+        self._display_camera_config_text(f"Auto exposure ({target}) running on camera {serial}...")
+        future = self.orchestrator.submit(self.orchestrator.call(camera, self._auto_expose, camera, target))
+        future.add_done_callback(lambda f: self.ui_bus.post(None, self._auto_expose_done, serial, f))
+
+    def _auto_expose_done(self, serial, future):
+        self.auto_exposure_btn.config(state="normal")
+        try:
+            result, config = future.result()
+        except Exception as e:
+            self.logger.error(f"Auto exposure failed on camera {serial}: {e}")
+            self._display_camera_config_text(f"ERROR: Auto exposure failed on camera {serial}: {e}")
+            return
+        if self.selected_camera_var.get() == serial:
+            self._populate_config_fields_from_dict(config)
+        summary = (f"Auto exposure {'converged' if result['converged'] else 'did NOT converge'} after {result['iterations']} "
+                   f"burst(s): exposure {result['exposureTime']} s, EM gain {result['gainLevel']}")
+        self._display_camera_config_text(summary + "\n\n" + json.dumps(config, indent=2))
 
-        self.cameras_dict[serial].camera_configuration(configDict = new_cfg)
+    def _auto_expose(self, camera, target, **options):
+        """
+        Run AutoExposure on a camera (blocking, on an orchestrator thread holding the camera), write the result
+        into configs/<serial>_config.json and apply that config.
+        :return: (result, config)
+        """
+        serial = camera.serialNumber
+        cfg_path = os.path.join(self.config_dir, f"{serial}_config.json")
+        if os.path.exists(cfg_path):
+            with open(cfg_path, "r") as f:
+                config = json.load(f)
+        else:
+            config = camera.cam_config or self._get_default_config_from_template(self.cam_config_options_json)
+        result = AutoExposure(camera, target, **options).run()
+        config = apply_result(config, result)
+        self._write_config_file(cfg_path, config)
+        # the bursts changed the acquisition mode, applying the whole config restores it
+        camera.camera_configuration(configDict=config)
+        self.logger.info(f"Auto exposure for camera {serial} saved to {cfg_path}: exposure {result['exposureTime']} s, "
+                         f"EM gain {result['gainLevel']} ({'converged' if result['converged'] else 'not converged'})")
+        return result, config
 
     def _unflatten_config(self, flat_dict):
         """Convert {'a.b.c': 1} back into nested dict structure."""
@@ -777,62 +1224,70 @@ class CameraMonitorApp:
         self.root.after(2000, self.schedule_ui_refresh)  # every 2 seconds
 
     def connect_all_cameras(self):
-        """Connect to all cameras and update their status, serial number, camIndex, and info."""
+        """
+        Connect to all cameras in parallel and update their status, serial number, camIndex, and info.
+        :return: Future of the connected serials, the labels are updated as each camera comes up
+        """
         self.logger.info("Connecting to all cameras...")
+        return self.orchestrator.submit(self._connect_all_cameras())
+
+    async def _connect_all_cameras(self, timeout=60.0):
         try:
-            num_cameras = self.__identify_cameras__() #This identifies the number of cameras connected.
-            if num_cameras:
-                for i in range(num_cameras):
-                    if not self.check_if_idx_connected_already(i):
-                        cam = Camera(idx=i, temperature=-25, fan_mode='full', amp_mode=None)
-                        if cam.connection_status == CameraState.CONNECTED:
-                            try:
-                                info = cam.get_device_info()
-                                cam.serialNumber = str(info[2])
-                                cam.head_model = info[1]
-                                cam.controller_mode = info[0]
-                                self.cameras.append(cam)
-                                self.cameras_dict.update( {cam.serialNumber: cam} )
-
-
-                                self.camera_status_labels[cam.serialNumber]["status_label"].config(text="Connected", foreground="green")
-                                self.camera_status_labels[cam.serialNumber]["serial_label"].config(fg="green")
-                                self.logger.info(f"Camera {cam.serialNumber} connected successfully.")
-
-                                self.logger.info(f"Successfully identified camera {cam.idx}")
-                                self.logger.info(f"     Serial number: {cam.serialNumber}")
-                                self.logger.info(f"     Model: {cam.head_model}")
-                                self.logger.info(f"     Controller Mode: {cam.controller_mode}")
-                            except Exception as e:
-                                self.logger.error(f"Error connecting to camera at index {i}: {e}")
-                                cam.close()
-                        else:
-                            self.logger.error(f"Failed to connect to camera {cam.serialNumber}.")
-                self.update_UI_elements()
+            with instrumentation.span("connect_all_cameras"):
+                num_cameras = await self.orchestrator.call(None, self.__identify_cameras__) #This identifies the number of cameras connected.
+                indices = [i for i in range(num_cameras or 0) if not self.check_if_idx_connected_already(i)]
+                results = await self.orchestrator.gather(
+                    {i: self.orchestrator.connect(i, temperature=-25, fan_mode='full', amp_mode=None) for i in indices}, timeout=timeout)
+            for i, cam in results.items():
+                if isinstance(cam, BaseException):
+                    self.logger.error(f"Error connecting to camera at index {i}: {cam}")
+                    continue
+                self.cameras_dict.update( {cam.serialNumber: cam} )
+                self.ui_bus.post(("camera_status", cam.serialNumber), self._set_camera_status, cam.serialNumber, "Connected", "green")
+                self.logger.info(f"Camera {cam.serialNumber} connected successfully.")
+
+                self.logger.info(f"Successfully identified camera {cam.idx}")
+                self.logger.info(f"     Serial number: {cam.serialNumber}")
+                self.logger.info(f"     Model: {cam.head_model}")
+                self.logger.info(f"     Controller Mode: {cam.controller_mode}")
+            self.ui_bus.post(None, self.update_UI_elements)
         except Exception as e:
             self.logger.error(f"Failed within connecting to all cameras {e}")
             if self.logger.level == log.DEBUG:
                 print(f"Failed to connect cameras: {e}")
+        return list(self.cameras_dict)
+
+    def _busy_cameras(self):
+        return [serial for serial, cam in list(self.cameras_dict.items()) if self.orchestrator.is_busy(cam)]
 
     def disconnect_all_cameras(self):
-        """Disconnect all cameras and update their status."""
+        """
+        Disconnect all cameras in the background and update their status. Refused while any camera is in use.
+        :return: Future of the serials still connected, None if refused
+        """
+        busy = self._busy_cameras()
+        if busy:
+            messagebox.showwarning("Camera Busy", f"Camera(s) {', '.join(busy)} are acquiring, previewing or being configured.")
+            return None
         self.logger.info("Disconnecting all cameras...")
-        serials = list(self.cameras_dict.keys())
-        for serial in serials:
-            cam = self.cameras_dict[serial]
-            try:
-                if cam.disconnect():
-                    self.camera_status_labels[serial]["status_label"].config(text="Disconnected", foreground="black")
-                    self.camera_status_labels[serial]["serial_label"].config(fg="red")
-                    self.logger.info(f"Camera {serial} disconnected.")
-                    self.cameras_dict.pop(serial)
-                else:
-                    self.camera_status_labels[serial]["status_label"].config(text="Error", foreground="black")
-                    self.camera_status_labels[serial]["serial_label"].config(fg="red")
-            except Exception as e:
-                self.camera_status_labels[serial]["status_label"].config(text="Error", fg="red")
-                self.logger.error(f"Error disconnecting from camera {serial}: {e}")
-        self.update_UI_elements()
+        return self.orchestrator.submit(self._disconnect_all_cameras())
+
+    async def _disconnect_all_cameras(self, timeout=30.0):
+        cameras = dict(self.cameras_dict)
+        results = await self.orchestrator.gather(
+            {serial: self.orchestrator.call(cam, cam.disconnect) for serial, cam in cameras.items()}, timeout=timeout)
+        for serial, result in results.items():
+            if isinstance(result, BaseException):
+                self.ui_bus.post(("camera_status", serial), self._set_camera_status, serial, "Error", "red")
+                self.logger.error(f"Error disconnecting from camera {serial}: {result}")
+            elif result:
+                self.ui_bus.post(("camera_status", serial), self._set_camera_status, serial, "Disconnected", "black")
+                self.logger.info(f"Camera {serial} disconnected.")
+                self.cameras_dict.pop(serial, None)
+            else:
+                self.ui_bus.post(("camera_status", serial), self._set_camera_status, serial, "Error", "black")
+        self.ui_bus.post(None, self.update_UI_elements)
+        return list(self.cameras_dict)
 
     def save_fits_header(self):
         """Save the content of the notes text area to a file."""
@@ -905,8 +1360,9 @@ class CameraMonitorApp:
         # Camera selection combobox
         self.selected_camera = tk.StringVar()
         camera_select = ttk.Combobox(selection_frame, textvariable=self.selected_camera)
-        camera_select['values'] = self.camera_serials
-        camera_select.current(0)
+        camera_select['values'] = list(self.cameras_dict)
+        if self.cameras_dict:
+            camera_select.current(0)
         camera_select.pack(side=tk.LEFT, padx=5)
         camera_select.bind('<<ComboboxSelected>>', self._update_config_display)
         
@@ -1074,6 +1530,28 @@ class CameraMonitorApp:
         self.preview_height = 480
         self.preview_canvas.bind("<Configure>", self.on_preview_resize)
 
+        # zoom with the wheel, pan by dragging, shift-drag a box for its statistics, double-click resets, right-click drops the box
+        self.preview_viewport = PreviewViewport()
+        self._preview_raw = None        # last rotated raw frame, for the pixel readout and redraws
+        self._preview_drag = None
+        self.preview_canvas.bind("<MouseWheel>", lambda e: self._on_preview_zoom(e, 1.25 if e.delta > 0 else 0.8))
+        self.preview_canvas.bind("<Button-4>", lambda e: self._on_preview_zoom(e, 1.25))
+        self.preview_canvas.bind("<Button-5>", lambda e: self._on_preview_zoom(e, 0.8))
+        self.preview_canvas.bind("<ButtonPress-1>", self._on_preview_press)
+        self.preview_canvas.bind("<B1-Motion>", self._on_preview_pan)
+        self.preview_canvas.bind("<Shift-ButtonPress-1>", self._on_preview_press)
+        self.preview_canvas.bind("<Shift-B1-Motion>", self._on_preview_region)
+        self.preview_canvas.bind("<Double-Button-1>", self._on_preview_reset)
+        self.preview_canvas.bind("<Button-3>", self._on_preview_clear_region)
+        self.preview_canvas.bind("<Motion>", self._on_preview_hover)
+
+        info_frame = ttk.Frame(preview_display_frame)
+        info_frame.pack(fill=tk.X, padx=10, pady=(0, 5))
+        self.pixel_info_var = tk.StringVar(value="")
+        self.region_info_var = tk.StringVar(value="Shift-drag a box for region statistics")
+        ttk.Label(info_frame, textvariable=self.pixel_info_var, font=("Courier", 10), width=36).pack(side=tk.LEFT)
+        ttk.Label(info_frame, textvariable=self.region_info_var, font=("Courier", 10)).pack(side=tk.LEFT, padx=10)
+
         # --- Controls (buttons below the live view) ---
         preview_control_frame = ttk.Frame(self.preview_frame)
         preview_control_frame.grid(row=3, column=0, sticky="ew", padx=20, pady=(0, 15))
@@ -1095,11 +1573,106 @@ class CameraMonitorApp:
         )
         capture_btn.pack(side=tk.LEFT, padx=5)
 
+        self.preview_scaler = PreviewScaler()
+        self.preview_scaling_var = tk.StringVar(value=self.preview_scaler.mode)
+        scaling_select = ttk.Combobox(preview_control_frame, textvariable=self.preview_scaling_var,
+                                      values=PREVIEW_SCALINGS, state="readonly", width=12)
+        scaling_select.pack(side=tk.RIGHT, padx=5)
+        scaling_select.bind("<<ComboboxSelected>>", lambda e: self.preview_scaler.set_mode(self.preview_scaling_var.get()))
+        ttk.Label(preview_control_frame, text="Scale:").pack(side=tk.RIGHT)
+
+        # --- Focus assist: focus / alignment metrics of every connected camera as rolling time series ---
+        focus_frame = ttk.LabelFrame(self.preview_frame, text="Focus Assist")
+        focus_frame.grid(row=4, column=0, sticky="ew", padx=20, pady=(0, 15))
+        focus_controls = ttk.Frame(focus_frame)
+        focus_controls.pack(fill=tk.X, padx=5, pady=5)
+        self.focus_btn = ttk.Button(focus_controls, text="Start Focus Assist", command=self.toggle_focus_assist)
+        self.focus_btn.pack(side=tk.LEFT, padx=5)
+        ttk.Button(focus_controls, text="Reset Reference",
+                   command=lambda: self.focus_monitor is not None and self.focus_monitor.reset_reference()).pack(side=tk.LEFT, padx=5)
+        self.focus_roi_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(focus_controls, text="Preview box as ROI (all cameras)", variable=self.focus_roi_var).pack(side=tk.LEFT, padx=5)
+        self.focus_canvas = tk.Canvas(focus_frame, height=240, bg="black", highlightthickness=0)
+        self.focus_canvas.pack(fill=tk.X, padx=5, pady=(0, 5))
+        self.focus_monitor = None
+        self.focus_running = False
+
     def on_preview_resize(self, event):
         """Update stored preview dimensions when the canvas is resized."""
         self.preview_width = event.width
         self.preview_height = event.height
 
+    def _preview_sensor_xy(self, row, col):
+        """Sensor x, y of a pixel of the rotated preview frame (the preview turns the frame 90 degrees counterclockwise)."""
+        return self._preview_raw.shape[0] - 1 - row, col
+
+    def _redraw_preview(self):
+        """Re-render the last frame after a zoom, pan or region change, only the visible window is resampled."""
+        if self._preview_raw is None:
+            return
+        view = self.preview_viewport.render(self._preview_raw, self.preview_scaler, self.preview_scaler.lut,
+                                            (self.preview_width, self.preview_height))
+        self._show_preview_array(view, self._preview_region_stats(self._preview_raw))
+
+    def _preview_region_sensor_roi(self):
+        """The preview box as a (r0, r1, c0, c1) sensor ROI, undoing the preview rotation. None without a box."""
+        region, shape = self.preview_viewport.region, self.preview_viewport.shape
+        if region is None or shape is None:
+            return None
+        r0, r1, c0, c1 = region
+        return c0, c1, shape[0] - r1, shape[0] - r0
+
+    def _on_preview_zoom(self, event, factor):
+        self.preview_viewport.zoom_at(event.x, event.y, factor)
+        self._redraw_preview()
+
+    def _on_preview_press(self, event):
+        self._preview_drag = (event.x, event.y)
+
+    def _on_preview_pan(self, event):
+        if self._preview_drag is None:
+            return
+        x0, y0 = self._preview_drag
+        self._preview_drag = (event.x, event.y)
+        self.preview_viewport.pan(event.x - x0, event.y - y0)
+        self._redraw_preview()
+
+    def _on_preview_region(self, event):
+        if self._preview_drag is None:
+            return
+        self.preview_viewport.set_region(*self._preview_drag, event.x, event.y)
+        self._redraw_preview()
+
+    def _on_preview_reset(self, event):
+        self.preview_viewport.reset()
+        self._redraw_preview()
+
+    def _on_preview_clear_region(self, event):
+        self.preview_viewport.region = None
+        self.region_info_var.set("Shift-drag a box for region statistics")
+        self._redraw_preview()
+
+    def _on_preview_hover(self, event):
+        if self._preview_raw is None:
+            return
+        pos = self.preview_viewport.to_frame(event.x, event.y)
+        if pos is None:
+            self.pixel_info_var.set("")
+            return
+        x, y = self._preview_sensor_xy(*pos)
+        self.pixel_info_var.set(f"x {x:5d} y {y:5d}  {int(self._preview_raw[pos]):6d} ADU  zoom x{self.preview_viewport.zoom:.1f}")
+
+    def _preview_region_stats(self, frame_rot):
+        region = self.preview_viewport.region
+        return region_stats(frame_rot, region) if region is not None else None
+
+    def _show_region_stats(self, stats):
+        if stats is None:
+            return
+        x, y = self._preview_sensor_xy(*stats["peak_pos"])
+        self.region_info_var.set(f"mean {stats['mean']:.1f}  peak {stats['peak']} at ({x}, {y})  "
+                                 f"FWHM {stats['fwhm_x']:.2f} x {stats['fwhm_y']:.2f} px  bkg {stats['background']:.0f}")
+
     def setup_notes_display(self):
         """Setup the experiment notes interface"""
         # Title label
@@ -1140,7 +1713,14 @@ class CameraMonitorApp:
         """Start or stop the live preview."""
         serial = self.preview_camera.get()
 
+        if start and self.focus_running:
+            messagebox.showinfo("Focus Assist", "Focus assist is running, the selected camera is already shown.")
+            return
         if start and not getattr(self, "preview_running", False):
+            camera = self.cameras_dict.get(serial)
+            if camera is not None and self.orchestrator.is_busy(camera):
+                messagebox.showwarning("Camera Busy", f"Camera {serial} is acquiring or being configured.")
+                return
             self.preview_running = True
             self.preview_canvas.config(text=f"Starting preview for camera {serial}...", image="")
             self.preview_select.configure(state="disabled")
@@ -1155,94 +1735,180 @@ class CameraMonitorApp:
         """Start live camera preview loop"""
         self.preview_cam = self.cameras_dict[serial]
         try:
-            self.preview_cam.start_acquisition()
-            self.preview_thread = threading.Thread(target=self.live_loop, daemon=True)
-            self.preview_thread.start()
+            # the preview holds the camera in the orchestrator, so nothing reconfigures it while it runs,
+            # and the acquisition is only started once the camera's lock is held (in live_loop)
+            future = self.orchestrator.submit(self.orchestrator.call(self.preview_cam, self.live_loop))
+            future.add_done_callback(lambda f: self._preview_done(serial, f))
         except Exception as e:
             self.preview_canvas.config(text=f"Failed to start camera: {e}")
             self.preview_running = False
             return
 
-    # def _handle_captured_image(self, frame):
-    #     # -------------------------------------------------------
-    #     # 1. Percentile-based contrast stretch (fixes black images)
-    #     # -------------------------------------------------------
-    #     # Ignore extreme hot pixels and noise floor
-    #     low = np.percentile(frame, 1)  # 1% black point
-    #     high = np.percentile(frame, 99)  # 99% white point
-    #
-    #     # Avoid division by zero
-    #     if high - low < 1e-9:
-    #         high = low + 1e-9
-    #
-    #     # Clip the frame to the usable range
-    #     frame_clipped = np.clip(frame, low, high)
-    #
-    #     # Normalize to 0–255 (8-bit)
-    #     norm = ((frame_clipped - low) / (high - low) * 255).astype(np.uint8)
-    #
-    #     # -------------------------------------------------------
-    #     # 2. Convert to PIL image and rotate 90 degrees
-    #     # -------------------------------------------------------
-    #     img = Image.fromarray(norm)
-    #     img = img.rotate(90, expand=True)
-    #
-    #     # -------------------------------------------------------
-    #     # 3. Resize ONLY for preview (not for saving)
-    #     # -------------------------------------------------------
-    #     img_preview = img.resize(
-    #         (self.preview_width, self.preview_height),
-    #         Image.Resampling.LANCZOS
-    #     )
-    #
-    #     imgtk = ImageTk.PhotoImage(image=img_preview)
-    #
-    #     # -------------------------------------------------------
-    #     # Return both the preview and the full-resolution image
-    #     # -------------------------------------------------------
-    #     return imgtk, img
-
-    def _handle_captured_image(self, frame):
-        # --- Fast min/max normalization ---
-        fmin = frame.min()
-        fmax = frame.max()
-        if fmax - fmin < 1:
-            fmax = fmin + 1
-        frame_8 = ((frame - fmin) / (fmax - fmin) * 255).astype(np.uint8)
-
-        # --- Fast rotate using OpenCV ---
-        frame_rot = cv2.rotate(frame_8, cv2.ROTATE_90_COUNTERCLOCKWISE)
-
-        # --- Fast resize using OpenCV ---
-        frame_small = cv2.resize(frame_rot, (self.preview_width, self.preview_height))
-
-        # --- Convert to Tkinter object ---
-        imgtk = ImageTk.PhotoImage(Image.fromarray(frame_small))
-
-        return imgtk, Image.fromarray(frame_rot)
+    def _preview_done(self, serial, future):
+        """Reset the preview controls if the preview loop ended with an error (any thread)."""
+        if future.cancelled() or future.exception() is None:
+            return
+        self.logger.error(f"Preview of camera {serial} failed: {future.exception()}")
+        self.preview_running = False
+
+        def show():
+            self.preview_select.configure(state="readonly")
+            self.preview_canvas.config(text=f"Preview failed: {future.exception()}", image="")
+        self.ui_bus.post("preview_failed", show)
+
+    @instrumentation.timed("prepare_preview")
+    def _prepare_preview(self, frame):
+        """
+        NumPy/OpenCV part of the preview (safe off the Tk thread).
+        Returns the resized uint8 preview and the full rotated raw frame.
+        """
+        # limits from a subsample, the cached lookup table only changes when they move (backend/previewScaling.py)
+        lut = self.preview_scaler.update(frame)
+
+        import cv2      # deferred to the first preview, see the note at the imports
+        # rotate the raw frame, only the zoomed window is resampled and looked up for the pixels on screen
+        frame_rot = cv2.rotate(frame, cv2.ROTATE_90_COUNTERCLOCKWISE)
+        self._preview_raw = frame_rot
+        frame_small = self.preview_viewport.render(frame_rot, self.preview_scaler, lut, (self.preview_width, self.preview_height))
+        return frame_small, frame_rot
+
+    def _show_preview_array(self, frame_small, stats=None):
+        """Turn a prepared uint8 preview into a PhotoImage and display it (Tk thread only)."""
+        from PIL import ImageTk, Image
+        self.update_preview_display(ImageTk.PhotoImage(Image.fromarray(frame_small)))
+        self._show_region_stats(stats)
 
     def live_loop(self):
+        # the read loop only feeds the pipeline, conversion happens on the (lossy) preview sink thread
+        sinks = [CallbackSink(self._post_preview_frame)]
+        if get_frame_server() is not None:
+            sinks.append(NetworkSink())
+        pipeline = Pipeline(sinks=sinks, queue_size=2,
+                            serial=self.preview_cam.serialNumber).start(PipelineContext(serial=self.preview_cam.serialNumber))
         try:
+            self.preview_cam.start_acquisition()
             while self.preview_running:
                 self.preview_cam.wait_for_frame(timeout=5)
                 frame = self.preview_cam.read_newest_image()
                 if frame is None:
                     continue
-
-                imgtk, _ = self._handle_captured_image(frame)
-                self.preview_canvas.after(0, self.update_preview_display, imgtk)
+                pipeline.submit(FramePacket(frame))
         finally:
             self.preview_cam.stop_acquisition()
             try:
-                # Create an empty black image matching the preview area
-                blank = np.zeros((self.preview_height, self.preview_width), dtype=np.uint8)
-                img = Image.fromarray(blank)
-                imgtk = ImageTk.PhotoImage(image=img)
-
-                self.update_preview_display(imgtk)
+                pipeline.close(timeout=1.0)
+            except Exception as e:
+                self.logger.error(f"Preview pipeline error: {e}")
+            # Create an empty black image matching the preview area
+            self._preview_raw = None
+            blank = np.zeros((self.preview_height, self.preview_width), dtype=np.uint8)
+            self.ui_bus.post("preview", self._show_preview_array, blank)
+
+    def toggle_focus_assist(self):
+        """Start or stop focus assist: every connected camera runs live and its metrics are plotted and logged."""
+        if self.focus_running:
+            self.focus_running = False
+            self.focus_btn.config(text="Stopping...", state="disabled")
+            return
+        cameras = list(self.cameras_dict.values())
+        if not cameras:
+            messagebox.showwarning("Focus Assist", "No cameras connected.")
+            return
+        busy = [cam.serialNumber for cam in cameras if self.orchestrator.is_busy(cam)]
+        if busy or getattr(self, "preview_running", False):
+            messagebox.showwarning("Focus Assist", "Stop the preview or experiment first "
+                                   f"(busy: {', '.join(busy) or self.preview_camera.get()}).")
+            return
 
+        save_path = os.path.join(os.getcwd(), "Data")
+        os.makedirs(save_path, exist_ok=True)
+        log_path = os.path.join(save_path, f"focus_{time.strftime('%Y%m%d_%H%M%S')}.csv")
+        roi = self._preview_region_sensor_roi() if self.focus_roi_var.get() else None
+        self.focus_monitor = FocusMonitor(roi=roi, log_path=log_path,
+                                          on_metrics=lambda *a: self.ui_bus.post("focus_plot", self._draw_focus_plots)).start()
+        self.focus_running = True
+        preview_serial = self.preview_camera.get()
+        calls = {cam.serialNumber: self.orchestrator.call(cam, self._focus_loop, cam, self.focus_monitor,
+                                                          cam.serialNumber == preview_serial)
+                 for cam in cameras}
+        future = self.orchestrator.submit(self.orchestrator.gather(calls))
+        future.add_done_callback(lambda f: self.ui_bus.post(None, self._focus_assist_done, f))
+        self.focus_btn.config(text="Stop Focus Assist")
+        self.logger.info(f"Focus assist started on {', '.join(calls)} (ROI {roi}), metrics logged to {log_path}")
+
+    def _focus_loop(self, camera, monitor, show_preview):
+        """Run one camera live for focus assist (orchestrator thread holding the camera), frames go to the monitor."""
+        serial = camera.serialNumber
+        sinks = [CallbackSink(lambda frame: monitor.submit(serial, frame))]
+        if show_preview:
+            sinks.append(CallbackSink(self._post_preview_frame))
+        pipeline = Pipeline(sinks=sinks, queue_size=2, serial=serial).start(PipelineContext(serial=serial))
+        camera.start_acquisition()
+        try:
+            while self.focus_running:
+                camera.wait_for_frame(timeout=5)
+                frame = camera.read_newest_image()
+                if frame is None:
+                    continue
+                pipeline.submit(FramePacket(frame))
+        finally:
+            camera.stop_acquisition()
+            try:
+                pipeline.close(timeout=1.0)
             except Exception as e:
-                print(f"Failed to draw preview: {e}")
+                self.logger.error(f"Focus assist pipeline error on camera {serial}: {e}")
+
+    def _focus_assist_done(self, future):
+        self.focus_running = False
+        try:
+            for serial, result in future.result().items():
+                if isinstance(result, BaseException):
+                    self.logger.error(f"Focus assist on camera {serial} failed: {result}")
+        except Exception as e:
+            self.logger.error(f"Focus assist failed: {e}")
+        if self.focus_monitor is not None:
+            self.focus_monitor.stop()
+            self.logger.info(f"Focus assist stopped, metrics saved to {self.focus_monitor.log_path}")
+        self.focus_btn.config(text="Start Focus Assist", state="normal")
+
+    def _draw_focus_plots(self):
+        """Redraw the focus metric time series (Tk thread, coalesced to one redraw per UI drain)."""
+        canvas = self.focus_canvas
+        canvas.delete("all")
+        if self.focus_monitor is None:
+            return
+        width, height = max(canvas.winfo_width(), 100), max(canvas.winfo_height(), 60)
+        panels = (("laplacian_var", "Laplacian variance"), ("fwhm", "Trace FWHM (px)"), ("trace_shift", "Trace shift (px)"))
+        panel_height = height / len(panels)
+        history = {serial: list(samples) for serial, samples in sorted(self.focus_monitor.history.items())}
+        now = time.time()
+        for p, (key, title) in enumerate(panels):
+            top = p * panel_height
+            canvas.create_text(5, top + 2, anchor="nw", text=title, fill="white", font=("Arial", 9))
+            series = {serial: [(t, m[key]) for t, m in samples if now - t <= FOCUS_PLOT_SPAN and np.isfinite(m[key])]
+                      for serial, samples in history.items()}
+            values = [v for points in series.values() for _, v in points]
+            if not values:
+                continue
+            lo, hi = min(values), max(values)
+            if hi - lo < 1e-9:
+                hi = lo + 1
+            canvas.create_text(width - 5, top + 2, anchor="ne", text=f"{lo:.4g} .. {hi:.4g}", fill="gray", font=("Arial", 8))
+            for i, (serial, points) in enumerate(series.items()):
+                color = FOCUS_COLORS[i % len(FOCUS_COLORS)]
+                coords = []
+                for t, v in points:
+                    coords += [width * (1 - (now - t) / FOCUS_PLOT_SPAN), top + panel_height - 4 - (v - lo) / (hi - lo) * (panel_height - 18)]
+                if len(coords) >= 4:
+                    canvas.create_line(*coords, fill=color)
+                if p == 0 and points:
+                    canvas.create_text(160 + 110 * i, top + 2, anchor="nw", fill=color, font=("Arial", 9),
+                                       text=f"{serial}: {points[-1][1]:.4g}")
+
+    def _post_preview_frame(self, frame):
+        # only the newest preview frame per drain is drawn, older ones are dropped
+        frame_small, frame_rot = self._prepare_preview(frame)
+        self.ui_bus.post("preview", self._show_preview_array, frame_small, self._preview_region_stats(frame_rot))
 
     def update_preview_display(self, imgtk):
         self.preview_canvas.imgtk = imgtk
@@ -1251,27 +1917,180 @@ class CameraMonitorApp:
     def capture_image(self):
         """Capture an image from the selected camera"""
         serial = self.preview_camera.get()
-        cam = self.cameras_dict[serial]
+        cam = self.cameras_dict.get(serial)
+        if cam is None:
+            messagebox.showwarning("No Camera", "Please select a camera first.")
+            return
         self.vmin, self.vmax = None, None
 
-        if not cam.acquisition_in_progress():
-            # Grab image (ensure it's 2D)
-            cam.setup_acquisition(mode="snap", nframes=1)
-            image = np.squeeze(cam.snap())
-            print("Captured image shape:", image.shape)
-
+        if self.orchestrator.is_busy(cam):
+            self.logger.warning(f"Camera {serial} is already acquiring an image")
+            messagebox.showwarning("Camera Busy", f"Camera {serial} is acquiring, previewing or being configured. Please wait.")
+            return
+        # snapped on an orchestrator thread holding the camera, the frame is shown like a preview frame
+        future = self.orchestrator.submit(self.orchestrator.call(cam, self._snap, cam))
+        future.add_done_callback(lambda f: self._capture_done(serial, f))
 
-            imgtk, img = self._handle_captured_image(frame=image)
-            self.update_preview_display(imgtk)
+    @staticmethod
+    def _snap(camera):
+        camera.setup_acquisition(mode="snap", nframes=1)
+        return np.squeeze(camera.snap())     # ensure it's 2D
 
+    def _capture_done(self, serial, future):
+        try:
+            image = future.result()
+        except Exception as e:
+            self.logger.error(f"Capturing an image from camera {serial} failed: {e}")
+            self.ui_bus.post("preview", self.preview_canvas.config, text=f"Capture failed: {e}", image="")
+            return
+        self._post_preview_frame(image)
+
+    def setup_control_api(self, port=CONTROL_PORT, token=None):
+        """Serve the JSON-RPC control API (see backend/controlServer.py) on localhost, optionally behind a token."""
+        server = ControlServer(port=port, ui_call=self.ui_bus.call, token=token)
+        server.register("connect", self._api_connect)
+        server.register("disconnect", self._api_disconnect)
+        server.register("configure", self._api_configure)
+        server.register("start_acquisition", self._api_start_acquisition, ui=True)
+        server.register("stop_acquisition", self._api_stop_acquisition, ui=True)
+        server.register("capture", self._api_capture)
+        server.register("auto_expose", self._api_auto_expose)
+        server.register("status", self._api_status)
+        server.register("telemetry", self._api_telemetry)
+        try:
+            self.control_server = server.start()
+        except OSError as e:
+            self.logger.error(f"Could not start the control API on port {port}: {e}")
+
+    def _api_camera(self, serial):
+        camera = self.cameras_dict.get(str(serial))
+        if camera is None:
+            raise RPCError(f"Camera {serial} is not connected", data={"connected": list(self.cameras_dict)})
+        return camera
+
+    def _api_connect(self):
+        """Connect every camera on the bus, returns the connected serials."""
+        return self.connect_all_cameras().result()
+
+    def _api_disconnect(self):
+        """Disconnect every camera, returns the serials still connected."""
+        if self.experiment_active:
+            raise RPCError("An experiment is running, stop it first")
+        busy = self._busy_cameras()
+        if busy:
+            raise RPCError(f"Camera(s) {', '.join(busy)} are busy (acquiring or previewing)")
+        return self.orchestrator.run(self._disconnect_all_cameras())
+
+    def _api_configure(self, serial, config=None):
+        """
+        Configure a camera. With config the dict is applied and, once that succeeded, saved as
+        configs/<serial>_config.json. Without it the saved config file is applied.
+        Calls for the same camera (e.g. two in one batch) run one after the other.
+        """
+        camera = self._api_camera(serial)
+        cfg_path = os.path.join(self.config_dir, f"{serial}_config.json")
+        save = config is not None
+        with self._config_locks.setdefault(str(serial), threading.Lock()):
+            if not save:
+                if not os.path.exists(cfg_path):
+                    raise RPCError(f"No saved config for camera {serial}, pass one in 'config'")
+                with open(cfg_path, "r") as f:
+                    config = json.load(f)
+            if self.orchestrator.is_busy(camera):
+                raise RPCError(f"Camera {serial} is busy (acquiring or previewing)")
+            configured = self.orchestrator.run(self.orchestrator.call(camera, self._configure_camera, camera, config,
+                                                                      cfg_path if save else None, timeout=120.0))
+        if configured:
+            self.logger.info(f"Camera {serial} configured through the control API")
         else:
-            self.logger.warning(f"Camera {cam.serialNumber} is already acquiring an image")
-            messagebox.showwarning(f"Camera {cam.serialNumber} is already acquiring an image. Please wait")
+            self.logger.error(f"Configuring camera {serial} through the control API failed, {cfg_path} was left as it was")
+        return {"serial": str(serial), "configured": camera.is_configured.name, "saved": bool(configured and save)}
+
+    @staticmethod
+    def _write_config_file(path, config):
+        """Write a config file through a temporary name, so a reader never sees it half written."""
+        with open(path + ".tmp", "w") as f:
+            json.dump(config, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def _api_start_acquisition(self, mode="kinetic", frames=None, serials=None):
+        """
+        Start an experiment as the Run button does, with the other Experiment tab settings.
+        mode is "single", "kinetic" or "continuous", serials defaults to every connected camera.
+        """
+        modes = {"single": "Single Scan", "kinetic": "Kinetic Series", "continuous": "Run Till Abort"}
+        if mode not in modes:
+            raise RPCError(f"Unknown mode '{mode}', expected one of {list(modes)}")
+        if self.experiment_active:
+            raise RPCError("An experiment is already running")
+        if mode == "kinetic":
+            if frames is None or int(frames) <= 0:
+                raise RPCError("A kinetic series needs a positive number of frames")
+            self.num_frames_var.set(str(int(frames)))
+        self.acq_mode_var.set(modes[mode])
+        self._on_acq_mode_change()
+        serials = [str(s) for s in serials] if serials else None
+        if not self.run_experiment(serials):
+            raise RPCError("Pre-experiment check failed, cameras must be connected and configured")
+        return {"started": serials or list(self.cameras_dict), "mode": mode}
+
+    def _api_stop_acquisition(self):
+        """Stop the running experiment, data already taken is saved."""
+        was_active = self.experiment_active
+        if was_active:
+            self.stop_experiment()
+        return {"stopping": was_active}
+
+    def _api_capture(self, serial):
+        """Snap one frame, show it in the preview and return its statistics."""
+        camera = self._api_camera(serial)
+        if self.orchestrator.is_busy(camera):
+            raise RPCError(f"Camera {serial} is busy (acquiring or previewing)")
+        image = self.orchestrator.run(self.orchestrator.call(camera, self._snap, camera))
+        self._post_preview_frame(image)
+        return {"serial": str(serial), "shape": list(image.shape), "min": int(image.min()), "max": int(image.max()),
+                "mean": float(image.mean()), "std": float(image.std())}
+
+    def _api_auto_expose(self, serial, target="peak", options=None):
+        """
+        Tune exposure and EM gain from live bursts and save them to configs/<serial>_config.json.
+        target is "peak" or "photon_counting", options are passed on to AutoExposure (e.g. peak_fraction, occupancy).
+        """
+        camera = self._api_camera(serial)
+        if target not in AUTO_EXPOSURE_TARGETS:
+            raise RPCError(f"Unknown target '{target}', expected one of {list(AUTO_EXPOSURE_TARGETS)}")
+        if self.orchestrator.is_busy(camera):
+            raise RPCError(f"Camera {serial} is busy (acquiring or previewing)")
+        result, _ = self.orchestrator.run(self.orchestrator.call(camera, self._auto_expose, camera, target, **(options or {})))
+        return result
+
+    def _api_status(self):
+        """Connection, configuration and acquisition state of every connected camera."""
+        cameras = {}
+        for serial, camera in list(self.cameras_dict.items()):
+            counters = self.frame_counters.get(serial)
+            cameras[serial] = {
+                "connection": camera.connection_status.name,
+                "configured": camera.is_configured.name,
+                "acquiring": camera.acquisition_in_progress(),
+                "frames": counters.as_dict() if counters is not None else None,
+            }
+        return {"experiment_active": self.experiment_active, "stop_requested": self.stop_requested.is_set(), "cameras": cameras}
+
+    def _api_telemetry(self):
+        """Temperatures, frame counters, hot path timings and stream subscribers."""
+        cameras = self.orchestrator.run(self.orchestrator.telemetry_all(list(self.cameras_dict.values())), timeout=10.0)
+        for serial, entry in cameras.items():
+            counters = self.frame_counters.get(serial)
+            entry["frames"] = counters.as_dict() if counters is not None else None
+        server = get_frame_server()
+        return {"time": time.time(), "cameras": cameras, "timings": instrumentation.snapshot(),
+                "stream_subscribers": server.stats() if server is not None else None}
 
     def exit_app(self):
         """Clean exit of the application"""
         try:
-            self.disconnect_all_cameras()
+            self.orchestrator.run(self._disconnect_all_cameras(timeout=10.0))
         except Exception as e:
             self.logger.critical(f"ERROR: Failed to disconnect all cameras: {e}")
 
@@ -1279,13 +2098,24 @@ class CameraMonitorApp:
 
 
         self.monitoring = False
+        self.focus_running = False
+        if self.focus_monitor is not None:
+            self.focus_monitor.stop()
+        self.ui_bus.stop()
         try:
             if self.monitor_thread.is_alive():
                 self.monitor_thread.join(timeout=1.0)
         except Exception as e:
             print(f"Error stopping monitoring thread: {e}")
         
+        self._dump_diagnostics()
+        stop_frame_server()
+        if self.control_server is not None:
+            self.control_server.stop()
+        self.supervisor.stop()
+        self.orchestrator.stop()
         self.root.destroy()
+        shutdown_logging()
 
     def stop_monitoring(self):
         """Stop the monitoring thread"""
@@ -1294,129 +2124,30 @@ class CameraMonitorApp:
             self.monitor_thread.join(timeout=1.0)
             print("Camera monitoring stopped")
 
-    def start_experiment(self):
-        """Called when starting an experiment"""
-        self.stop_monitoring()  # Stop monitoring during experiment
-        self.running_experiment = True
-        print("Experiment started")
-
-        # Your experiment code here
-        '''
-        When we run our experiment we have some rules to follow. 
-        
-        1. Check if the cameras are connected and working properly.
-        2. Configure the acquisition parameters.
-        3. Configure the cameras for acquisition.
-        4. Start the acquisition.
-        5. Wait for the acquisition to finish.
-        6. Stop the acquisition.
-        7. Process the data for header generation.
-        8. Save the data to a file.
-        9. Close the cameras.
-        '''
-        
-       # Setup workers if not already done
-        if not self.camera_workers:
-            self.setup_camera_workers()
-        
-        # Check camera connections
-        for camera in self.cameras:
-            if not camera.connection_status():
-                messagebox.showerror("Error", f"Camera {camera.serialNumber} is not connected")
-                return
-        
-        
-        for camera in self.cameras:
-            try:    
-                camera.camera_configuration()
-                # camera.acquisition_configuration()
-            except Exception as e:
-                messagebox.showerror("Error", f"Failed to configure camera {camera.serialNumber}: {str(e)}")
-                return
-        # Start all workers
-        for worker in self.camera_workers.values():
-            worker.start_worker()
-            
-        # Start acquisition on all cameras
-        for queue in self.camera_queues.values():
-            queue.put({'action': 'start_acquisition'})
-            
-        # Start progress monitoring
-        self.root.after(1000, self.check_experiment_progress)
-        
-    def check_experiment_progress(self):
-        """Monitor experiment progress"""
-        if not self.running_experiment:
-            return
-            
-        all_complete = True
-        for worker in self.camera_workers.values():
-            if worker.acquisition_count < worker.total_acquisitions:
-                all_complete = False
-                break
-                
-        if all_complete:
-            self.end_experiment()
-        else:
-            self.root.after(1000, self.check_experiment_progress)
-
-    def end_experiment(self):
-        """End the experiment and cleanup"""
-        # Stop all workers
-        for worker in self.camera_workers.values():
-            worker.stop_worker()
-            
-        self.running_experiment = False
-
-        messagebox.showinfo("Complete", "Experiment completed successfully!")
-
-    def _setup_logging(self, debugLogging):
-        logger = log.getLogger(f"CameraApplication")
-        if(debugLogging):
-            logger.setLevel(log.DEBUG)
-        else:
-            logger.setLevel(log.INFO)
-        if not logger.handlers:
-            dir_path = os.path.dirname(os.path.realpath(__file__))
-            if not os.path.exists(f"{dir_path}/logs"):
-                os.makedirs(f"{dir_path}/logs")
-            save_path = f"{dir_path}/logs"
-            handler = log.FileHandler(f'{save_path}/cameraApplication.log')
-
-            if(debugLogging):
-                handler.setLevel(log.DEBUG)
-            else:
-                handler.setLevel(log.INFO)
-
-
-            formatter = log.Formatter('[%(asctime)s] %(name)s:%(levelname)s:%(message)s', datefmt='%Y-%m-%d %H:%M:%S')
-            handler.setFormatter(formatter)
-            logger.addHandler(handler)
+    def _setup_logging(self, debugLogging, jsonLogging=False):
+        # all file I/O happens on the logging listener thread, see backend/cameraLogging.py
+        dir_path = os.path.dirname(os.path.realpath(__file__))
+        setup_logging(log_dir=f"{dir_path}/logs", json_lines=jsonLogging)
+        logger = get_logger(APP_LOGGER_NAME, log.DEBUG if debugLogging else log.INFO)
         logger.info(f"Logging level set to {'DEBUG' if debugLogging else 'INFO'}")
         return logger
 
-    def check_camera_conection(self):
-        """
-        A method to periodically check the camera's connection.
-        """
-        print("Checking camera connection...")  # For demonstration
-
-        serials = list(self.cameras_dict.keys())  # we grab the serials from the dict because that dict contains all the cameras that are connected.
-        for serial in serials:
-            try:
-                cam = self.cameras_dict[serial]
-                if cam.get_camera_connetion_status == CameraState.CONNECTED:
-                    self.camera_status_labels[serial]["status_label"].config(text="Connected", fg="green")
-                    self.camera_status_labels[serial]["serial_label"].config(fg="green")
-                else:
-                    self.camera_status_labels[serial]["status_label"].config(text="Disconnected", fg="red")
-                    self.camera_status_labels[serial]["serial_label"].config(fg="red")
-            except Exception as e:
-                self.logger.error(f"Failed to refresh camera status for {serial}. Might be disconnected: {e}")
-                print(f"Failed to refresh camera status for {serial}. Might be disconnected.")
-
-        # Schedule the next check in 2 seconds (2000 ms)
-        self.root.after(ms=2000, func=self.check_camera_conection)
+    def _on_camera_state(self, serial, state, message):
+        """Supervisor callback (orchestrator thread): show connection losses and recoveries on the status tab."""
+        text, color = {"ok": ("Connected", "green"), "lost": ("Connection lost", "red"),
+                       "reconnecting": (f"Reconnecting ({message})", "orange"),
+                       "failed": ("Reconnect failing, see log", "red")}[state]
+        self.ui_bus.post(("camera_status", serial), self._set_camera_status, serial, text, color)
+        server = get_frame_server()
+        if server is not None:
+            server.publish_status(serial, text, connection=state)
+        if state != "reconnecting":
+            self.logger.warning(f"Camera {serial}: {text} {message}")
+
+    def _on_camera_reconnected(self, serial, camera):
+        """Supervisor callback: the reopened camera replaces the dead one, with its last config already applied."""
+        self.cameras_dict[serial] = camera
+        self.ui_bus.post(None, self.update_UI_elements)
 
     def checking_connected_cams_temp(self):
         print("#-------Camera Temperatures-------#")
@@ -1459,13 +2190,30 @@ def check_dll_files(path, dll_names):
 def main():
     args = sys.argv #pass in command line arguments.
     if len(args) > 1 and (args[1] == "--help" or args[1] == '-h' or args[1] == '-H'):
-        print("Usage: python main.py [-d]")
+        print("Usage: python main.py [-d] [-j] [-s [port]] [-r [port] [token]]")
         print("Options:")
         print("  -d    Enable debug logging")
+        print("  -j    Write log files as JSON lines")
+        print(f"  -s    Stream live frames and status over TCP (default port {DEFAULT_PORT}), see backend/frameServer.py")
+        print(f"  -r    Serve the JSON-RPC control API on localhost (default port {CONTROL_PORT}), see backend/controlServer.py")
+        print("        with a token, clients must send 'Authorization: Bearer <token>'")
         return
     
     
     debug_mode = "-d" in args 
+    json_logging = "-j" in args
+    stream_port = None
+    if "-s" in args:
+        i = args.index("-s")
+        stream_port = int(args[i + 1]) if i + 1 < len(args) and args[i + 1].isdigit() else DEFAULT_PORT
+    control_port = None
+    control_token = None
+    if "-r" in args:
+        i = args.index("-r")
+        control_port = int(args[i + 1]) if i + 1 < len(args) and args[i + 1].isdigit() else CONTROL_PORT
+        i += 2 if i + 1 < len(args) and args[i + 1].isdigit() else 1
+        if i < len(args) and not args[i].startswith("-"):
+            control_token = args[i]
 
 
     required_dll = ["atmcd64d.dll", "ATMCD64CS.dll"]
@@ -1479,7 +2227,7 @@ def main():
     
     
     root = tk.Tk()
-    app = CameraMonitorApp(root, debugLogging=debug_mode, cam_config_options_json=cam_config_options_json)
+    app = CameraMonitorApp(root, debugLogging=debug_mode, cam_config_options_json=cam_config_options_json, jsonLogging=json_logging, stream_port=stream_port, control_port=control_port, control_token=control_token)
     root.mainloop()
 
 